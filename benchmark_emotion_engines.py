@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Compare the keyword and linear emotion engines on accuracy and latency.
+The linear engine is scored with k-fold cross-validation over the labeled
+corpus (lexicon weak labels are only ever used for training), or with a
+pre-trained model via --model.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services import advanced_emotion_detection as aed
+from services.linear_emotion_model import HashingVectorizer, LinearEmotionClassifier, load_corpus, train
+from train_emotion_model import DEFAULT_CORPUS, load_history_examples, lexicon_examples
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def time_engine(predict, texts, repeats=20):
+    """Per-utterance latency samples in microseconds"""
+    samples = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            predict(text)
+            samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def keyword_predict(text):
+    # Clear the per-utterance caches so every call pays the full scan
+    aed._scan_lexicons.cache_clear()
+    aed._route_text.cache_clear()
+    return aed.emotion_detector.detect_primary_emotion(text)[0]
+
+
+def cross_validate(examples, extra_training, folds, n_features):
+    """Held-out predictions of the linear engine for every corpus example"""
+    predictions = [None] * len(examples)
+    models = []
+    for fold in range(folds):
+        train_set = [ex for i, ex in enumerate(examples) if i % folds != fold] + extra_training
+        model = train(train_set, HashingVectorizer(n_features=n_features))
+        models.append(model)
+        for i, (text, _) in enumerate(examples):
+            if i % folds == fold:
+                predictions[i] = model.predict(text)[0]
+    return predictions, models[0]
+
+
+def report(name, predictions, labels, samples):
+    correct = sum(1 for p, l in zip(predictions, labels) if p == l)
+    print(f"{name:10s} accuracy {correct / len(labels) * 100:5.1f}% ({correct}/{len(labels)}) | "
+          f"latency p50 {statistics.median(samples):7.1f} us  p95 {percentile(samples, 95):7.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Keyword vs linear emotion engine benchmark")
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS)
+    parser.add_argument("--history", default="", help="also evaluate on labeled conversation memory")
+    parser.add_argument("--model", help="evaluate a trained .npz instead of cross-validating")
+    parser.add_argument("--folds", type=int, default=5)
+    parser.add_argument("--n-features", type=int, default=2 ** 14)
+    args = parser.parse_args()
+
+    examples = load_corpus(args.corpus)
+    if args.history:
+        examples += load_history_examples(args.history)
+    texts = [text for text, _ in examples]
+    labels = [label for _, label in examples]
+    print(f"🧪 Evaluating on {len(examples)} labeled utterances\n")
+
+    keyword_predictions = [keyword_predict(text) for text in texts]
+    report("keyword", keyword_predictions, labels, time_engine(keyword_predict, texts))
+
+    if args.model:
+        model = LinearEmotionClassifier.load(args.model)
+        linear_predictions = [model.predict(text)[0] for text in texts]
+    else:
+        linear_predictions, model = cross_validate(examples, lexicon_examples(), args.folds, args.n_features)
+    report("linear", linear_predictions, labels, time_engine(lambda t: model.predict(t)[0], texts))
+
+
+if __name__ == "__main__":
+    main()
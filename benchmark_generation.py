@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Benchmark reply generation with and without the static-prefix KV cache:
+time to first token and full-turn latency over the four few-shot prompt
+variants, plus a greedy-decoding check that both paths produce the same
+tokens.
+
+With --compare-quantization, instead compares fp32 against the int8
+dynamically quantized model (each in its own process, for peak RSS):
+load time, tokens/s and greedy-output agreement on the sample turns.
+
+With --draft-model, compares sampling with and without assisted decoding:
+tokens/s, the draft acceptance rate, and a check that greedy output is
+unchanged by the draft.
+
+With --sessions N, compares N concurrent sessions generating one at a time
+against the micro-batching scheduler: total tokens/s and turn latency.
+
+With --compare-backends, compares the PyTorch pipeline against the ONNX
+Runtime backend (fp32 and int8, each in its own process): export and load
+time, tokens/s, peak RSS and greedy-output agreement.
+"""
+
+import argparse
+import json
+import os
+import resource
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services import enhanced_nlp_model as nlp
+from services.assisted_decoding import DraftCounter, can_draft_for
+from services.generation_scheduler import GenerationScheduler
+from services.model_registry import model_registry
+from services.prefix_cache import PrefixCache
+
+SAMPLE_TURNS = [
+    ("I'm feeling really sad and depressed today", "sad"),
+    ("Bahut tension ho rahi hai exams ki wajah se", "anxious"),
+    ("Bahut khush hun aaj, promotion mil gaya!", "happy"),
+    ("Ghar wale shaadi ke liye pressure kar rahe hain", "confused"),
+]
+CONTEXT = "User: I couldn't sleep last night. Assistant: That sounds exhausting, I'm here with you."
+
+
+def prompts():
+    for text, emotion in SAMPLE_TURNS:
+        emotion_data = {"primary_emotion": emotion, "intensity": "medium"}
+        yield nlp._build_prompt_parts(text, CONTEXT, emotion, emotion_data)
+
+
+def time_uncached(model, tokenizer, prefix, suffix, max_new_tokens):
+    import torch
+
+    ids = tokenizer(prefix + suffix, return_tensors="pt").input_ids
+    start = time.perf_counter()
+    with torch.no_grad():
+        output = model.generate(ids, attention_mask=torch.ones_like(ids), do_sample=False,
+                                max_new_tokens=max_new_tokens, pad_token_id=tokenizer.eos_token_id)
+    return (time.perf_counter() - start) * 1000, output[0, ids.shape[1]:].tolist()
+
+
+def time_cached(cache, prefix, suffix, max_new_tokens):
+    tokenizer = cache.tokenizer
+    start = time.perf_counter()
+    text = cache.generate(prefix, suffix, do_sample=False, max_new_tokens=max_new_tokens,
+                          pad_token_id=tokenizer.eos_token_id)
+    return (time.perf_counter() - start) * 1000, text
+
+
+def same_tokens(model, tokenizer, cache, prefix, suffix, max_new_tokens):
+    """Greedy output of the cached path equals the uncached path on the same token ids"""
+    import torch
+
+    ids = torch.cat([cache.get(prefix)[0], tokenizer(suffix, return_tensors="pt").input_ids], dim=1)
+    with torch.no_grad():
+        plain = model.generate(ids, attention_mask=torch.ones_like(ids), do_sample=False,
+                               max_new_tokens=max_new_tokens, pad_token_id=tokenizer.eos_token_id)
+    cached = cache.generate(prefix, suffix, do_sample=False, max_new_tokens=max_new_tokens,
+                            pad_token_id=tokenizer.eos_token_id)
+    return tokenizer.decode(plain[0, ids.shape[1]:], skip_special_tokens=True) == cached
+
+
+def report(name, samples):
+    print(f"  {name:10s} p50 {statistics.median(samples):8.1f} ms  mean {statistics.mean(samples):8.1f} ms")
+
+
+def quantization_worker(model_name, variant, new_tokens, repeats, cache_dir):
+    """Load one variant (fp32, int8, onnx or onnx-int8), greedy-generate the sample turns and report as JSON"""
+    import torch
+    from services import model_registry as registry_module
+
+    registry_module.QUANTIZED_MODEL_DIR = registry_module.ONNX_MODEL_DIR = cache_dir
+    settings = {"quantize": "int8"} if variant.endswith("int8") else {}
+    if variant.startswith("onnx"):
+        settings["backend"] = "onnx"
+    start = time.perf_counter()
+    generator, tokenizer = model_registry.acquire(model_name, **settings)
+    load_seconds = time.perf_counter() - start
+
+    def greedy(ids):
+        if "backend" in settings:
+            return generator.onnx_model.generate(ids[0].tolist(), do_sample=False, max_new_tokens=new_tokens,
+                                                 eos_token_id=tokenizer.eos_token_id)
+        with torch.no_grad():
+            output = generator.model.generate(ids, attention_mask=torch.ones_like(ids), do_sample=False,
+                                              max_new_tokens=new_tokens, pad_token_id=tokenizer.eos_token_id)
+        return output[0, ids.shape[1]:].tolist()
+
+    texts, generated, elapsed = [], 0, 0.0
+    for _ in range(repeats):
+        texts = []
+        for prefix, suffix in prompts():
+            ids = tokenizer(prefix + suffix, return_tensors="pt").input_ids
+            start = time.perf_counter()
+            new_ids = greedy(ids)
+            elapsed += time.perf_counter() - start
+            generated += len(new_ids)
+            texts.append(new_ids)
+
+    print(json.dumps({
+        "load_seconds": load_seconds,
+        "tokens_per_second": generated / elapsed,
+        "peak_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "weights_mb": model_registry.memory_bytes() / 2 ** 20,
+        "outputs": texts,
+        "samples": [tokenizer.decode(ids, skip_special_tokens=True) for ids in texts[:2]],
+    }))
+
+
+def run_worker(args, variant, cache_dir):
+    command = [sys.executable, os.path.abspath(__file__), "--worker", variant,
+               "--model", args.model, "--new-tokens", str(args.new_tokens),
+               "--repeats", str(args.repeats), "--cache-dir", cache_dir]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip()[-500:])
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def agreement(reference, candidate):
+    """Fraction of greedy tokens identical to fp32 before the first divergence"""
+    matched = total = 0
+    for ref, cand in zip(reference, candidate):
+        total += len(ref)
+        for a, b in zip(ref, cand):
+            if a != b:
+                break
+            matched += 1
+    return matched / max(total, 1)
+
+
+def run_variants(args, variants, prefix):
+    """(label, worker result) per (label, variant), sharing one model cache directory"""
+    cache_dir = args.cache_dir or tempfile.mkdtemp(prefix=prefix)
+    try:
+        return [(label, run_worker(args, variant, cache_dir)) for label, variant in variants]
+    finally:
+        if not args.cache_dir:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+
+
+def print_runs(args, runs):
+    print(f"🧪 {args.model}: {len(SAMPLE_TURNS)} turns x {args.repeats}, {args.new_tokens} greedy tokens\n")
+    print(f"{'':18s} {'load s':>7s} {'tok/s':>8s} {'peak RSS MB':>12s} {'weights MB':>11s} {'agreement':>10s}")
+    reference = runs[0][1]["outputs"]
+    for name, run in runs:
+        print(f"{name:18s} {run['load_seconds']:7.2f} {run['tokens_per_second']:8.1f} "
+              f"{run['peak_rss_mb']:12.0f} {run['weights_mb']:11.1f} {agreement(reference, run['outputs']) * 100:9.0f}%")
+
+
+def compare_quantization(args):
+    runs = run_variants(args, [
+        ("fp32", "fp32"),
+        ("int8 (first load)", "int8"),
+        ("int8 (cached)", "int8"),
+    ], "quantized-")
+    print_runs(args, runs)
+
+    fp32, int8 = runs[0][1], runs[2][1]
+    print(f"\n⚡ int8 speedup: {int8['tokens_per_second'] / fp32['tokens_per_second']:.1f}x, "
+          f"peak RSS {int8['peak_rss_mb'] / fp32['peak_rss_mb'] * 100:.0f}% of fp32")
+    print("\nSpot checks (greedy continuation):")
+    for i, (a, b) in enumerate(zip(fp32["samples"], int8["samples"])):
+        print(f"  [{SAMPLE_TURNS[i][0]}]\n    fp32: {a.strip()!r}\n    int8: {b.strip()!r}")
+    return 0
+
+
+def compare_backends(args):
+    runs = run_variants(args, [
+        ("torch fp32", "fp32"),
+        ("onnx (export)", "onnx"),
+        ("onnx (cached)", "onnx"),
+        ("onnx int8 (export)", "onnx-int8"),
+    ], "onnx-")
+    print_runs(args, runs)
+
+    torch_fp32, onnx_fp32 = runs[0][1], runs[2][1]
+    print(f"\n⚡ ONNX Runtime speedup: {onnx_fp32['tokens_per_second'] / torch_fp32['tokens_per_second']:.1f}x "
+          f"(int8 {runs[3][1]['tokens_per_second'] / torch_fp32['tokens_per_second']:.1f}x), "
+          f"load {onnx_fp32['load_seconds']:.2f} s vs {torch_fp32['load_seconds']:.2f} s, "
+          f"peak RSS {onnx_fp32['peak_rss_mb'] / torch_fp32['peak_rss_mb'] * 100:.0f}% of torch")
+    return 0
+
+
+def compare_assisted(args):
+    import torch
+
+    generator, tokenizer = model_registry.acquire(args.model)
+    draft_generator, _ = model_registry.acquire(args.draft_model)
+    model, draft = generator.model, draft_generator.model
+    if not can_draft_for(model, draft):
+        print(f"❌ {args.draft_model} cannot draft for {args.model} (different vocabulary)")
+        return 1
+    inputs = [tokenizer(prefix + suffix, return_tensors="pt").input_ids for prefix, suffix in prompts()]
+
+    def run(ids, assisted, do_sample, seed=0):
+        kwargs = dict(attention_mask=torch.ones_like(ids), do_sample=do_sample, max_new_tokens=args.new_tokens,
+                      repetition_penalty=nlp.REPETITION_PENALTY, pad_token_id=tokenizer.eos_token_id)
+        if do_sample:
+            kwargs.update(temperature=nlp.TEMPERATURE, top_p=nlp.TOP_P, top_k=nlp.TOP_K)
+        if assisted:
+            kwargs["assistant_model"] = draft
+        torch.manual_seed(seed)
+        start = time.perf_counter()
+        with torch.no_grad():
+            output = model.generate(ids, **kwargs)
+        return time.perf_counter() - start, output[0, ids.shape[1]:].tolist()
+
+    print(f"🧪 {args.model} drafted by {args.draft_model}: {len(inputs)} turns x {args.repeats}, "
+          f"up to {args.new_tokens} tokens\n")
+    run(inputs[0], True, False)  # warm-up
+
+    same = sum(run(ids, False, False)[1] == run(ids, True, False)[1] for ids in inputs)
+    print(f"{'✅' if same == len(inputs) else '❌'} Greedy output identical with the draft: {same}/{len(inputs)}\n")
+
+    plain_time = plain_tokens = assisted_time = assisted_tokens = drafted = accepted = verified = 0
+    for seed in range(args.repeats):
+        for ids in inputs:
+            elapsed, tokens = run(ids, False, True, seed)
+            plain_time += elapsed
+            plain_tokens += len(tokens)
+            with DraftCounter(model, draft) as counter:
+                elapsed, tokens = run(ids, True, True, seed)
+            assisted_time += elapsed
+            assisted_tokens += len(tokens)
+            drafted += counter.drafted
+            accepted += counter.accepted(len(tokens))
+            verified += counter.verified
+
+    plain_rate, assisted_rate = plain_tokens / plain_time, assisted_tokens / assisted_time
+    print("Sampling:")
+    print(f"  plain      {plain_rate:8.1f} tok/s")
+    print(f"  assisted   {assisted_rate:8.1f} tok/s")
+    print(f"  ⚡ {assisted_rate / plain_rate:.1f}x, acceptance rate {accepted / max(drafted, 1) * 100:.0f}% "
+          f"({accepted}/{drafted} drafted), {assisted_tokens / max(verified, 1):.1f} tokens per main-model pass")
+    return 0 if same == len(inputs) else 1
+
+
+def compare_batching(args):
+    import threading
+
+    generator, tokenizer = model_registry.acquire(args.model)
+    inputs = [tokenizer(prefix + suffix)["input_ids"] for prefix, suffix in prompts()]
+    sampling = dict(max_new_tokens=args.new_tokens, temperature=nlp.TEMPERATURE, top_p=nlp.TOP_P,
+                    top_k=nlp.TOP_K, repetition_penalty=nlp.REPETITION_PENALTY)
+
+    def run_sessions(scheduler):
+        tokens, latencies = [], []
+
+        def session(index):
+            for turn in range(args.repeats):
+                start = time.perf_counter()
+                ids = scheduler.submit(inputs[(index + turn) % len(inputs)], **sampling).result()
+                latencies.append((time.perf_counter() - start) * 1000)
+                tokens.append(len(ids))
+
+        threads = [threading.Thread(target=session, args=(i,)) for i in range(args.sessions)]
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return sum(tokens) / (time.perf_counter() - start), latencies
+
+    print(f"🧪 {args.model}: {args.sessions} concurrent sessions x {args.repeats} turns, "
+          f"up to {args.new_tokens} sampled tokens\n")
+    GenerationScheduler(generator.model, tokenizer, max_batch_size=1).submit(inputs[0], max_new_tokens=2).result()
+
+    results = []
+    for label, batch_size in (("one at a time", 1), (f"batched (<= {args.sessions})", args.sessions)):
+        scheduler = GenerationScheduler(generator.model, tokenizer, max_batch_size=batch_size,
+                                        batch_window_ms=args.batch_window_ms)
+        rate, latencies = run_sessions(scheduler)
+        results.append(rate)
+        print(f"  {label:20s} {rate:8.1f} tok/s   turn p50 {statistics.median(latencies):8.0f} ms")
+    print(f"\n⚡ {results[1] / results[0]:.1f}x tokens/s with batching")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefix KV-cache, quantization, ONNX, assisted decoding and batching benchmark")
+    parser.add_argument("--model", default=nlp.MODEL_NAME)
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--new-tokens", type=int, default=32)
+    parser.add_argument("--compare-quantization", action="store_true", help="fp32 vs int8 dynamic quantization")
+    parser.add_argument("--compare-backends", action="store_true", help="PyTorch vs ONNX Runtime")
+    parser.add_argument("--cache-dir", default="", help="quantized/ONNX model cache (default: a temporary directory)")
+    parser.add_argument("--draft-model", default="", help="compare assisted decoding with this draft model")
+    parser.add_argument("--sessions", type=int, default=0, help="compare micro-batching with this many sessions")
+    parser.add_argument("--batch-window-ms", type=float, default=10.0)
+    parser.add_argument("--worker", choices=["fp32", "int8", "onnx", "onnx-int8"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        quantization_worker(args.model, args.worker, args.new_tokens, args.repeats, args.cache_dir)
+        return 0
+    if args.compare_quantization:
+        return compare_quantization(args)
+    if args.compare_backends:
+        return compare_backends(args)
+    if args.draft_model:
+        return compare_assisted(args)
+    if args.sessions:
+        return compare_batching(args)
+
+    generator, tokenizer = model_registry.acquire(args.model)
+    model = generator.model
+    cache = PrefixCache(model, tokenizer)
+    start = time.perf_counter()
+    cache.warm(nlp._static_prefix(emotion) for emotion in nlp.FEW_SHOTS)
+    print(f"🧪 {args.model}: warmed {len(cache)} prefixes in {(time.perf_counter() - start) * 1000:.0f} ms\n")
+
+    parts = list(prompts())
+    mismatches = sum(not same_tokens(model, tokenizer, cache, p, s, args.new_tokens) for p, s in parts)
+    print(f"{'✅' if not mismatches else '❌'} Greedy output identical: {len(parts) - mismatches}/{len(parts)}\n")
+
+    for label, new_tokens in (("Time to first token", 1), (f"Full turn ({args.new_tokens} tokens)", args.new_tokens)):
+        plain, cached = [], []
+        for _ in range(args.repeats):
+            for prefix, suffix in parts:
+                plain.append(time_uncached(model, tokenizer, prefix, suffix, new_tokens)[0])
+                cached.append(time_cached(cache, prefix, suffix, new_tokens)[0])
+        print(f"{label}:")
+        report("uncached", plain)
+        report("cached", cached)
+        print(f"  ⚡ {statistics.mean(plain) / statistics.mean(cached):.1f}x\n")
+
+    prefix_tokens = [cache.get(p)[0].shape[1] for p, _ in parts]
+    suffix_tokens = [len(tokenizer(s).input_ids) for _, s in parts]
+    print(f"Tokens per prompt: prefix {statistics.mean(prefix_tokens):.0f} (cached), "
+          f"suffix {statistics.mean(suffix_tokens):.0f} (processed per turn)")
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
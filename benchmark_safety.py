@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+Benchmark safety screening: the fused single-pass scanner behind assess_risk
+against the original one-regex-at-a-time loop, checking that both return the
+same (risk, category, patterns) on every input.
+
+With --fuzz, also measures worst-case latency on adversarial and very long
+inputs against the length-aware scan budget, and flags any pattern whose
+running time grows super-linearly with input length.
+"""
+
+import argparse
+import math
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services import safety_guard as sg
+from services.phonetic_index import tokens_of
+
+SAMPLE_TEXTS = [
+    "I want to kill myself",
+    "Mujhe jeena nahi hai, mar jana chahta hun",
+    "I'm going to hurt myself with this blade",
+    "Khud ko nuksan pahunchana chahta hun",
+    "Ghar mein violence ho rahi hai",
+    "This traffic is killing me",
+    "Exam se mar jaaunga mazak mein",
+    "I'm feeling happy today",
+    "Bahut achha din hai aaj",
+    "I'm worried about my exam results and can't sleep at night",
+    "Office mein bohot tension hai, boss roz daant-ta hai",
+    "I feel so alone in this world, nobody understands me",
+    "Sometimes I hate my body and I have been starving myself",
+    "Someone is hurting me at home, it's domestic abuse",
+    "I keep drinking to forget everything that happened",
+    "Aaj ka din theek tha, bas thoda thak gaya hun",
+    "Can we talk about my sleep schedule and some study tips?",
+    "Mera dost bahut supportive hai, usse baat karke achha laga",
+]
+
+
+def legacy_scan(text):
+    """The original assess_risk matching loop, kept for comparison"""
+    for pat in sg.LOW_COMPILED:
+        if pat.search(text):
+            return "low", "unknown", [pat.pattern]
+
+    matches = []
+    highest_risk = "none"
+    risk_category = "unknown"
+    for category, regs in sg.COMPILED:
+        for r in regs:
+            if r.search(text):
+                matches.append(r.pattern)
+                if category == "suicide":
+                    highest_risk = "high"
+                    risk_category = category
+                elif category == "self_harm" and highest_risk != "high":
+                    highest_risk = "high"
+                    risk_category = category
+                elif category in ("violence", "abuse") and highest_risk not in ("high",):
+                    highest_risk = "medium"
+                    risk_category = category
+                elif category in ("substance", "eating_disorder") and highest_risk == "none":
+                    highest_risk = "medium"
+                    risk_category = category
+    return highest_risk, risk_category, matches
+
+
+def random_texts(count, seed=0):
+    """Utterances stitched together from sample sentences, so several categories co-occur"""
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        text = rng.choice([", ", " ", ""]).join(rng.sample(SAMPLE_TEXTS, rng.randint(1, 4)))
+        texts.append(text.upper() if rng.random() < 0.1 else text)
+    return texts
+
+
+def time_scan(scan, texts, repeats):
+    """Per-utterance latency samples in microseconds"""
+    samples = []
+    for _ in range(repeats):
+        for text in texts:
+            start = time.perf_counter()
+            scan(text)
+            samples.append((time.perf_counter() - start) * 1e6)
+    return samples
+
+
+def check_equivalence(texts):
+    mismatches = 0
+    for text in texts:
+        expected = legacy_scan(text)
+        fused = sg._scan_risk(text, all_matches=True)
+        early = sg._scan_risk(text)
+        if fused != expected or early[:2] != expected[:2]:
+            mismatches += 1
+            print(f"❌ {text!r}\n   legacy {expected}\n   fused  {fused}\n   early  {early}")
+    return mismatches
+
+
+def report(name, samples):
+    print(f"{name:22s} p50 {statistics.median(samples):7.1f} us  "
+          f"mean {statistics.mean(samples):7.1f} us  max {max(samples):8.1f} us")
+
+
+def pattern_words():
+    return sorted(tokens_of(r.pattern for _, regs in sg.COMPILED + [("low", sg.LOW_COMPILED)] for r in regs))
+
+
+def adversarial_inputs(length, seed=0):
+    """Inputs built to stress backtracking and chunking, each about `length` chars"""
+    rng = random.Random(seed)
+    words = pattern_words()
+    # Every pattern cut one word short, so matching gets deep before failing
+    near_misses = [r.pattern.replace("\\b", "").rsplit(" ", 1)[0] for _, regs in sg.COMPILED for r in regs]
+    near_miss = " ".join(re_literal(p) for p in near_misses)
+    salad = " ".join(rng.choice(words) for _ in range(length // 5))
+    crisis = "mujhe jeena nahi hai"
+    return {
+        "repeated char": "a" * length,
+        "whitespace": " " * length,
+        "punctuation": "-'" * (length // 2),
+        "pattern words": salad[:length],
+        "near misses": (near_miss * (length // max(len(near_miss), 1) + 1))[:length],
+        "crisis at end": (salad[:length - len(crisis) - 1] + " " + crisis),
+    }
+
+
+def re_literal(pattern):
+    """A plausible literal reading of a pattern: first alternative of every group"""
+    out = []
+    i = 0
+    while i < len(pattern):
+        ch = pattern[i]
+        if pattern.startswith("(?:", i):
+            i += 3
+            continue
+        if ch == "|":
+            # skip to the end of this group
+            depth, i = 0, i + 1
+            while i < len(pattern) and not (pattern[i] == ")" and depth == 0):
+                depth += pattern[i] == "("
+                depth -= pattern[i] == ")"
+                i += 1
+        elif ch not in "()?":
+            out.append(ch)
+        i += 1
+    return "".join(out)
+
+
+def boundary_inputs():
+    """A crisis phrase placed across every offset around the first chunk boundary"""
+    phrase = "i don't want to live"
+    filler = "so tired of all this "
+    base = (filler * (2 * sg.SCAN_CHUNK_CHARS // len(filler) + 1))[:2 * sg.SCAN_CHUNK_CHARS]
+    return [
+        base[:offset] + " " + phrase + " " + base[offset:]
+        for offset in range(sg.SCAN_CHUNK_CHARS - len(phrase) - 8, sg.SCAN_CHUNK_CHARS + 8)
+    ]
+
+
+def superlinear_patterns(lengths=(4_000, 64_000), exponent_limit=1.5):
+    """Patterns whose search time grows faster than ~n^1.5 with input length n"""
+    flagged = []
+    inputs = {length: adversarial_inputs(length) for length in lengths}
+    for category, regs in sg.COMPILED + [("low", sg.LOW_COMPILED)]:
+        for r in regs:
+            worst = 0.0
+            for name in ("repeated char", "whitespace", "pattern words", "near misses"):
+                small, large = (
+                    min(timeit_once(r.search, inputs[length][name]) for _ in range(5))
+                    for length in lengths
+                )
+                exponent = math.log(large / max(small, 1e-7)) / math.log(lengths[1] / lengths[0])
+                worst = max(worst, exponent)
+            if worst > exponent_limit:
+                flagged.append((category, r.pattern, worst))
+    return flagged
+
+
+def timeit_once(func, arg):
+    start = time.perf_counter()
+    func(arg)
+    return time.perf_counter() - start
+
+
+def fuzz(repeats):
+    failures = 0
+    print("🔥 Worst-case latency (assess_risk, ms):")
+    for length in (1_000, 10_000, 100_000):
+        for name, text in adversarial_inputs(length).items():
+            samples = [timeit_once(sg.assess_risk, text) * 1000 for _ in range(repeats)]
+            budget = sg.scan_budget_ms(text)
+            over = max(samples) > budget
+            failures += over
+            print(f"  {'❌' if over else '✅'} {name:14s} {len(text):7d} chars  "
+                  f"p50 {statistics.median(samples):7.2f}  p99 {percentile(samples, 99):7.2f}  "
+                  f"max {max(samples):7.2f}  budget {budget:6.1f}")
+
+    missed = [text for text in boundary_inputs() if sg.assess_risk(text)[:2] != ("high", "suicide")]
+    failures += bool(missed)
+    print(f"\n{'✅' if not missed else '❌'} Chunk boundaries: crisis phrase found at "
+          f"{len(boundary_inputs()) - len(missed)}/{len(boundary_inputs())} offsets")
+
+    long_texts = [adversarial_inputs(length)["crisis at end"] for length in (5_000, 20_000)]
+    mismatches = check_equivalence(long_texts)
+    failures += mismatches
+    print(f"{'✅' if not mismatches else '❌'} Long inputs identical to the legacy loop: "
+          f"{len(long_texts) - mismatches}/{len(long_texts)}")
+
+    flagged = superlinear_patterns()
+    failures += len(flagged)
+    for category, pattern, growth in flagged:
+        print(f"❌ Super-linear [{category}] {pattern} (time ~ n^{growth:.2f})")
+    if not flagged:
+        print("✅ No pattern grows super-linearly with input length")
+    return failures
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Safety pattern scanner benchmark")
+    parser.add_argument("--texts", type=int, default=500)
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--fuzz", action="store_true", help="adversarial/long-input worst-case run")
+    args = parser.parse_args()
+
+    if args.fuzz:
+        return 1 if fuzz(max(args.repeats, 20)) else 0
+
+    texts = SAMPLE_TEXTS + random_texts(args.texts)
+    n_patterns = len(sg.LOW_COMPILED) + sum(len(regs) for _, regs in sg.COMPILED)
+    print(f"🧪 {len(texts)} utterances, {n_patterns} patterns\n")
+
+    mismatches = check_equivalence(texts)
+    print(f"{'✅' if not mismatches else '❌'} Equivalence: {len(texts) - mismatches}/{len(texts)} identical\n")
+
+    safe_texts = [text for text in texts if legacy_scan(text)[0] == "none"]
+    print(f"No-risk utterances ({len(safe_texts)}):")
+    report("  legacy loop", time_scan(legacy_scan, safe_texts, args.repeats))
+    report("  fused", time_scan(sg._scan_risk, safe_texts, args.repeats))
+
+    print(f"\nAll utterances ({len(texts)}):")
+    legacy = time_scan(legacy_scan, texts, args.repeats)
+    fused = time_scan(lambda t: sg._scan_risk(t, all_matches=True), texts, args.repeats)
+    early = time_scan(sg._scan_risk, texts, args.repeats)
+    report("  legacy loop", legacy)
+    report("  fused (all matches)", fused)
+    report("  fused (early stop)", early)
+    print(f"\n⚡ Speedup: {statistics.mean(legacy) / statistics.mean(early):.1f}x")
+
+    replies = [text + ". I'm here for you, take your time. 💙" for text in texts]
+    print(f"\nOutput screen on generated replies ({len(replies)}):")
+    report("  output scanner", time_scan(lambda r: sg.OUTPUT_SCANNER.search(r), replies, args.repeats))
+    return 1 if mismatches else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
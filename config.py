@@ -7,9 +7,63 @@ TEMPERATURE = 0.7
 TOP_P = 0.92
 TOP_K = 50
 REPETITION_PENALTY = 1.15
+PREFIX_CACHE = True  # reuse attention state of the static system/few-shot prompt prefix
+PROMPT_TOKEN_BUDGET = 768  # max prompt tokens (also capped by the model window minus MAX_NEW_TOKENS)
+GENERATION_DEADLINE_SECONDS = 8  # per-turn reply SLO; templates answer if generation runs past it
+TWO_STAGE_REPLY = True  # streamed replies open with an instant acknowledgment the model then continues
+CONTEXT_TURNS = 3  # recent turns given to the model verbatim...
+CONTEXT_SUMMARY_POINTS = 4  # ...after a rolling summary keeping this many points from older turns
+CONTEXT_TURN_CHARS = 200  # each side of a verbatim turn is clipped to this
+MAX_REPLY_SENTENCES = 4  # stop decoding after this many sentences...
+MAX_REPLY_CHARS = 600  # ...or this many characters, or at the next "User:" turn
+
+# CPU inference: None (fp32) or "int8" (dynamic quantization of Linear layers,
+# cached on disk after the first load)
+MODEL_QUANTIZATION = None
+QUANTIZED_MODEL_DIR = "data/models/quantized"
+
+# Inference backend: "torch" (transformers pipeline) or "onnx" (exported once
+# to ONNX_MODEL_DIR, decoded with ONNX Runtime on CPU; no prefix cache,
+# batching or draft model). MODEL_QUANTIZATION="int8" applies to either
+INFERENCE_BACKEND = "torch"
+ONNX_MODEL_DIR = "data/models/onnx"
+
+# Assisted decoding: a small model with the same tokenizer (e.g. "distilgpt2")
+# drafts tokens that MODEL_NAME verifies; None disables it
+DRAFT_MODEL = None
+
+# Micro-batching for concurrent sessions: replies requested within the window
+# share one generate() call. 1 turns it off, which keeps the prefix cache and
+# draft model (neither works on padded batches)
+GENERATION_BATCH_SIZE = 1
+GENERATION_BATCH_WINDOW_MS = 10
+
+# Reply cache for short openers ("hi how are you", "thanks"; see CACHEABLE_PHRASES): once a key
+# has REPLY_CACHE_POOL distinct replies, answers come from that pool
+REPLY_CACHE_SIZE = 256
+REPLY_CACHE_TTL_SECONDS = 1800
+REPLY_CACHE_POOL = 3
+REPLY_CACHE_MAX_WORDS = 6  # longer messages are always answered fresh
 
 # Locale for helplines
 LOCALE = "IN"
 
 # Output control
 SPEAK_OUT_LOUD = False  # robot may handle TTS; set True to let backend speak too
+
+# NLTK data bundle (resolved locally, never downloaded at runtime)
+NLTK_DATA_DIR = "data/nltk_data"
+
+# Emotion engine: "keyword" (lexicons + VADER) or "linear" (hashed n-gram model)
+EMOTION_ENGINE = "keyword"
+EMOTION_MODEL_PATH = "data/models/emotion_linear.npz"
+
+# Fuzzy (phonetic) lexicon matching for ASR misspellings of Hinglish terms
+PHONETIC_MATCHING = True
+
+# Safety scan time budget: base + per 1000 characters of input
+SAFETY_SCAN_BUDGET_MS = 10.0
+SAFETY_SCAN_MS_PER_KCHAR = 2.0
+
+# Target time from crisis detection to the start of crisis audio
+CRISIS_AUDIO_BUDGET_MS = 500
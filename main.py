@@ -2,13 +2,14 @@ import tkinter as tk
 from tkinter import ttk, scrolledtext
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Dict, List
 
 # Enhanced imports for comprehensive mental health support
 from services.speech_to_text import transcribe_speech
-from services.text_to_speech import speak_text
-from services.enhanced_nlp_model import generate_enhanced_reply
+from services.text_to_speech import save_reply_audio, speak_text_safe, speak_urgent
+from services.enhanced_nlp_model import stream_enhanced_reply, start_model_loading, get_model_status
 from services.advanced_emotion_detection import detect_emotion_detailed, get_emotion_trends
 from memory.memory_manager import (
     add_to_memory,
@@ -20,9 +21,15 @@ from memory.memory_manager import (
     get_session_summary,
     detect_emotional_crisis_pattern
 )
-from services.safety_guard import assess_risk, crisis_response, provide_grounding_exercise, get_risk_trends
+from services.safety_guard import assess_risk, crisis_response, provide_grounding_exercise, get_risk_trends, screen_output
 from utils.logger import log_message
 from utils.helpers import clean_text
+from utils.metrics import metrics
+
+try:
+    from config import CRISIS_AUDIO_BUDGET_MS
+except Exception:
+    CRISIS_AUDIO_BUDGET_MS = 500
 
 # ---------------- Enhanced GUI Setup ----------------
 root = tk.Tk()
@@ -57,6 +64,10 @@ emotion_label = tk.Label(status_frame, text="😐 Emotion: Neutral", font=("Aria
                         bg="#f0f0f0", fg="#7f8c8d")
 emotion_label.pack(anchor="w", pady=(5, 0))
 
+model_label = tk.Label(status_frame, text="⏳ Language model: loading", font=("Arial", 9), 
+                      bg="#f0f0f0", fg="#7f8c8d")
+model_label.pack(anchor="w", pady=(5, 0))
+
 # Conversation display
 conv_frame = ttk.Frame(main_frame)
 conv_frame.grid(row=1, column=1, sticky=(tk.W, tk.E, tk.N, tk.S), padx=(0, 10))
@@ -151,6 +162,12 @@ def update_display(text, speaker="Assistant"):
     # Update analytics panel
     show_analytics()
 
+def extend_display(text):
+    """Append streamed text to the assistant message shown last"""
+    conv_text.insert("end-2c", f" {text}", "assistant")
+    conv_text.see(tk.END)
+    root.update_idletasks()
+
 def add_system_message(message):
     """Add system message to conversation"""
     update_display(message, "System")
@@ -177,9 +194,76 @@ update_display("Welcome! I'm your AI Mental Health Assistant. I understand Engli
 
 
 # ---------------- Enhanced Speak in Background ----------------
-def speak_in_background(text, emotion="neutral"):
-    """Run emotional TTS in a separate thread so GUI & loop don't block"""
-    threading.Thread(target=speak_text, args=(text, emotion), daemon=True).start()
+MODEL_STATUS_TEXT = {
+    "not_loaded": ("⏳ Language model: waiting", "#7f8c8d"),
+    "loading": ("⏳ Language model: loading", "#7f8c8d"),
+    "ready": ("✅ Language model: ready", "#27ae60"),
+    "failed": ("⚠️ Language model: unavailable", "#e67e22"),
+}
+
+def refresh_model_status():
+    """Poll the background model load until it settles"""
+    status = get_model_status()
+    text, color = MODEL_STATUS_TEXT[status]
+    model_label.config(text=text, fg=color)
+    if status in ("not_loaded", "loading"):
+        root.after(1000, refresh_model_status)
+
+def speak_in_background(text, emotion="neutral", save_audio=True):
+    """Queue emotional TTS on the speech worker so GUI & loop don't block"""
+    speak_text_safe(text, emotion, save_audio)
+
+
+# ---------------- Background Persistence ----------------
+# Memory writes run here, in order, off the turn's critical path
+persistence_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="persistence")
+_last_persistence = None
+
+def persist_turn(user_text, bot_reply, emotion=None, emotion_data=None):
+    """Store a turn in memory and refresh the backup file in the background"""
+    global _last_persistence
+    def write():
+        add_to_memory(user_text, bot_reply, emotion, emotion_data)
+        save_memory_to_file()
+    _last_persistence = persistence_executor.submit(write)
+
+def wait_for_persistence(timeout=5.0):
+    """Let pending memory writes land before memory is read back"""
+    if _last_persistence is not None:
+        try:
+            _last_persistence.result(timeout=timeout)
+        except Exception as e:
+            print(f"[PERSISTENCE ERROR] {e}")
+
+
+# ---------------- Crisis Lane ----------------
+metrics.set_budget("crisis_audio_ms", CRISIS_AUDIO_BUDGET_MS)
+
+def handle_crisis(user_text, risk, category, detected_at):
+    """Speak the crisis reply first, then schedule display and persistence around it"""
+    bot_reply = crisis_response(locale="IN", category=category)
+    
+    def on_audio_start():
+        elapsed_ms = (time.perf_counter() - detected_at) * 1000
+        if not metrics.record_latency("crisis_audio_ms", elapsed_ms):
+            print(f"[CRISIS LATENCY WARNING] Audio started {elapsed_ms:.0f} ms after detection "
+                  f"(budget {CRISIS_AUDIO_BUDGET_MS} ms)")
+    
+    speak_urgent(bot_reply, "sad", on_start=on_audio_start)  # Use sad tone for crisis response
+    metrics.increment(f"crisis_{risk}")
+    
+    root.after(0, update_display, user_text, "User")
+    root.after(0, update_display, bot_reply)
+    root.after(0, update_status, "💙 I'm here with you", None)
+    
+    # Offer grounding exercise for high-risk situations
+    if risk == "high":
+        grounding_offer = ("Would you like me to guide you through a grounding exercise right now? "
+                         "It can help when everything feels overwhelming.")
+        root.after(3000, update_display, grounding_offer, "System")
+    
+    log_message("Assistant", f"[CRISIS-{risk.upper()}:{category}] " + bot_reply)
+    persist_turn(user_text, bot_reply, emotion="crisis")
 
 
 # ---------------- Enhanced Main Assistant Loop ----------------
@@ -203,6 +287,7 @@ def assistant_loop():
             # ---- Exit Condition ----
             if "exit" in user_text.lower():
                 print("👋 Goodbye!")
+                wait_for_persistence()
                 session_summary = get_session_summary()
                 goodbye_msg = (f"Goodbye! We talked for {session_summary['message_count']} messages today. "
                               f"Your primary emotion was {session_summary.get('dominant_emotion', 'neutral')}. "
@@ -215,29 +300,17 @@ def assistant_loop():
             # Clean and log user input
             user_text = clean_text(user_text)
             log_message("User", user_text)
-            update_display(user_text, "User")
-            update_status("🤔 Processing...", None)
 
             # ---- ENHANCED SAFETY CHECK (FIRST PRIORITY) ----
             risk, category, patterns = assess_risk(user_text)
             if risk in ("high", "medium"):
-                bot_reply = crisis_response(locale="IN", category=category)
-                log_message("Assistant", f"[CRISIS-{risk.upper()}:{category}] " + bot_reply)
-                update_display(bot_reply)
-                speak_in_background(bot_reply, "sad")  # Use sad tone for crisis response
-                add_to_memory(user_text, bot_reply, emotion="crisis")
-                save_memory_to_file()
-                
-                # Offer grounding exercise for high-risk situations
-                if risk == "high":
-                    time.sleep(3)
-                    grounding_offer = ("Would you like me to guide you through a grounding exercise right now? "
-                                     "It can help when everything feels overwhelming.")
-                    update_display(grounding_offer, "System")
-                    
-                time.sleep(2)
+                handle_crisis(user_text, risk, category, time.perf_counter())
                 continue  # Skip normal generation for crisis situations
 
+            update_display(user_text, "User")
+            update_status("🤔 Processing...", None)
+            wait_for_persistence()
+
             # ---- COMPREHENSIVE EMOTION DETECTION ----
             emotion_data = detect_emotion_detailed(user_text)
             primary_emotion = emotion_data["primary_emotion"]
@@ -247,9 +320,24 @@ def assistant_loop():
             log_message("Emotion", f"{primary_emotion} ({intensity}) - {multiple_emotions}")
             update_status("💭 Understanding emotions...", primary_emotion)
 
-            # ---- CONTEXT-AWARE NLP REPLY GENERATION ----
+            # ---- CONTEXT-AWARE NLP REPLY GENERATION (streamed) ----
+            # Each sentence is screened, shown and queued for speech as soon as it is complete;
+            # the voice note is saved once for the whole reply below
             context = get_context(include_emotions=True)
-            bot_reply = generate_enhanced_reply(user_text, context, emotion_data)
+            reply_parts = []
+            for sentence in stream_enhanced_reply(user_text, context, emotion_data):
+                # ---- OUTPUT SAFETY SCREEN ----
+                sentence, flagged = screen_output(sentence)
+                if reply_parts:
+                    extend_display(sentence)
+                else:
+                    update_display(sentence)
+                speak_in_background(sentence, primary_emotion, save_audio=False)
+                reply_parts.append(sentence)
+                if flagged:
+                    break
+            bot_reply = " ".join(reply_parts)
+            extra_reply = ""
 
             # ---- EMOTIONAL PATTERN ANALYSIS ----
             recent_emotions = get_recent_emotions(10)
@@ -262,13 +350,13 @@ def assistant_loop():
                     "Your wellbeing is important to me. Would you consider reaching out to "
                     "a mental health professional? I can provide some resources if helpful."
                 )
-                bot_reply += pattern_warning
+                extra_reply += pattern_warning
             elif crisis_pattern["level"] == "medium":
                 gentle_nudge = (
                     "\n\nI want to check in - how are you taking care of yourself lately? "
                     "Remember, it's okay to seek support when you need it. 💙"
                 )
-                bot_reply += gentle_nudge
+                extra_reply += gentle_nudge
 
             # ---- REPEATED EMOTION PATTERN DETECTION ----
             if len(recent_emotions) >= 5:
@@ -282,24 +370,27 @@ def assistant_loop():
                             "That must be really tough. Would you like to talk about what's been "
                             "contributing to these feelings, or would you prefer some coping strategies?"
                         )
-                        bot_reply += pattern_response
+                        extra_reply += pattern_response
                     elif dominant_recent == "anxious":
                         anxiety_response = (
                             "\n\nI see anxiety has been a recurring theme. That's exhausting to deal with. "
                             "Would you like to try a quick breathing exercise, or would you prefer to "
                             "talk through what's been triggering these anxious feelings?"
                         )
-                        bot_reply += anxiety_response
+                        extra_reply += anxiety_response
 
             # ---- OUTPUT AND INTERACTION ----
+            if extra_reply:
+                bot_reply += extra_reply
+                update_display(extra_reply.strip())
+                speak_in_background(extra_reply.strip(), primary_emotion, save_audio=False)  # Use detected emotion for TTS
+            if bot_reply:
+                save_reply_audio(bot_reply, primary_emotion)
             log_message("Assistant", bot_reply)
-            update_display(bot_reply)
-            speak_in_background(bot_reply, primary_emotion)  # Use detected emotion for TTS
             update_status("🟢 Ready to listen", primary_emotion)
 
             # ---- ENHANCED MEMORY STORAGE ----
-            add_to_memory(user_text, bot_reply, primary_emotion, emotion_data)
-            save_memory_to_file()
+            persist_turn(user_text, bot_reply, primary_emotion, emotion_data)
 
             # ---- EMOTION TREND ANALYSIS ----
             emotion_trends = get_emotion_trends()
@@ -317,5 +408,8 @@ def assistant_loop():
 
 
 # ---------------- Run App ----------------
+# The window is up before the language model loads; replies use templates until it is ready
+start_model_loading()
+refresh_model_status()
 threading.Thread(target=assistant_loop, daemon=True).start()
 root.mainloop()
@@ -1,13 +1,32 @@
 import json
 import os
+import re
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
 from collections import Counter
 
+try:
+    from config import CONTEXT_TURNS, CONTEXT_SUMMARY_POINTS, CONTEXT_TURN_CHARS
+except Exception:
+    CONTEXT_TURNS = int(os.getenv("CONTEXT_TURNS", "3"))
+    CONTEXT_SUMMARY_POINTS = int(os.getenv("CONTEXT_SUMMARY_POINTS", "4"))
+    CONTEXT_TURN_CHARS = int(os.getenv("CONTEXT_TURN_CHARS", "200"))
+
 # File where memory will be stored
 MEMORY_FILE = "memory/conversation_memory.json"
 EMOTION_ANALYTICS_FILE = "memory/emotion_analytics.json"
 
+# Rolling summary of turns older than the last CONTEXT_TURNS
+SUMMARY_POINT_WORDS = 12  # words kept from a turn's most informative sentence
+SUMMARY_MIN_CONTENT_WORDS = 2  # turns with less to say ("hi", "ok thanks") add no point
+_SUMMARY_STOPWORDS = {
+    "the", "and", "but", "for", "you", "your", "are", "was", "were", "that", "this", "with", "have", "has",
+    "just", "really", "very", "feel", "feeling", "am", "its", "it's", "i'm", "what", "about", "today",
+    "hai", "hain", "hun", "mein", "main", "kya", "bhi", "aur", "raha", "rahi", "rahe", "kar", "toh", "yeh",
+}
+_WORD_RE = re.compile(r"[\w']+")
+_SENTENCE_RE = re.compile(r"(?<=[.!?।])\s+")
+
 # Initialize memory files if they don't exist
 def initialize_memory_files():
     if not os.path.exists(MEMORY_FILE):
@@ -59,6 +78,12 @@ def add_to_memory(user_message: str, bot_reply: str, emotion: str = None, emotio
 
     data["messages"].append(message_entry)
 
+    # The turn leaving the verbatim context window goes into the rolling summary
+    if "conversation_summary" not in data:
+        data["conversation_summary"] = _new_summary(data["messages"][:-CONTEXT_TURNS - 1])
+    if len(data["messages"]) > CONTEXT_TURNS:
+        _fold_into_summary(data["conversation_summary"], data["messages"][-CONTEXT_TURNS - 1])
+
     # Keep last 50 interactions (increased from 10)
     data["messages"] = data["messages"][-50:]
     
@@ -249,19 +274,77 @@ def _get_emotion_recommendation(emotion: str) -> str:
     }
     return recommendations.get(emotion, "Continue monitoring your emotional patterns and practice self-care")
 
+def _summary_point(text: str) -> Optional[str]:
+    """The sentence of a message with the most distinct content words, clipped"""
+    best, best_score = None, 0
+    for sentence in _SENTENCE_RE.split(text.strip()):
+        words = _WORD_RE.findall(sentence.lower())
+        score = len({w for w in words if len(w) > 2 and w not in _SUMMARY_STOPWORDS})
+        if score > best_score:
+            best, best_score = sentence, score
+    if best is None or best_score < SUMMARY_MIN_CONTENT_WORDS:
+        return None
+    words = best.split()
+    point = " ".join(words[:SUMMARY_POINT_WORDS])
+    return point.rstrip(".!?,;:") + ("..." if len(words) > SUMMARY_POINT_WORDS else "")
+
+def _new_summary(messages: List[Dict]) -> Dict:
+    summary = {"turns": 0, "emotions": {}, "points": []}
+    for msg in messages:
+        _fold_into_summary(summary, msg)
+    return summary
+
+def _fold_into_summary(summary: Dict, msg: Dict):
+    """Add one turn to the rolling summary; only the latest CONTEXT_SUMMARY_POINTS points are kept"""
+    summary["turns"] += 1
+    emotion = msg.get("emotion")
+    if emotion and emotion != "neutral":
+        summary["emotions"][emotion] = summary["emotions"].get(emotion, 0) + 1
+    point = _summary_point(msg.get("user", ""))
+    if point and all(point != existing for existing, _ in summary["points"]):
+        summary["points"].append([point, emotion])
+        del summary["points"][:-CONTEXT_SUMMARY_POINTS]
+
+def _render_summary(summary: Dict, include_emotions: bool) -> str:
+    """One line for the prompt context; bounded whatever the session length"""
+    if not summary or not summary.get("turns"):
+        return ""
+    line = f"Earlier ({summary['turns']} turns):"
+    if include_emotions and summary["emotions"]:
+        top = sorted(summary["emotions"].items(), key=lambda item: -item[1])[:3]
+        line += " felt " + ", ".join(f"{emotion} x{count}" for emotion, count in top) + "."
+    if summary["points"]:
+        points = [f"{point} ({emotion})" if include_emotions and emotion and emotion != "neutral" else point
+                  for point, emotion in summary["points"]]
+        line += " User mentioned: " + "; ".join(points) + "."
+    return line + "\n"
+
+def _clip(text: str, limit: int = CONTEXT_TURN_CHARS) -> str:
+    text = " ".join(text.split())
+    return text if len(text) <= limit else text[:limit - 3].rstrip() + "..."
+
 def get_context(include_emotions: bool = True) -> str:
-    """Return contextual information from recent conversations"""
+    """Return contextual information from recent conversations.
+
+    A one-line summary of older turns, then the last CONTEXT_TURNS turns
+    (each side clipped to CONTEXT_TURN_CHARS), so the context stays the same
+    size however long the conversation gets.
+    """
     with open(MEMORY_FILE, "r", encoding="utf-8") as f:
         data = json.load(f)
 
-    last_msgs = data["messages"][-5:]  # Increased from 3 to 5
-    context = ""
+    last_msgs = data["messages"][-CONTEXT_TURNS:] if CONTEXT_TURNS > 0 else []
+    summary = data.get("conversation_summary")
+    if summary is None:  # memory written before rolling summaries
+        summary = _new_summary(data["messages"][:-CONTEXT_TURNS] if CONTEXT_TURNS > 0 else data["messages"])
+    context = _render_summary(summary, include_emotions)
     
     for msg in last_msgs:
+        user, bot = _clip(msg["user"]), _clip(msg["bot"])
         if include_emotions and msg.get("emotion"):
-            context += f"User ({msg['emotion']}): {msg['user']}\nBot: {msg['bot']}\n"
+            context += f"User ({msg['emotion']}): {user}\nBot: {bot}\n"
         else:
-            context += f"User: {msg['user']}\nBot: {msg['bot']}\n"
+            context += f"User: {user}\nBot: {bot}\n"
 
     return context
 
@@ -58,24 +58,15 @@ def check_vosk_model():
         return False
 
 def initialize_nltk():
-    """Initialize NLTK data if needed"""
+    """Check that NLTK data is available locally (no downloads at startup)"""
     try:
-        import nltk
-        try:
-            nltk.data.find('vader_lexicon')
-            print("✅ NLTK VADER lexicon available")
-        except LookupError:
-            print("📥 Downloading NLTK VADER lexicon...")
-            nltk.download('vader_lexicon', quiet=True)
-            print("✅ NLTK VADER lexicon downloaded")
+        from utils.nltk_resources import find_resource, get_bundle_dir
         
-        try:
-            nltk.data.find('punkt')
-            print("✅ NLTK punkt tokenizer available")
-        except LookupError:
-            print("📥 Downloading NLTK punkt tokenizer...")
-            nltk.download('punkt', quiet=True)
-            print("✅ NLTK punkt tokenizer downloaded")
+        if find_resource('vader_lexicon'):
+            print("✅ NLTK VADER lexicon available")
+        else:
+            print("⚠️ NLTK VADER lexicon not found - sentiment fallback disabled")
+            print(f"Run 'python setup.py' or copy NLTK data into: {get_bundle_dir()}")
         
         return True
     except Exception as e:
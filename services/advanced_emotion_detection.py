@@ -1,21 +1,31 @@
 # services/advanced_emotion_detection.py
+import os
 import re
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
 from typing import Dict, List, Tuple, Optional
 import json
+from collections import deque
 from datetime import datetime
+from functools import lru_cache
 
-# Download required NLTK data
+# VADER is only a fallback, so NLTK is resolved offline and loaded on first use
+from utils.nltk_resources import get_sentiment_analyzer
+from services.language_routing import (
+    FOLDED_ROUTES, LEXICON_ROUTES, ROMANIZED_HINDI_WORDS,
+    fold_romanization, identify_language, transliterate_devanagari
+)
+from services.phonetic_index import ENGLISH_STOPWORDS, PhoneticIndex, tokens_of
+
+# Engine selection
 try:
-    nltk.download('vader_lexicon', quiet=True)
-    nltk.download('punkt', quiet=True)
-    nltk.download('stopwords', quiet=True)
-except:
-    pass
+    from config import EMOTION_ENGINE, EMOTION_MODEL_PATH
+except Exception:
+    EMOTION_ENGINE = os.getenv("EMOTION_ENGINE", "keyword")
+    EMOTION_MODEL_PATH = os.getenv("EMOTION_MODEL_PATH", os.path.join("data", "models", "emotion_linear.npz"))
 
-# Initialize VADER analyzer
-sia = SentimentIntensityAnalyzer()
+try:
+    from config import PHONETIC_MATCHING
+except Exception:
+    PHONETIC_MATCHING = os.getenv("PHONETIC_MATCHING", "1") == "1"
 
 # Comprehensive emotion mapping with Indian cultural context
 EMOTION_KEYWORDS = {
@@ -148,56 +158,211 @@ REGIONAL_PATTERNS = {
     "east_indian": ["dada", "didi", "boudi", "jethu", "kaku"]
 }
 
+# Cultural expression type -> (emotion, score boost) for primary detection
+CULTURAL_EMOTION_MAP = {
+    "stress": ("anxious", 2),
+    "happiness": ("happy", 2),
+    "sadness": ("sad", 2),
+    "anger": ("angry", 2),
+    "fear": ("anxious", 1.5),
+    "worry": ("anxious", 1.5),
+}
+
+# Cultural expression type -> emotion boosted in multi-emotion detection
+CULTURAL_MULTI_BOOST = {"stress": "anxious", "happiness": "happy"}
+
+# Tokens that mark romanized Hindi input (function words + Hindi lexicon words)
+HINDI_MARKERS = ROMANIZED_HINDI_WORDS | frozenset(
+    token
+    for keywords_dict in EMOTION_KEYWORDS.values()
+    for keyword in keywords_dict.get("hindi", [])
+    for token in keyword.replace("-", " ").split()
+)
+
+# Fuzzy index over romanized Hindi lexicon tokens (English lexicon words are matched exactly)
+EMOTION_PHONETIC_INDEX = PhoneticIndex(
+    tokens_of(
+        keyword
+        for keywords_dict in EMOTION_KEYWORDS.values()
+        for lang in ("hindi", "hinglish")
+        for keyword in keywords_dict.get(lang, [])
+    )
+    | tokens_of(expr for expressions in CULTURAL_EXPRESSIONS.values() for expr in expressions)
+    - tokens_of(keyword for keywords_dict in EMOTION_KEYWORDS.values() for keyword in keywords_dict["english"]),
+    protected=ENGLISH_STOPWORDS | ROMANIZED_HINDI_WORDS,
+)
+
+def _build_route_index(route: str) -> Tuple[tuple, tuple, tuple]:
+    """Flatten the lexicons a route needs into (keyword, emotion, weight) tuples"""
+    weights = LEXICON_ROUTES[route]
+    folded = route in FOLDED_ROUTES
+    fold = fold_romanization if folded else (lambda value: value)
+    
+    keywords = tuple(
+        (fold(keyword), emotion, weights[lang])
+        for emotion, keywords_dict in EMOTION_KEYWORDS.items()
+        for lang, lang_keywords in keywords_dict.items() if lang in weights
+        for keyword in lang_keywords
+    )
+    # Cultural idioms and regional terms are romanized Hindi, so English input skips them
+    cultural = tuple(
+        (fold(expr), emotion_type)
+        for emotion_type, expressions in CULTURAL_EXPRESSIONS.items()
+        for expr in expressions
+    ) if folded else ()
+    regional = tuple(
+        (region, tuple(patterns)) for region, patterns in REGIONAL_PATTERNS.items()
+    ) if folded else ()
+    return keywords, cultural, regional
+
+ROUTE_INDEX = {route: _build_route_index(route) for route in LEXICON_ROUTES}
+
+@lru_cache(maxsize=512)
+def _route_text(text: str) -> Tuple[str, str, str]:
+    """Return (route, romanized lowercase text, text normalized for lexicon matching)"""
+    text_lower = text.lower()
+    route = identify_language(text_lower, HINDI_MARKERS)
+    if PHONETIC_MATCHING and route != "devanagari":
+        # English text is only rewritten when the correction reveals Hindi terms
+        corrected = EMOTION_PHONETIC_INDEX.correct_text(text_lower)
+        corrected_route = identify_language(corrected, HINDI_MARKERS)
+        if route == "hinglish" or corrected_route != "english":
+            text_lower, route = corrected, corrected_route
+    if route in FOLDED_ROUTES:
+        romanized = transliterate_devanagari(text_lower)
+        return route, romanized, fold_romanization(romanized)
+    return route, text_lower, text_lower
+
+@lru_cache(maxsize=256)
+def _scan_lexicons(text: str) -> Tuple[str, int, tuple, tuple]:
+    """Single keyword/idiom pass shared by primary and multi-emotion detection"""
+    route, _, normalized = _route_text(text)
+    keywords, cultural, _ = ROUTE_INDEX[route]
+    
+    scores: Dict[str, float] = {}
+    for keyword, emotion, weight in keywords:
+        if keyword in normalized:
+            scores[emotion] = scores.get(emotion, 0) + weight
+    cultural_hits = tuple(emotion_type for expr, emotion_type in cultural if expr in normalized)
+    
+    return route, len(normalized.split()), tuple(scores.items()), cultural_hits
+
+# Compact integer IDs for trend tracking (new labels are appended on first use)
+EMOTION_NAMES: List[str] = list(EMOTION_KEYWORDS) + ["neutral"]
+EMOTION_IDS: Dict[str, int] = {emotion: idx for idx, emotion in enumerate(EMOTION_NAMES)}
+
+HISTORY_SIZE = 50
+TREND_WINDOW = 10
+
+def _emotion_id(emotion: str) -> int:
+    """Map an emotion label to its compact ID"""
+    idx = EMOTION_IDS.get(emotion)
+    if idx is None:
+        idx = len(EMOTION_NAMES)
+        EMOTION_NAMES.append(emotion)
+        EMOTION_IDS[emotion] = idx
+    return idx
+
+class EmotionTrendTracker:
+    """Fixed-size ring of emotion IDs with running counts.
+    
+    Push/evict keep the window counts current, so dominant emotion and
+    strength are read in O(1). The dominant label is re-derived (over the
+    window) after an eviction or a tie; ties go to the emotion seen first
+    in the window, as the list-based trends did.
+    """
+    
+    def __init__(self, window_size: int = TREND_WINDOW):
+        self.window_size = window_size
+        self._ring = [-1] * window_size
+        self._head = 0
+        self._size = 0
+        self._counts = [0] * len(EMOTION_NAMES)
+        self._dominant = -1
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    def push(self, emotion: str):
+        """Add an emotion to the window, evicting the oldest when full"""
+        new_id = _emotion_id(emotion)
+        if new_id >= len(self._counts):
+            self._counts.extend([0] * (new_id + 1 - len(self._counts)))
+        
+        evicted = -1
+        if self._size == self.window_size:
+            evicted = self._ring[self._head]
+            self._counts[evicted] -= 1
+        else:
+            self._size += 1
+        
+        self._ring[self._head] = new_id
+        self._head = (self._head + 1) % self.window_size
+        self._counts[new_id] += 1
+        
+        if evicted >= 0 or (self._dominant >= 0 and self._counts[new_id] == self._counts[self._dominant]):
+            self._dominant = self._first_most_common()  # eviction reorders the window, or a tie
+        elif self._dominant < 0 or self._counts[new_id] > self._counts[self._dominant]:
+            self._dominant = new_id
+    
+    def _first_most_common(self) -> int:
+        """Most frequent ID in the window, earliest first occurrence on ties"""
+        best = max(self._counts)
+        start = self._head - self._size
+        for offset in range(self._size):
+            idx = self._ring[(start + offset) % self.window_size]
+            if self._counts[idx] == best:
+                return idx
+        return -1
+    
+    def dominant_emotion(self) -> Optional[str]:
+        return EMOTION_NAMES[self._dominant] if self._size else None
+    
+    def strength(self) -> float:
+        return self._counts[self._dominant] / self._size if self._size else 0.0
+    
+    def distribution(self) -> Dict[str, int]:
+        return {EMOTION_NAMES[idx]: count for idx, count in enumerate(self._counts) if count}
+
 class AdvancedEmotionDetector:
-    def __init__(self):
-        self.emotion_history = []
+    def __init__(self, engine: str = EMOTION_ENGINE, model_path: str = EMOTION_MODEL_PATH):
+        # Compact per-turn records (no raw text) and the O(1) trend window
+        self.emotion_history = deque(maxlen=HISTORY_SIZE)
+        self.trend_tracker = EmotionTrendTracker(TREND_WINDOW)
         self.cultural_context = "indian"
-        
+        self.engine = engine
+        self.model_path = model_path
+        self._linear_model = None
+    
+    def _get_linear_model(self):
+        """Load the linear engine on first use; fall back to keywords if unavailable"""
+        if self._linear_model is None:
+            try:
+                from services.linear_emotion_model import LinearEmotionClassifier
+                self._linear_model = LinearEmotionClassifier.load(self.model_path)
+            except Exception as e:
+                print(f"[EMOTION ENGINE WARNING] Linear model unavailable ({e}); using keyword engine")
+                self.engine = "keyword"
+        return self._linear_model
+    
     def detect_primary_emotion(self, text: str) -> Tuple[str, float]:
         """Detect the primary emotion with confidence score"""
-        text_lower = text.lower()
+        _, word_count, keyword_scores, cultural_hits = _scan_lexicons(text)
         emotion_scores = {}
         
-        # Check keyword matches with cultural context
-        for emotion, keywords_dict in EMOTION_KEYWORDS.items():
-            score = 0
-            total_keywords = 0
-            
-            for lang, keywords in keywords_dict.items():
-                for keyword in keywords:
-                    if keyword in text_lower:
-                        # Weight different languages
-                        if lang == "hinglish":
-                            score += 2  # Higher weight for Hinglish
-                        elif lang == "hindi":
-                            score += 1.5  # Medium weight for Hindi
-                        else:
-                            score += 1  # Base weight for English
-                        total_keywords += 1
-            
-            if total_keywords > 0:
-                emotion_scores[emotion] = score / max(1, len(text_lower.split()) / 10)
+        # Keyword matches, weighted per language by the route
+        for emotion, score in keyword_scores:
+            emotion_scores[emotion] = score / max(1, word_count / 10)
         
-        # Check cultural expressions
-        for emotion_type, expressions in CULTURAL_EXPRESSIONS.items():
-            for expr in expressions:
-                if expr in text_lower:
-                    # Map cultural expressions to emotions
-                    if emotion_type == "stress":
-                        emotion_scores["anxious"] = emotion_scores.get("anxious", 0) + 2
-                    elif emotion_type == "happiness":
-                        emotion_scores["happy"] = emotion_scores.get("happy", 0) + 2
-                    elif emotion_type == "sadness":
-                        emotion_scores["sad"] = emotion_scores.get("sad", 0) + 2
-                    elif emotion_type == "anger":
-                        emotion_scores["angry"] = emotion_scores.get("angry", 0) + 2
-                    elif emotion_type == "fear":
-                        emotion_scores["anxious"] = emotion_scores.get("anxious", 0) + 1.5
-                    elif emotion_type == "worry":
-                        emotion_scores["anxious"] = emotion_scores.get("anxious", 0) + 1.5
+        # Map cultural expressions to emotions
+        for emotion_type in cultural_hits:
+            if emotion_type in CULTURAL_EMOTION_MAP:
+                emotion, boost = CULTURAL_EMOTION_MAP[emotion_type]
+                emotion_scores[emotion] = emotion_scores.get(emotion, 0) + boost
         
         # Fallback to VADER sentiment analysis
-        if not emotion_scores:
+        sia = get_sentiment_analyzer() if not emotion_scores else None
+        if sia is not None:
             sentiment = sia.polarity_scores(text)
             compound = sentiment['compound']
             
@@ -221,39 +386,18 @@ class AdvancedEmotionDetector:
     
     def detect_multiple_emotions(self, text: str) -> Dict[str, float]:
         """Detect multiple emotions with their confidence scores"""
-        text_lower = text.lower()
+        _, word_count, keyword_scores, cultural_hits = _scan_lexicons(text)
         emotion_scores = {}
         
-        # Analyze each emotion category
-        for emotion, keywords_dict in EMOTION_KEYWORDS.items():
-            score = 0
-            matches = 0
-            
-            for lang, keywords in keywords_dict.items():
-                for keyword in keywords:
-                    if keyword in text_lower:
-                        if lang == "hinglish":
-                            score += 2
-                        elif lang == "hindi":
-                            score += 1.5
-                        else:
-                            score += 1
-                        matches += 1
-            
-            if matches > 0:
-                # Normalize by text length and number of matches
-                normalized_score = score / max(1, len(text_lower.split()) / 5)
-                emotion_scores[emotion] = min(normalized_score, 1.0)
+        # Normalize by text length and number of matches
+        for emotion, score in keyword_scores:
+            emotion_scores[emotion] = min(score / max(1, word_count / 5), 1.0)
         
         # Add cultural context boost
-        for emotion_type, expressions in CULTURAL_EXPRESSIONS.items():
-            for expr in expressions:
-                if expr in text_lower:
-                    if emotion_type == "stress" and "anxious" in emotion_scores:
-                        emotion_scores["anxious"] += 0.3
-                    elif emotion_type == "happiness" and "happy" in emotion_scores:
-                        emotion_scores["happy"] += 0.3
-                    # Add more mappings as needed
+        for emotion_type in cultural_hits:
+            emotion = CULTURAL_MULTI_BOOST.get(emotion_type)
+            if emotion in emotion_scores:
+                emotion_scores[emotion] += 0.3
         
         # Remove emotions with very low scores
         emotion_scores = {k: v for k, v in emotion_scores.items() if v > 0.1}
@@ -262,10 +406,10 @@ class AdvancedEmotionDetector:
     
     def detect_regional_context(self, text: str) -> Optional[str]:
         """Detect regional linguistic patterns"""
-        text_lower = text.lower()
+        route, romanized, _ = _route_text(text)
         
-        for region, patterns in REGIONAL_PATTERNS.items():
-            matches = sum(1 for pattern in patterns if pattern in text_lower)
+        for region, patterns in ROUTE_INDEX[route][2]:
+            matches = sum(1 for pattern in patterns if pattern in romanized)
             if matches >= 2:
                 return region
         
@@ -273,7 +417,7 @@ class AdvancedEmotionDetector:
     
     def get_emotion_intensity(self, emotion: str, text: str) -> str:
         """Determine the intensity of an emotion (low, medium, high)"""
-        text_lower = text.lower()
+        _, text_lower, _ = _route_text(text)
         
         # Intensity indicators
         high_intensity = ["very", "extremely", "really", "so", "too", "bahut", "bohot", "ekdam", "bilkul"]
@@ -291,14 +435,20 @@ class AdvancedEmotionDetector:
     
     def analyze_emotion_context(self, text: str) -> Dict:
         """Comprehensive emotion analysis"""
-        primary_emotion, confidence = self.detect_primary_emotion(text)
-        multiple_emotions = self.detect_multiple_emotions(text)
+        linear_model = self._get_linear_model() if self.engine == "linear" else None
+        if linear_model is not None:
+            primary_emotion, confidence = linear_model.predict(text)
+            multiple_emotions = linear_model.predict_scores(text)
+        else:
+            primary_emotion, confidence = self.detect_primary_emotion(text)
+            multiple_emotions = self.detect_multiple_emotions(text)
         regional_context = self.detect_regional_context(text)
         intensity = self.get_emotion_intensity(primary_emotion, text)
         
         # Store in history
         emotion_data = {
             "text": text,
+            "language": _route_text(text)[0],
             "primary_emotion": primary_emotion,
             "confidence": confidence,
             "multiple_emotions": multiple_emotions,
@@ -307,26 +457,34 @@ class AdvancedEmotionDetector:
             "timestamp": datetime.now().isoformat()
         }
         
-        self.emotion_history.append(emotion_data)
-        if len(self.emotion_history) > 50:  # Keep last 50 entries
-            self.emotion_history = self.emotion_history[-50:]
+        self.emotion_history.append({
+            "primary_emotion": primary_emotion,
+            "confidence": confidence,
+            "intensity": intensity,
+            "timestamp": emotion_data["timestamp"]
+        })
+        self.trend_tracker.push(primary_emotion)
         
         return emotion_data
     
-    def get_emotion_trends(self, window_size: int = 10) -> Dict:
+    def get_emotion_trends(self, window_size: int = TREND_WINDOW) -> Dict:
         """Analyze emotion trends over recent conversations"""
         if len(self.emotion_history) < 2:
             return {"trend": "insufficient_data"}
         
-        recent_emotions = self.emotion_history[-window_size:]
-        emotion_counts = {}
-        
-        for entry in recent_emotions:
-            emotion = entry["primary_emotion"]
-            emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
-        
-        dominant_emotion = max(emotion_counts, key=emotion_counts.get)
-        trend_strength = emotion_counts[dominant_emotion] / len(recent_emotions)
+        if window_size == self.trend_tracker.window_size:
+            dominant_emotion = self.trend_tracker.dominant_emotion()
+            trend_strength = self.trend_tracker.strength()
+            emotion_counts = self.trend_tracker.distribution()
+        else:
+            # Non-default windows are computed from the compact history
+            recent_emotions = list(self.emotion_history)[-window_size:]
+            emotion_counts = {}
+            for entry in recent_emotions:
+                emotion = entry["primary_emotion"]
+                emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+            dominant_emotion = max(emotion_counts, key=emotion_counts.get)
+            trend_strength = emotion_counts[dominant_emotion] / len(recent_emotions)
         
         return {
             "trend": "stable" if trend_strength < 0.4 else "strong",
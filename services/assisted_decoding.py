@@ -0,0 +1,100 @@
+# services/assisted_decoding.py
+import threading
+import weakref
+from typing import Optional
+
+from utils.metrics import metrics
+
+# Below this acceptance rate drafting costs more verification time than it saves
+MIN_ACCEPTANCE_RATE = 0.3
+ACCEPTANCE_SAMPLE_TOKENS = 500  # drafted tokens to see before judging
+
+
+def can_draft_for(model, draft_model) -> bool:
+    """A draft model can assist when it is a different model over the same vocabulary"""
+    if model is None or draft_model is None or draft_model is model:
+        return False
+    try:
+        return model.config.get_text_config().vocab_size == draft_model.config.get_text_config().vocab_size
+    except AttributeError:
+        return False
+
+
+# The DraftCounter active on each thread; generate() runs its forward passes on the calling thread
+_active = threading.local()
+_hooked_models = weakref.WeakSet()
+_hooked_lock = threading.Lock()
+
+
+def _report_forward(module, args, output):
+    counter = getattr(_active, "counter", None)
+    if counter is not None:
+        counter._count(module)
+
+
+def _ensure_hooked(model):
+    """Give a model its one lasting forward hook, which reports to the thread's counter"""
+    with _hooked_lock:
+        if model not in _hooked_models:
+            model.register_forward_hook(_report_forward)
+            _hooked_models.add(model)
+
+
+class DraftCounter:
+    """Counts the draft and verification forward passes of one assisted generation.
+
+    Each forward of the draft model proposes one token; each forward of the
+    main model verifies a block of proposals and emits the accepted ones plus
+    one token of its own, so accepted = generated - verification passes.
+    The (shared) models report every forward to the counter entered on the
+    calling thread, so concurrent generations are counted apart and never
+    wait on each other.
+    """
+
+    def __init__(self, model, draft_model):
+        self.model = model
+        self.draft_model = draft_model
+        self.drafted = 0
+        self.verified = 0
+        self._outer = None
+
+    def _count(self, module):
+        if module is self.draft_model:
+            self.drafted += 1
+        elif module is self.model:
+            self.verified += 1
+
+    def __enter__(self):
+        _ensure_hooked(self.draft_model)
+        _ensure_hooked(self.model)
+        self._outer = getattr(_active, "counter", None)
+        _active.counter = self
+        return self
+
+    def __exit__(self, *exc_info):
+        _active.counter = self._outer
+        self._outer = None
+
+    def accepted(self, generated_tokens: int) -> int:
+        return max(0, min(generated_tokens - self.verified, self.drafted))
+
+    def record(self, generated_tokens: int) -> Optional[float]:
+        """Add this generation to the draft metrics; returns its acceptance rate"""
+        accepted = self.accepted(generated_tokens)
+        metrics.increment("draft_tokens", self.drafted)
+        metrics.increment("draft_tokens_accepted", accepted)
+        metrics.increment("draft_verify_passes", self.verified)
+        return accepted / self.drafted if self.drafted else None
+
+
+def acceptance_rate() -> Optional[float]:
+    """Share of drafted tokens the main model accepted, over all assisted generations so far"""
+    drafted = metrics.counter("draft_tokens")
+    return metrics.counter("draft_tokens_accepted") / drafted if drafted else None
+
+
+def drafting_pays_off() -> bool:
+    """False once enough tokens were drafted to show the main model mostly rejects them"""
+    if metrics.counter("draft_tokens") < ACCEPTANCE_SAMPLE_TOKENS:
+        return True
+    return acceptance_rate() >= MIN_ACCEPTANCE_RATE
@@ -1,12 +1,5 @@
 # services/emotion_detection.py
-import nltk
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-
-# Download VADER lexicon (only once)
-nltk.download('vader_lexicon')
-
-# Initialize analyzer
-sia = SentimentIntensityAnalyzer()
+from utils.nltk_resources import get_sentiment_analyzer
 
 def detect_emotion(text):
     """
@@ -24,7 +17,10 @@ def detect_emotion(text):
     elif any(word in text_lower for word in ["angry", "mad", "furious", "frustrated", "annoyed"]):
         return "angry"
 
-    # Fallback: VADER sentiment analysis
+    # Fallback: VADER sentiment analysis (analyzer is built on first use)
+    sia = get_sentiment_analyzer()
+    if sia is None:
+        return "neutral"
     scores = sia.polarity_scores(text_lower)
     compound = scores['compound']
 
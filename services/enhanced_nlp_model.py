@@ -1,11 +1,22 @@
 # services/enhanced_nlp_model.py
 import os
+import queue
 import re
-import random
-from typing import Optional, Dict, List
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+from typing import Optional, Dict, Iterator, List, Mapping, Sequence, Tuple
 from datetime import datetime
 
+from services.assisted_decoding import DraftCounter, acceptance_rate, can_draft_for, drafting_pays_off
+from services.generation_scheduler import get_generation_scheduler
+from services.model_registry import model_registry
+from services.prefix_cache import get_prefix_cache
+from services.prompt_builder import PromptBuilder, get_prompt_builder, split_context_turns
+from services.reply_cache import reply_cache
+from services.response_templates import ResponseTemplates
+from utils.metrics import metrics
+
 # Configuration
 try:
     from config import MODEL_NAME, MAX_NEW_TOKENS, TEMPERATURE, TOP_P, TOP_K, REPETITION_PENALTY
@@ -17,20 +28,153 @@ except Exception:
     TOP_K = int(os.getenv("TOP_K", "50"))
     REPETITION_PENALTY = float(os.getenv("REPETITION_PENALTY", "1.15"))
 
-FALLBACK_MODEL = "distilgpt2"
+try:
+    from config import PREFIX_CACHE, PROMPT_TOKEN_BUDGET
+except Exception:
+    PREFIX_CACHE = os.getenv("PREFIX_CACHE", "1") != "0"
+    PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "768"))
+
+try:
+    from config import MAX_REPLY_SENTENCES, MAX_REPLY_CHARS
+except Exception:
+    MAX_REPLY_SENTENCES = int(os.getenv("MAX_REPLY_SENTENCES", "4"))
+    MAX_REPLY_CHARS = int(os.getenv("MAX_REPLY_CHARS", "600"))
+
+try:
+    from config import MODEL_QUANTIZATION
+except Exception:
+    MODEL_QUANTIZATION = os.getenv("MODEL_QUANTIZATION") or None
+
+try:
+    from config import INFERENCE_BACKEND
+except Exception:
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
 
-def _load_pipeline(model_name: str):
-    tok = AutoTokenizer.from_pretrained(model_name)
-    if tok.pad_token is None and tok.eos_token is not None:
-        tok.pad_token = tok.eos_token
-    mdl = AutoModelForCausalLM.from_pretrained(model_name)
-    gen = pipeline("text-generation", model=mdl, tokenizer=tok)
-    return gen, tok
+try:
+    from config import DRAFT_MODEL
+except Exception:
+    DRAFT_MODEL = os.getenv("DRAFT_MODEL") or None
 
 try:
-    generator, tokenizer = _load_pipeline(MODEL_NAME)
+    from config import GENERATION_DEADLINE_SECONDS
 except Exception:
-    generator, tokenizer = _load_pipeline(FALLBACK_MODEL)
+    GENERATION_DEADLINE_SECONDS = float(os.getenv("GENERATION_DEADLINE_SECONDS", "8"))
+
+try:
+    from config import TWO_STAGE_REPLY
+except Exception:
+    TWO_STAGE_REPLY = os.getenv("TWO_STAGE_REPLY", "1") != "0"
+
+try:
+    from config import GENERATION_BATCH_SIZE, GENERATION_BATCH_WINDOW_MS
+except Exception:
+    GENERATION_BATCH_SIZE = int(os.getenv("GENERATION_BATCH_SIZE", "1"))
+    GENERATION_BATCH_WINDOW_MS = float(os.getenv("GENERATION_BATCH_WINDOW_MS", "10"))
+
+# Registry settings; modules asking for the same settings share one model
+MODEL_SETTINGS = {"quantize": MODEL_QUANTIZATION} if MODEL_QUANTIZATION else {}
+if INFERENCE_BACKEND != "torch":
+    MODEL_SETTINGS["backend"] = INFERENCE_BACKEND
+
+FALLBACK_MODEL = "distilgpt2"
+
+DEFAULT_REPLY = "I'm here with you. Would you like to tell me more about what's on your mind?"
+
+# Draft model for assisted decoding, set once the main model has loaded
+_draft_model = None
+
+def _load_draft_model(generator):
+    """DRAFT_MODEL's torch model, if it loads and shares the main model's vocabulary"""
+    try:
+        draft_generator, _ = model_registry.acquire(DRAFT_MODEL, **MODEL_SETTINGS)
+    except Exception as e:
+        print(f"[NLP MODEL WARNING] Could not load draft model {DRAFT_MODEL} ({e}); decoding without it")
+        return None
+    if not can_draft_for(getattr(generator, "model", None), draft_generator.model):
+        print(f"[NLP MODEL WARNING] {DRAFT_MODEL} cannot draft for the generation model; decoding without it")
+        model_registry.release(DRAFT_MODEL, **MODEL_SETTINGS)
+        return None
+    return draft_generator.model
+
+def _load_model() -> Tuple:
+    global _draft_model
+    try:
+        loaded = model_registry.acquire(MODEL_NAME, **MODEL_SETTINGS)
+    except Exception as e:
+        print(f"[NLP MODEL WARNING] Could not load {MODEL_NAME} ({e}); falling back to {FALLBACK_MODEL}")
+        loaded = model_registry.acquire(FALLBACK_MODEL, **MODEL_SETTINGS)
+    if DRAFT_MODEL:
+        _draft_model = _load_draft_model(loaded[0])
+    
+    # Precompute the static prompt prefixes while we are still off the turn path
+    prefix_cache = get_prefix_cache(loaded[0]) if PREFIX_CACHE else None
+    if prefix_cache is not None:
+        try:
+            prefix_cache.warm(_static_prefix(emotion) for emotion in FEW_SHOTS)
+        except Exception as e:
+            print(f"[NLP MODEL WARNING] Prefix cache warm-up failed: {e}")
+    return loaded
+
+# The generation model loads on a background thread behind this future;
+# turns are answered from templates until it is ready
+_model_future: Optional[Future] = None
+_model_lock = threading.Lock()
+
+def start_model_loading() -> Future:
+    """Start loading the generation model in the background (idempotent)"""
+    global _model_future
+    with _model_lock:
+        if _model_future is None:
+            future = Future()
+            
+            def load():
+                try:
+                    future.set_result(_load_model())
+                except BaseException as e:
+                    print(f"[NLP MODEL ERROR] Model loading failed: {e}")
+                    future.set_exception(e)
+            
+            threading.Thread(target=load, daemon=True, name="nlp-model-loader").start()
+            _model_future = future
+        return _model_future
+
+def _forget_unloaded(generator):
+    """Drop our references to a model the registry unloaded; the next turn loads it again"""
+    global _model_future, _draft_model
+    with _model_lock:
+        future = _model_future
+        if future is not None and future.done() and future.exception() is None and future.result()[0] is generator:
+            _model_future = None
+            if _draft_model is not None:
+                # Re-acquired along with the main model on the next load
+                _draft_model = None
+                model_registry.release(DRAFT_MODEL, **MODEL_SETTINGS)
+        if _draft_model is not None and _draft_model is getattr(generator, "model", None):
+            _draft_model = None
+
+model_registry.add_unload_listener(_forget_unloaded)
+
+def get_model_status() -> str:
+    """'not_loaded', 'loading', 'ready' or 'failed'"""
+    future = _model_future
+    if future is None:
+        return "not_loaded"
+    if not future.done():
+        return "loading"
+    return "failed" if future.exception() is not None else "ready"
+
+def is_model_ready() -> bool:
+    return get_model_status() == "ready"
+
+def get_generator(wait: bool = False, timeout: Optional[float] = None) -> Optional[Tuple]:
+    """(generator, tokenizer) once loaded; None while loading unless wait=True"""
+    future = start_model_loading()
+    if not wait and not future.done():
+        return None
+    try:
+        return future.result(timeout)
+    except Exception:
+        return None
 
 # Enhanced system prompt with cultural sensitivity
 SYSTEM_STYLE = (
@@ -256,153 +400,142 @@ COPING_STRATEGIES = {
     ]
 }
 
-def get_emotion_specific_response(emotion: str, intensity: str = "medium") -> Dict[str, List[str]]:
+# Replaces these response groups at high intensity
+HIGH_INTENSITY_RESPONSES = {
+    "sad": {
+        "acknowledgments": [
+            "I can hear the deep pain in your words. I'm right here with you. 💙",
+            "This sounds incredibly difficult. You don't have to face this alone.",
+            "Main samajh raha hun kitna mushkil waqt hai. I'm here."
+        ]
+    },
+    "angry": {
+        "calming": [
+            "This anger feels really intense. Let's breathe together right now.",
+            "I can feel how frustrated you are. Let's find a safe way to release this.",
+            "Bohot zyada gussa aa raha hai. Let's pause and breathe."
+        ]
+    }
+}
+
+# Opening lines for two-stage replies when the emotion has no acknowledgments of its own
+NEUTRAL_ACKNOWLEDGMENTS = [
+    "I'm listening.",
+    "Thank you for sharing that with me.",
+    "Main sun raha hun.",
+    "I hear you."
+]
+
+# Keywords that point to each cultural context
+CULTURAL_KEYWORDS = {
+    "family_pressure": ["family", "parents", "ghar wale", "mummy", "papa", "relatives", "rishta", "shaadi"],
+    "career_stress": ["job", "work", "career", "office", "boss", "salary", "promotion", "naukri"],
+    "relationship_issues": ["boyfriend", "girlfriend", "love", "breakup", "relationship", "pyaar"],
+    "social_expectations": ["society", "log", "friends", "social media", "comparison", "status"]
+}
+
+# The tables above, compiled into read-only lookups at import
+_templates = ResponseTemplates(EMOTION_RESPONSES, HIGH_INTENSITY_RESPONSES, CULTURAL_CONTEXTS,
+                               COPING_STRATEGIES, CULTURAL_KEYWORDS)
+
+def get_emotion_specific_response(emotion: str, intensity: str = "medium") -> Mapping[str, Tuple[str, ...]]:
     """Get appropriate responses based on emotion and intensity"""
-    if emotion not in EMOTION_RESPONSES:
-        emotion = "neutral"
-    
-    responses = EMOTION_RESPONSES.get(emotion, {})
-    
-    # Adjust responses based on intensity
-    if intensity == "high":
-        # For high intensity, use more urgent/immediate responses
-        if emotion == "sad":
-            responses["acknowledgments"] = [
-                "I can hear the deep pain in your words. I'm right here with you. 💙",
-                "This sounds incredibly difficult. You don't have to face this alone.",
-                "Main samajh raha hun kitna mushkil waqt hai. I'm here."
-            ]
-        elif emotion == "angry":
-            responses["calming"] = [
-                "This anger feels really intense. Let's breathe together right now.",
-                "I can feel how frustrated you are. Let's find a safe way to release this.",
-                "Bohot zyada gussa aa raha hai. Let's pause and breathe."
-            ]
-    
-    return responses
+    return _templates.responses(emotion, intensity)
 
 def detect_cultural_context(text: str) -> List[str]:
     """Detect cultural context clues in the text"""
-    text_lower = text.lower()
-    contexts = []
-    
-    family_keywords = ["family", "parents", "ghar wale", "mummy", "papa", "relatives", "rishta", "shaadi"]
-    career_keywords = ["job", "work", "career", "office", "boss", "salary", "promotion", "naukri"]
-    relationship_keywords = ["boyfriend", "girlfriend", "love", "breakup", "relationship", "pyaar"]
-    social_keywords = ["society", "log", "friends", "social media", "comparison", "status"]
-    
-    if any(keyword in text_lower for keyword in family_keywords):
-        contexts.append("family_pressure")
-    if any(keyword in text_lower for keyword in career_keywords):
-        contexts.append("career_stress")
-    if any(keyword in text_lower for keyword in relationship_keywords):
-        contexts.append("relationship_issues")
-    if any(keyword in text_lower for keyword in social_keywords):
-        contexts.append("social_expectations")
-    
-    return contexts
+    return _templates.detect_contexts(text)
 
 def generate_culturally_aware_response(user_text: str, emotion: str, contexts: List[str], intensity: str) -> str:
     """Generate response considering cultural context"""
-    emotion_responses = get_emotion_specific_response(emotion, intensity)
-    
-    response_parts = []
-    
-    # Start with emotion acknowledgment
-    if "acknowledgments" in emotion_responses:
-        response_parts.append(random.choice(emotion_responses["acknowledgments"]))
-    
-    # Add cultural context awareness
-    for context in contexts[:1]:  # Use first context to keep response concise
-        if context in CULTURAL_CONTEXTS:
-            response_parts.append(random.choice(CULTURAL_CONTEXTS[context]))
-    
-    # Add supportive follow-up based on emotion
-    if emotion in ["sad", "anxious", "overwhelmed"] and "support" in emotion_responses:
-        response_parts.append(random.choice(emotion_responses["support"]))
-    elif emotion in ["happy", "grateful"] and "follow_ups" in emotion_responses:
-        response_parts.append(random.choice(emotion_responses["follow_ups"]))
-    
-    # Suggest coping strategy for negative emotions
-    if emotion in ["anxious", "angry", "overwhelmed"] and intensity in ["medium", "high"]:
-        if emotion == "anxious":
-            strategy = random.choice(COPING_STRATEGIES["breathing"])
-        elif emotion == "angry":
-            strategy = random.choice(COPING_STRATEGIES["grounding"])
-        elif emotion == "overwhelmed":
-            strategy = random.choice(COPING_STRATEGIES["mindfulness"])
-        else:
-            strategy = random.choice(COPING_STRATEGIES["self_compassion"])
-        
-        response_parts.append(f"Try this: {strategy}")
-    
-    # Combine response parts
-    response = " ".join(response_parts)
-    
-    # Ensure response isn't too long
-    if len(response) > 300:
-        response = response[:297] + "..."
-    
-    return response
-
-def _build_enhanced_prompt(user_text: str, context: Optional[str], emotion: str, emotion_data: Dict) -> str:
-    """Build enhanced prompt with emotion and cultural awareness"""
-    ctx = (context or "").strip()
-    
-    # Detect cultural contexts
-    cultural_contexts = detect_cultural_context(user_text)
+    return _templates.compose(emotion, intensity, contexts)
+
+# Few-shot examples per emotion; together with SYSTEM_STYLE they form the
+# static prompt prefix whose attention state is cached per variant
+FEW_SHOTS = {
+    "sad": [
+        ("User: I'm feeling really depressed and low today.\nAssistant:",
+         "I hear you, and I'm here with you. 💙 Depression can feel so heavy. Would you like to share what's weighing on your heart?"),
+        ("User: Bahut udaas feel kar raha hun, kuch achha nahi lag raha.\nAssistant:",
+         "Main samajh sakta hun. Udaasi ka ehsaas bahut painful hai. Kya aap batana chahenge ki kya pareshaan kar raha hai?")
+    ],
+    "anxious": [
+        ("User: I'm so worried about everything, can't stop thinking.\nAssistant:",
+         "Anxiety can be really overwhelming. Let's focus on your breathing for a moment. What's your biggest worry right now?"),
+        ("User: Bahut tension ho rahi hai, dimag mein bohot thoughts aa rahe.\nAssistant:",
+         "Ghabrahat normal hai, especially when thoughts race. Ek gehri saans lete hain together. Sabse zyada kya chinta hai?")
+    ],
+    "happy": [
+        ("User: I'm feeling so good today, everything is going well!\nAssistant:",
+         "That's wonderful to hear! 😊 Your happiness is contagious. What's making you feel so good today?"),
+        ("User: Aaj bahut khushi ho rahi hai, sab kuch achha chal raha.\nAssistant:",
+         "Bahut achhi baat hai! Khushi ki baat hai. Kya khaas baat hai jo aapko itna khush kar rahi hai?")
+    ],
+    "default": [
+        ("User: I don't know what to do about my situation.\nAssistant:",
+         "Uncertainty can feel overwhelming. I'm here to listen and support you. Would you like to share what's on your mind?"),
+        ("User: Samajh nahi aa raha kya karu.\nAssistant:",
+         "Confusion mein hona bilkul normal hai. Main yahan hun sunne ke liye. Kya share karna chahenge?")
+    ],
+}
+
+def _static_prefix(emotion: str) -> str:
+    """System prompt + few-shots for an emotion; identical across turns"""
+    segments = _prompt_segments("", "", emotion, {}, [])
+    return PromptBuilder.prefix_text(segments["system"], segments["few_shots"])
+
+def _prompt_segments(user_text: str, context: Optional[str], emotion: str, emotion_data: Dict,
+                     cultural_contexts: Optional[List[str]] = None, reply_start: str = "") -> Dict:
+    """Prompt pieces in PromptBuilder.build() form; cultural contexts are detected unless given"""
+    if cultural_contexts is None:
+        cultural_contexts = detect_cultural_context(user_text) if user_text else []
     intensity = emotion_data.get("intensity", "medium")
     
-    # Build context-aware system prompt
-    enhanced_system = SYSTEM_STYLE
+    # Turn-specific guidance goes after the cached prefix
+    notes = []
     if cultural_contexts:
-        enhanced_system += f" The user seems to be dealing with {', '.join(cultural_contexts)}."
+        notes.append(f"The user seems to be dealing with {', '.join(cultural_contexts)}.")
     if intensity == "high":
-        enhanced_system += " The user's emotional state seems intense - be extra supportive."
-    
-    # Few-shot examples based on emotion
-    few_shots = []
-    if emotion == "sad":
-        few_shots = [
-            ("User: I'm feeling really depressed and low today.\nAssistant:",
-             "I hear you, and I'm here with you. 💙 Depression can feel so heavy. Would you like to share what's weighing on your heart?"),
-            ("User: Bahut udaas feel kar raha hun, kuch achha nahi lag raha.\nAssistant:",
-             "Main samajh sakta hun. Udaasi ka ehsaas bahut painful hai. Kya aap batana chahenge ki kya pareshaan kar raha hai?")
-        ]
-    elif emotion == "anxious":
-        few_shots = [
-            ("User: I'm so worried about everything, can't stop thinking.\nAssistant:",
-             "Anxiety can be really overwhelming. Let's focus on your breathing for a moment. What's your biggest worry right now?"),
-            ("User: Bahut tension ho rahi hai, dimag mein bohot thoughts aa rahe.\nAssistant:",
-             "Ghabrahat normal hai, especially when thoughts race. Ek gehri saans lete hain together. Sabse zyada kya chinta hai?")
-        ]
-    elif emotion == "happy":
-        few_shots = [
-            ("User: I'm feeling so good today, everything is going well!\nAssistant:",
-             "That's wonderful to hear! 😊 Your happiness is contagious. What's making you feel so good today?"),
-            ("User: Aaj bahut khushi ho rahi hai, sab kuch achha chal raha.\nAssistant:",
-             "Bahut achhi baat hai! Khushi ki baat hai. Kya khaas baat hai jo aapko itna khush kar rahi hai?")
-        ]
-    else:
-        # Default few-shots
-        few_shots = [
-            ("User: I don't know what to do about my situation.\nAssistant:",
-             "Uncertainty can feel overwhelming. I'm here to listen and support you. Would you like to share what's on your mind?"),
-            ("User: Samajh nahi aa raha kya karu.\nAssistant:",
-             "Confusion mein hona bilkul normal hai. Main yahan hun sunne ke liye. Kya share karna chahenge?")
-        ]
-    
-    few_shot_block = "\n\n".join(s + " " + r for s, r in few_shots)
-    
-    prompt = (
-        f"System: {enhanced_system}\n"
-        f"{('Context: ' + ctx + '\n') if ctx else ''}"
-        f"Detected emotion: {emotion} (intensity: {intensity})\n"
-        f"{few_shot_block}\n\n"
+        notes.append("The user's emotional state seems intense - be extra supportive.")
+    
+    few_shots = FEW_SHOTS.get(emotion, FEW_SHOTS["default"])
+    return {
+        "system": f"System: {SYSTEM_STYLE}",
+        "few_shots": [s + " " + r for s, r in few_shots],
+        "user_text": user_text,
+        "context_turns": split_context_turns(context),
+        "before_context": f"Note: {' '.join(notes)}\n" if notes else "",
+        "after_context": f"Detected emotion: {emotion} (intensity: {intensity})\n",
+        "reply_start": reply_start,
+    }
+
+def _build_prompt_parts(user_text: str, context: Optional[str], emotion: str, emotion_data: Dict,
+                       cultural_contexts: Optional[List[str]] = None, reply_start: str = "") -> Tuple[str, str]:
+    """Split the prompt into its static prefix and the per-turn suffix, without a token budget"""
+    segments = _prompt_segments(user_text, context, emotion, emotion_data, cultural_contexts, reply_start)
+    turns = segments["context_turns"]
+    context_block = "Context: " + "".join(turns) if turns else ""
+    suffix = (
+        f"\n\n{segments['before_context']}"
+        f"{context_block}"
+        f"{segments['after_context']}"
         f"User: {user_text}\nAssistant:"
+        f"{' ' + segments['reply_start'] if segments['reply_start'] else ''}"
     )
-    
-    return prompt
+    return PromptBuilder.prefix_text(segments["system"], segments["few_shots"]), suffix
+
+def _prompt_budget(generator) -> int:
+    """Prompt tokens that leave room for MAX_NEW_TOKENS in the model's context window"""
+    config = getattr(getattr(generator, "model", None), "config", None) or getattr(generator, "config", None)
+    window = getattr(config, "n_positions", None) or getattr(config, "max_position_embeddings", None) or 1024
+    return max(0, min(PROMPT_TOKEN_BUDGET, window - MAX_NEW_TOKENS))
+
+def _build_enhanced_prompt(user_text: str, context: Optional[str], emotion: str, emotion_data: Dict,
+                           cultural_contexts: Optional[List[str]] = None, reply_start: str = "") -> str:
+    """Build enhanced prompt with emotion and cultural awareness"""
+    prefix, suffix = _build_prompt_parts(user_text, context, emotion, emotion_data, cultural_contexts,
+                                         reply_start)
+    return prefix + suffix
 
 def _postprocess_response(generated: str, emotion: str) -> str:
     """Enhanced postprocessing with emotion-aware adjustments"""
@@ -421,6 +554,220 @@ def _postprocess_response(generated: str, emotion: str) -> str:
     
     return generated
 
+# Incremental counterpart of _postprocess_response for streamed replies
+_STOP_MARKERS = ("\nUser:", "\nAssistant:")
+_SENTENCE_BREAK_RE = re.compile(r"(?<=[.!?।])\s+(?=\S)")
+
+def _split_sentences(text: str) -> List[str]:
+    return [s for s in (re.sub(r"\s+", " ", part).strip() for part in _SENTENCE_BREAK_RE.split(text)) if s]
+
+class StreamingPostprocessor:
+    """Cleans streamed generated text into sentences as they complete.
+    
+    Stops at the next speaker turn, collapses whitespace and drops repeated
+    sentences, like _postprocess_response, without waiting for the full reply.
+    """
+    
+    def __init__(self, already_said: Sequence[str] = ()):
+        self._raw = ""
+        self._emitted = 0  # complete sentences of the usable text already handled
+        self._seen = set(already_said)  # e.g. a two-stage reply's acknowledgment
+        self.stopped = False
+    
+    def _usable(self, final: bool) -> str:
+        text = self._raw
+        for marker in _STOP_MARKERS:
+            idx = text.find(marker)
+            if idx != -1:
+                text = text[:idx]
+                self.stopped = True
+        if not final and not self.stopped:
+            # Hold back a tail that could be the start of a stop marker
+            for marker in _STOP_MARKERS:
+                for size in range(len(marker) - 1, 0, -1):
+                    if text.endswith(marker[:size]):
+                        text = text[:-size]
+                        break
+        return text
+    
+    def _accept(self, sentences: List[str]) -> List[str]:
+        fresh = []
+        for sentence in sentences:
+            sentence = re.sub(r"\s+", " ", sentence).strip()
+            if sentence and sentence not in self._seen:
+                self._seen.add(sentence)
+                fresh.append(sentence)
+        return fresh
+    
+    def feed(self, text: str) -> List[str]:
+        """Add generated text; returns newly completed sentences"""
+        if self.stopped:
+            return []
+        self._raw += text
+        parts = _SENTENCE_BREAK_RE.split(self._usable(final=False))
+        # Everything but the last part is a finished sentence; after a stop marker, so is the last
+        complete = parts if self.stopped else parts[:-1]
+        fresh = self._accept(complete[self._emitted:])
+        self._emitted = len(complete)
+        return fresh
+    
+    def finish(self) -> List[str]:
+        """Flush the final, unterminated sentence"""
+        if self.stopped:
+            return []
+        parts = _SENTENCE_BREAK_RE.split(self._usable(final=True))
+        self.stopped = True
+        return self._accept(parts[self._emitted:])
+
+def _emotion_tone(reply: str, emotion: str) -> str:
+    """Emotion-specific emoji/tone appended to a generated reply ("" if none)"""
+    if emotion == "happy" and "😊" not in reply:
+        return "😊"
+    if emotion == "sad" and "💙" not in reply:
+        return "💙"
+    if emotion in ["anxious", "overwhelmed"] and "🤗" not in reply:
+        return "Take it one step at a time."
+    return ""
+
+def _template_reply(user_text: str, emotion: str, intensity: str, cultural_contexts: List[str]) -> Optional[str]:
+    """A substantial culturally-aware template reply, if one applies"""
+    if cultural_contexts or emotion != "neutral":
+        template_response = generate_culturally_aware_response(user_text, emotion, cultural_contexts, intensity)
+        if len(template_response) > 50:  # If we got a substantial response
+            return template_response
+    return None
+
+def _run_generation(generator, tokenizer, user_text: str, context: str, emotion: str,
+                    emotion_data: Dict, streamer=None, cancel: Optional[threading.Event] = None,
+                    cultural_contexts: Optional[List[str]] = None, reply_start: str = "") -> Tuple[str, object]:
+    """Prompt + generated text for one turn, and the stopping criteria that ended it.
+
+    A reply_start (already said to the user) ends the prompt, so the model continues after it.
+    """
+    global _draft_model
+    from transformers import StoppingCriteriaList
+    from services.stopping_criteria import TurnBoundaryCriteria
+    
+    builder = get_prompt_builder(tokenizer, _prompt_budget(generator))
+    built = builder.build(**_prompt_segments(user_text, context, emotion, emotion_data, cultural_contexts,
+                                             reply_start))
+    prompt = built.prefix + built.suffix
+    if built.user_truncated:
+        metrics.increment("prompt_user_truncated")
+    
+    sampling = dict(
+        max_new_tokens=MAX_NEW_TOKENS,
+        temperature=TEMPERATURE,
+        top_p=TOP_P,
+        top_k=TOP_K,
+        repetition_penalty=REPETITION_PENALTY,
+    )
+    scheduler = None
+    if GENERATION_BATCH_SIZE > 1:
+        scheduler = get_generation_scheduler(generator, GENERATION_BATCH_SIZE, GENERATION_BATCH_WINDOW_MS)
+    prefix_cache = get_prefix_cache(generator) if PREFIX_CACHE and scheduler is None else None
+    
+    # Stop at the turn boundary instead of decoding tokens postprocessing would drop
+    exact_ids = scheduler is not None or prefix_cache is not None
+    prompt_length = built.n_tokens if exact_ids else len(tokenizer(prompt)["input_ids"])
+    criteria = TurnBoundaryCriteria(tokenizer, prompt_length, max_sentences=MAX_REPLY_SENTENCES,
+                                    max_chars=MAX_REPLY_CHARS, cancel=cancel)
+    
+    if scheduler is not None:
+        # Concurrent sessions share batched forward passes (full prompts: no prefix cache or draft model)
+        future = scheduler.submit(builder.input_ids(built), stopping_criteria=criteria, streamer=streamer, **sampling)
+        text = prompt + tokenizer.decode(future.result(), skip_special_tokens=True)
+        criteria.finish()
+        return text, criteria
+    
+    sampling.update(
+        do_sample=True,
+        eos_token_id=tokenizer.eos_token_id,
+        pad_token_id=tokenizer.eos_token_id,
+        stopping_criteria=StoppingCriteriaList([criteria]),
+    )
+    if streamer is not None:
+        sampling["streamer"] = streamer
+    
+    def generate() -> str:
+        if prefix_cache is not None:
+            return prompt + prefix_cache.generate(built.prefix, built.suffix_ids, **sampling)
+        return generator(prompt, truncation=True, **sampling)[0]["generated_text"]
+    
+    draft_model = _draft_model
+    if draft_model is not None and not drafting_pays_off():
+        print(f"[NLP MODEL WARNING] Draft acceptance rate {acceptance_rate():.0%} is too low to help; "
+              f"decoding without {DRAFT_MODEL}")
+        _draft_model = draft_model = None
+    if draft_model is None:
+        text = generate()
+    else:
+        # Assisted decoding: the draft model proposes tokens and the main model
+        # verifies them in one pass, keeping the main model's sampling distribution
+        sampling["assistant_model"] = draft_model
+        if prefix_cache is not None:
+            prefix_cache.get(built.prefix)  # a cache miss's forward pass is not a verification pass
+        with DraftCounter(generator.model, draft_model) as counter:
+            text = generate()
+        counter.record(criteria.generated_tokens[0] if criteria.generated_tokens else 0)
+    criteria.finish()
+    return text, criteria
+
+def _record_token_usage(tokenizer, criteria, reply: str):
+    """Count generated tokens and those postprocessing threw away"""
+    generated = criteria.generated_tokens[0] if criteria.generated_tokens else 0
+    kept = len(tokenizer(reply, add_special_tokens=False)["input_ids"]) if reply else 0
+    metrics.increment("generated_tokens", generated)
+    metrics.increment("discarded_tokens", max(0, generated - kept))
+    reason = criteria.stop_reasons[0] if criteria.stop_reasons else None
+    metrics.increment(f"generation_stop_{reason or 'length'}")
+
+def _remember_reply(cache_key, reply: str, started: float) -> str:
+    """Add a model-generated reply to the reply cache, with the time it took"""
+    reply_cache.put(cache_key, reply, (time.perf_counter() - started) * 1000)
+    return reply
+
+def _model_reply(generator, tokenizer, user_text: str, context: str, emotion: str, emotion_data: Dict,
+                 cancel: threading.Event, cultural_contexts: Optional[List[str]] = None) -> str:
+    """Cleaned-up model reply with its emotion tone, or "" if nothing usable came out"""
+    raw, criteria = _run_generation(generator, tokenizer, user_text, context, emotion, emotion_data,
+                                    cancel=cancel, cultural_contexts=cultural_contexts)
+    reply = _postprocess_response(raw, emotion)
+    _record_token_usage(tokenizer, criteria, reply)
+    if not reply:
+        return ""
+    tone = _emotion_tone(reply, emotion)
+    return f"{reply} {tone}" if tone else reply
+
+def _in_background(fn, *args) -> Future:
+    future = Future()
+    
+    def run():
+        try:
+            future.set_result(fn(*args))
+        except BaseException as e:
+            future.set_exception(e)
+    
+    threading.Thread(target=run, daemon=True, name="reply-generation").start()
+    return future
+
+def _deadline_missed(cache_key, started: float, cancel: threading.Event, late: Optional[Future] = None):
+    """Count a missed turn deadline and decide what happens to the late generation"""
+    metrics.increment("generation_deadline_missed")
+    missed = metrics.counter("generation_deadline_missed")
+    met_rate = metrics.counter("generation_deadline_met") / (missed + metrics.counter("generation_deadline_met"))
+    print(f"[NLP DEADLINE] No reply within {GENERATION_DEADLINE_SECONDS:.0f}s; answered from templates "
+          f"(deadline met on {met_rate:.0%} of turns)")
+    if late is None or cache_key is None:
+        cancel.set()  # nobody will use the rest of this reply
+        return
+    
+    # A short, frequent utterance: let the reply finish and keep it for next time
+    def keep(future: Future):
+        if future.exception() is None and future.result():
+            _remember_reply(cache_key, future.result(), started)
+    late.add_done_callback(keep)
+
 def generate_enhanced_reply(user_text: str, context: str = "", emotion_data: Dict = None) -> str:
     """Enhanced reply generation with emotion and cultural awareness"""
     if not emotion_data:
@@ -428,51 +775,145 @@ def generate_enhanced_reply(user_text: str, context: str = "", emotion_data: Dic
     
     emotion = emotion_data.get("primary_emotion", "neutral")
     intensity = emotion_data.get("intensity", "medium")
-    
-    # Try culturally-aware template response first
+    # Detected once per turn; the reply cache, templates and prompt all share it
     cultural_contexts = detect_cultural_context(user_text)
-    if cultural_contexts or emotion != "neutral":
-        template_response = generate_culturally_aware_response(user_text, emotion, cultural_contexts, intensity)
-        if len(template_response) > 50:  # If we got a substantial response
-            return template_response
-    
-    # Fallback to AI generation
-    prompt = _build_enhanced_prompt(user_text, context, emotion, emotion_data)
     
+    # Short, frequent utterances are answered from a pool of recent replies
+    started = time.perf_counter()
+    cache_key = reply_cache.key(user_text, emotion, intensity, cultural_contexts)
+    cached = reply_cache.get(cache_key)
+    if cached:
+        return cached
+    
+    # Try culturally-aware template response first (not cached: templates vary on their own)
+    template_response = _template_reply(user_text, emotion, intensity, cultural_contexts)
+    if template_response:
+        return template_response
+    
+    # Fallback to AI generation, once the model has finished loading
+    loaded = get_generator()
+    if loaded is None:
+        return generate_culturally_aware_response(user_text, emotion, cultural_contexts, intensity) or DEFAULT_REPLY
+    generator, tokenizer = loaded
+    
+    # The turn gets GENERATION_DEADLINE_SECONDS in total; past that, templates answer
+    cancel = threading.Event()
+    future = _in_background(_model_reply, generator, tokenizer, user_text, context, emotion, emotion_data, cancel,
+                            cultural_contexts)
     try:
-        outputs = generator(
-            prompt,
-            max_new_tokens=MAX_NEW_TOKENS,
-            do_sample=True,
-            temperature=TEMPERATURE,
-            top_p=TOP_P,
-            top_k=TOP_K,
-            repetition_penalty=REPETITION_PENALTY,
-            eos_token_id=tokenizer.eos_token_id,
-            pad_token_id=tokenizer.eos_token_id,
-            truncation=True,
-        )
-        
-        raw = outputs[0]["generated_text"]
-        reply = _postprocess_response(raw, emotion)
-        
+        reply = future.result(timeout=max(0.0, started + GENERATION_DEADLINE_SECONDS - time.perf_counter()))
+        metrics.increment("generation_deadline_met")
         if not reply:
-            reply = "I'm here with you. Would you like to tell me more about what's on your mind?"
-        
-        # Add emotion-specific emoji/tone
-        if emotion == "happy" and "😊" not in reply:
-            reply = f"{reply} 😊"
-        elif emotion == "sad" and "💙" not in reply:
-            reply = f"{reply} 💙"
-        elif emotion in ["anxious", "overwhelmed"] and "🤗" not in reply:
-            reply = f"{reply} Take it one step at a time."
-        
-        return reply
-        
+            return DEFAULT_REPLY
+        return _remember_reply(cache_key, reply, started)
+    
+    except FutureTimeout:
+        _deadline_missed(cache_key, started, cancel, future)
+        return generate_culturally_aware_response(user_text, emotion, cultural_contexts, intensity) or DEFAULT_REPLY
+    
     except Exception as e:
         print(f"Error in AI generation: {e}")
         # Fallback to template response
-        return generate_culturally_aware_response(user_text, emotion, cultural_contexts, intensity)
+        return generate_culturally_aware_response(user_text, emotion, cultural_contexts, intensity) or DEFAULT_REPLY
+
+def stream_enhanced_reply(user_text: str, context: str = "", emotion_data: Dict = None) -> Iterator[str]:
+    """Like generate_enhanced_reply, but yields the reply sentence by sentence as it is generated"""
+    if not emotion_data:
+        emotion_data = {"primary_emotion": "neutral", "intensity": "medium", "multiple_emotions": {}}
+    
+    emotion = emotion_data.get("primary_emotion", "neutral")
+    intensity = emotion_data.get("intensity", "medium")
+    cultural_contexts = detect_cultural_context(user_text)
+    
+    started = time.perf_counter()
+    cache_key = reply_cache.key(user_text, emotion, intensity, cultural_contexts)
+    cached = reply_cache.get(cache_key)
+    if cached:
+        yield from _split_sentences(cached)
+        return
+    
+    template_response = _template_reply(user_text, emotion, intensity, cultural_contexts)
+    loaded = None if template_response else get_generator()
+    if loaded is None:
+        fallback = template_response or generate_culturally_aware_response(
+            user_text, emotion, cultural_contexts, intensity) or DEFAULT_REPLY
+        yield from _split_sentences(fallback)
+        return
+    generator, tokenizer = loaded
+    
+    from transformers import TextIteratorStreamer
+    
+    # Two-stage reply: an acknowledgment is said at once while the model writes the rest after it
+    acknowledgment = None
+    if TWO_STAGE_REPLY:
+        acknowledgment = _templates.acknowledgment(emotion, intensity, NEUTRAL_ACKNOWLEDGMENTS)
+    
+    streamer = TextIteratorStreamer(tokenizer, skip_prompt=True, skip_special_tokens=True)
+    cancel = threading.Event()
+    errors = []
+    finished = []
+    
+    def run():
+        try:
+            finished.append(_run_generation(generator, tokenizer, user_text, context, emotion, emotion_data,
+                                            streamer, cancel, cultural_contexts, acknowledgment or ""))
+        except Exception as e:
+            errors.append(e)
+            streamer.end()
+    
+    worker = threading.Thread(target=run, daemon=True, name="reply-stream")
+    worker.start()
+    
+    # Sentences are spoken as they arrive; the deadline covers the whole reply
+    opening = [acknowledgment] if acknowledgment else []
+    postprocessor = StreamingPostprocessor(opening + _split_sentences(acknowledgment or ""))
+    sentences = []
+    timed_out = False
+    try:
+        yield from opening
+        while True:
+            streamer.timeout = max(0.001, started + GENERATION_DEADLINE_SECONDS - time.perf_counter())
+            try:
+                chunk = next(streamer)
+            except StopIteration:
+                break
+            except queue.Empty:
+                timed_out = True
+                break
+            for sentence in postprocessor.feed(chunk):
+                sentences.append(sentence)
+                yield sentence
+    except GeneratorExit:
+        cancel.set()  # the caller stopped listening (e.g. after a flagged sentence)
+        raise
+    
+    if timed_out:
+        # Keep what was already said; an unfinished sentence is dropped
+        _deadline_missed(None, started, cancel)
+    else:
+        metrics.increment("generation_deadline_met")
+        for sentence in postprocessor.finish():
+            sentences.append(sentence)
+            yield sentence
+        worker.join()
+    if finished:
+        _record_token_usage(tokenizer, finished[0][1], " ".join(sentences))
+    if errors:
+        print(f"Error in AI generation: {errors[0]}")
+    if not sentences:
+        fallback = DEFAULT_REPLY
+        if errors or timed_out:
+            # After an acknowledgment, the template's own would repeat it
+            fallback = _templates.compose(emotion, intensity, cultural_contexts,
+                                          acknowledge=not opening) or DEFAULT_REPLY
+        sentences = _split_sentences(fallback)
+        yield from sentences
+    
+    tone = _emotion_tone(" ".join(opening + sentences), emotion)
+    if tone:
+        yield tone
+    if finished and not errors and not timed_out and sentences != _split_sentences(DEFAULT_REPLY):
+        _remember_reply(cache_key, " ".join(opening + sentences + ([tone] if tone else [])), started)
 
 # Backward compatibility
 def generate_reply(user_text: str, context: str = "", emotion: str = "neutral") -> str:
@@ -482,6 +923,7 @@ def generate_reply(user_text: str, context: str = "", emotion: str = "neutral")
 
 # Testing function
 if __name__ == "__main__":
+    get_generator(wait=True)
     test_cases = [
         {
             "text": "I'm feeling really sad and depressed today",
@@ -0,0 +1,252 @@
+# services/generation_scheduler.py
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+from typing import List, Optional, Sequence
+
+from utils.metrics import metrics
+
+
+class GenerationRequest:
+    """One prompt waiting for a batch, with its own sampling parameters"""
+
+    def __init__(self, input_ids: Sequence[int], max_new_tokens: int, temperature: float, top_p: float,
+                 top_k: int, repetition_penalty: float, stopping_criteria=None, streamer=None):
+        self.input_ids = list(input_ids)
+        self.max_new_tokens = max_new_tokens
+        self.temperature = temperature
+        self.top_p = top_p
+        self.top_k = top_k
+        self.repetition_penalty = repetition_penalty
+        self.stopping_criteria = stopping_criteria
+        self.streamer = streamer
+        self.future: Future = Future()
+        self.submitted = time.perf_counter()
+
+
+class PerRowSampling:
+    """Repetition penalty, temperature, top-k and top-p with a separate setting per batch row.
+
+    Applied in the same order and the same way as transformers' own
+    processors, so a row samples exactly as it would in a batch of one.
+    prompt_starts gives each row's first non-padding column; the
+    repetition penalty skips the left padding before it (the pad token is
+    often EOS). top_k=0 and top_p=1.0 turn those filters off for a row.
+    """
+
+    def __init__(self, temperatures: Sequence[float], top_ks: Sequence[int], top_ps: Sequence[float],
+                 repetition_penalties: Sequence[float], prompt_starts: Optional[Sequence[int]] = None):
+        self.temperatures = temperatures
+        self.top_ks = top_ks
+        self.top_ps = top_ps
+        self.repetition_penalties = repetition_penalties
+        self.prompt_starts = prompt_starts
+
+    def __call__(self, input_ids, scores):
+        import torch
+
+        def column(values):
+            return torch.tensor(values, dtype=scores.dtype, device=scores.device).unsqueeze(1)
+
+        # Tokens seen in each row's own ids; counted so a pad id repeated in the row is still marked
+        in_row = torch.ones_like(input_ids)
+        if self.prompt_starts is not None:
+            starts = torch.tensor(self.prompt_starts, device=input_ids.device).unsqueeze(1)
+            in_row = (torch.arange(input_ids.shape[1], device=input_ids.device) >= starts).long()
+        seen = torch.zeros(scores.shape, dtype=torch.long, device=scores.device).scatter_add(1, input_ids, in_row) > 0
+        penalty = column(self.repetition_penalties)
+        penalized = torch.where(scores < 0, scores * penalty, scores / penalty)
+        scores = torch.where(seen, penalized, scores)
+
+        scores = scores / column(self.temperatures)
+
+        vocab_size = scores.shape[-1]
+        top_ks = [min(k, vocab_size) if k and k > 0 else vocab_size for k in self.top_ks]
+        kth_best = torch.topk(scores, max(top_ks), dim=-1).values.gather(
+            1, torch.tensor(top_ks, device=scores.device).unsqueeze(1) - 1)
+        scores = scores.masked_fill(scores < kth_best, float("-inf"))
+
+        sorted_scores, sorted_ids = torch.sort(scores, dim=-1)
+        cumulative = sorted_scores.softmax(dim=-1).cumsum(dim=-1)
+        remove = cumulative <= (1 - column(self.top_ps))
+        remove[:, -1] = False  # always keep the most likely token
+        return scores.masked_fill(remove.scatter(1, sorted_ids, remove), float("-inf"))
+
+
+class _RowStopping:
+    """Ends each row at its own limit and streams its tokens as they are generated.
+
+    Prompts are left-padded to a common length; a request's stopping
+    criteria sees its row without the padding, as in an unbatched call.
+    """
+
+    def __init__(self, requests: List[GenerationRequest], padded_length: int, eos_token_id: Optional[int]):
+        self.requests = requests
+        self.padded_length = padded_length
+        self.eos_token_id = eos_token_id
+        self.kept: List[Optional[int]] = [None] * len(requests)  # new tokens to return per finished row
+        self._streamed = [0] * len(requests)
+
+    def _finish(self, row: int, kept: int):
+        self.kept[row] = kept
+        streamer = self.requests[row].streamer
+        if streamer is not None:
+            streamer.end()
+
+    def __call__(self, input_ids, scores, **kwargs):
+        import torch
+
+        generated = input_ids.shape[1] - self.padded_length
+        done = []
+        for row, request in enumerate(self.requests):
+            if self.kept[row] is None:
+                new_ids = input_ids[row, self.padded_length:]
+                if request.streamer is not None and generated > self._streamed[row]:
+                    request.streamer.put(new_ids[self._streamed[row]:].cpu())
+                    self._streamed[row] = generated
+                if self.eos_token_id is not None and int(new_ids[-1]) == self.eos_token_id:
+                    self._finish(row, generated - 1)
+                elif generated >= request.max_new_tokens:
+                    self._finish(row, generated)
+                elif request.stopping_criteria is not None:
+                    start = self.padded_length - len(request.input_ids)
+                    if bool(request.stopping_criteria(input_ids[row:row + 1, start:], scores)[0]):
+                        self._finish(row, generated)
+            done.append(self.kept[row] is not None)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+
+class GenerationScheduler:
+    """Micro-batches concurrent generation requests into shared generate() calls.
+
+    Requests arriving within batch_window_ms of the first pending one (up
+    to max_batch_size) are left-padded into one batch; each gets its
+    sampling parameters, stopping criteria and streamer applied per row,
+    and its new token ids back through a future. The worker thread runs
+    only while requests are pending.
+    """
+
+    def __init__(self, model, tokenizer, max_batch_size: int = 8, batch_window_ms: float = 10.0):
+        # Weak, so _schedulers can drop this scheduler once the registry unloads the model
+        self._model = weakref.ref(model)
+        self.tokenizer = tokenizer
+        self.max_batch_size = max(1, max_batch_size)
+        self.batch_window_ms = batch_window_ms
+        self._cond = threading.Condition()
+        self._pending: List[GenerationRequest] = []
+        self._worker: Optional[threading.Thread] = None
+
+    @property
+    def model(self):
+        return self._model()
+
+    def submit(self, input_ids: Sequence[int], max_new_tokens: int = 160, temperature: float = 1.0,
+               top_p: float = 1.0, top_k: int = 0, repetition_penalty: float = 1.0,
+               stopping_criteria=None, streamer=None) -> Future:
+        """Queue a prompt (token ids); the future resolves to the generated token ids"""
+        request = GenerationRequest(input_ids, max_new_tokens, temperature, top_p, top_k,
+                                    repetition_penalty, stopping_criteria, streamer)
+        with self._cond:
+            self._pending.append(request)
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, daemon=True, name="generation-scheduler")
+                self._worker.start()
+            self._cond.notify()
+        return request.future
+
+    def _next_batch(self) -> List[GenerationRequest]:
+        with self._cond:
+            if not self._pending:
+                self._worker = None
+                return []
+            # Give other sessions the rest of the window to join the first pending request
+            deadline = self._pending[0].submitted + self.batch_window_ms / 1000
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+            try:
+                self._generate(batch)
+            except Exception as e:
+                print(f"[GENERATION SCHEDULER ERROR] Batch of {len(batch)} failed: {e}")
+                for request in batch:
+                    if request.streamer is not None:
+                        request.streamer.end()
+                    if not request.future.done():
+                        request.future.set_exception(e)
+
+    def _generate(self, batch: List[GenerationRequest]):
+        import torch
+        from transformers import LogitsProcessorList, StoppingCriteriaList
+
+        eos_token_id = self.tokenizer.eos_token_id
+        pad_token_id = self.tokenizer.pad_token_id if self.tokenizer.pad_token_id is not None else eos_token_id
+        padded_length = max(len(request.input_ids) for request in batch)
+        input_ids = torch.tensor([[pad_token_id] * (padded_length - len(r.input_ids)) + r.input_ids for r in batch])
+        attention_mask = torch.tensor([[0] * (padded_length - len(r.input_ids)) + [1] * len(r.input_ids)
+                                       for r in batch])
+        for request in batch:
+            if request.streamer is not None:
+                request.streamer.put(torch.tensor(request.input_ids))  # the prompt, skipped by the streamer
+
+        sampling = PerRowSampling([r.temperature for r in batch], [r.top_k for r in batch],
+                                  [r.top_p for r in batch], [r.repetition_penalty for r in batch],
+                                  [padded_length - len(r.input_ids) for r in batch])
+        stopping = _RowStopping(batch, padded_length, eos_token_id)
+        start = time.perf_counter()
+        with torch.no_grad():
+            output = self.model.generate(
+                input_ids.to(self.model.device),
+                attention_mask=attention_mask.to(self.model.device),
+                do_sample=True,
+                temperature=1.0,  # the per-row processor does all logit shaping
+                top_k=0,
+                top_p=1.0,
+                max_new_tokens=max(r.max_new_tokens for r in batch),
+                logits_processor=LogitsProcessorList([sampling]),
+                stopping_criteria=StoppingCriteriaList([stopping]),
+                eos_token_id=eos_token_id,
+                pad_token_id=pad_token_id,
+            )
+        metrics.record_latency("generation_batch", (time.perf_counter() - start) * 1000)
+        metrics.increment("generation_batches")
+        metrics.increment("generation_batched_requests", len(batch))
+
+        for row, request in enumerate(batch):
+            kept = stopping.kept[row]
+            new_ids = output[row, padded_length:].tolist()
+            if kept is None:  # ran to the batch's token limit
+                kept = min(len(new_ids), request.max_new_tokens)
+                if request.streamer is not None:
+                    request.streamer.end()
+            request.future.set_result(new_ids[:kept])
+
+
+# One scheduler per loaded model; entries go away with the model
+_schedulers: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_schedulers_lock = threading.Lock()
+
+
+def get_generation_scheduler(generator, max_batch_size: int, batch_window_ms: float) -> Optional[GenerationScheduler]:
+    """Scheduler for a text-generation pipeline's model, if it is a torch model"""
+    model = getattr(generator, "model", None)
+    if model is None or not hasattr(model, "generate"):
+        return None
+    with _schedulers_lock:
+        scheduler = _schedulers.get(model)
+        if scheduler is None:
+            scheduler = _schedulers[model] = GenerationScheduler(model, generator.tokenizer)
+        scheduler.max_batch_size = max(1, max_batch_size)
+        scheduler.batch_window_ms = batch_window_ms
+        return scheduler
@@ -0,0 +1,142 @@
+# services/language_routing.py
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable
+
+# Romanized Hindi function words that rarely occur in English text
+ROMANIZED_HINDI_WORDS: FrozenSet[str] = frozenset([
+    "hai", "hain", "hun", "hu", "hoon", "tha", "thi", "nahi", "nahin", "nhi",
+    "kya", "kyun", "kyu", "kaise", "mein", "mai", "mujhe", "mujhpe", "mera", "meri", "mere",
+    "aap", "aapko", "tum", "tujhe", "raha", "rahi", "rahe", "gaya", "gayi", "gaye",
+    "kar", "karna", "kuch", "kuchh", "bahut", "bohot", "bhi", "aur", "lekin", "toh",
+    "ho", "ke", "ki", "ka", "ko", "se", "pe", "par", "yeh", "woh", "ab", "abhi",
+    "sab", "achha", "accha", "theek", "thik", "lag", "yaar", "bhai", "arre", "haan", "ji", "aaj", "dil"
+])
+
+# Scripts -> which lexicons to scan and with what weight
+LEXICON_ROUTES: Dict[str, Dict[str, float]] = {
+    "english": {"english": 1, "hinglish": 2},
+    "hinglish": {"english": 1, "hindi": 1.5, "hinglish": 2},
+    "devanagari": {"english": 1, "hindi": 1.5, "hinglish": 2},
+}
+
+# Routes whose text (and lexicon) is vowel-folded before matching
+FOLDED_ROUTES: FrozenSet[str] = frozenset(["hinglish", "devanagari"])
+
+_DEVANAGARI_RE = re.compile(r"[ऀ-ॿ]")
+_DEVANAGARI_WORD_RE = re.compile(r"[ऀ-ॿ]+")
+_LATIN_RE = re.compile(r"[A-Za-z]")
+_TOKEN_RE = re.compile(r"[a-z]+")
+
+# ---- Devanagari -> Hinglish-style romanization ----
+_CONSONANTS = {
+    "क": "k", "ख": "kh", "ग": "g", "घ": "gh", "ङ": "n",
+    "च": "ch", "छ": "chh", "ज": "j", "झ": "jh", "ञ": "n",
+    "ट": "t", "ठ": "th", "ड": "d", "ढ": "dh", "ण": "n",
+    "त": "t", "थ": "th", "द": "d", "ध": "dh", "न": "n",
+    "प": "p", "फ": "ph", "ब": "b", "भ": "bh", "म": "m",
+    "य": "y", "र": "r", "ल": "l", "व": "v",
+    "श": "sh", "ष": "sh", "स": "s", "ह": "h",
+    "क़": "q", "ख़": "kh", "ग़": "gh", "ज़": "z", "ड़": "r", "ढ़": "rh", "फ़": "f", "य़": "y",
+}
+_NUKTA_FORMS = {"क": "q", "ख": "kh", "ग": "gh", "ज": "z", "ड": "r", "ढ": "rh", "फ": "f", "य": "y"}
+_VOWELS = {
+    "अ": "a", "आ": "aa", "इ": "i", "ई": "ee", "उ": "u", "ऊ": "oo", "ऋ": "ri",
+    "ए": "e", "ऐ": "ai", "ओ": "o", "औ": "au", "ऑ": "o",
+}
+_MATRAS = {
+    "ा": "aa", "ि": "i", "ी": "ee", "ु": "u", "ू": "oo", "ृ": "ri",
+    "े": "e", "ै": "ai", "ो": "o", "ौ": "au", "ॉ": "o",
+}
+_VIRAMA = "्"
+_NUKTA = "़"
+_NASALS = {"ं": "n", "ँ": "n"}
+_VISARGA = "ः"
+_DIGITS = {chr(0x0966 + i): str(i) for i in range(10)}
+_PUNCT = {"।": ".", "॥": "."}
+
+# Common words whose colloquial spelling differs from the letter-by-letter form
+_WORD_EXCEPTIONS = {
+    "नहीं": "nahi", "नही": "nahi", "मैं": "main", "में": "mein", "हूं": "hun", "हूँ": "hun",
+    "हैं": "hain", "क्यों": "kyun", "यहां": "yahan", "यहाँ": "yahan", "वहां": "vahan", "वहाँ": "vahan",
+}
+
+_INHERENT = "a"
+
+@lru_cache(maxsize=4096)
+def _transliterate_word(word: str) -> str:
+    """Transliterate one Devanagari word, applying Hindi schwa deletion"""
+    if word in _WORD_EXCEPTIONS:
+        return _WORD_EXCEPTIONS[word]
+
+    # Units are [consonant, vowel]; vowel "" means virama, "a" an inherent schwa
+    units = []
+    inherent = []
+    prev = ""
+    for ch in word:
+        if ch == _NUKTA and units and prev in _NUKTA_FORMS:
+            units[-1][0] = _NUKTA_FORMS[prev]
+        elif ch in _CONSONANTS:
+            units.append([_CONSONANTS[ch], _INHERENT])
+            inherent.append(True)
+        elif ch in _MATRAS and units:
+            units[-1][1] = _MATRAS[ch]
+            inherent[-1] = False
+        elif ch == _VIRAMA and units:
+            units[-1][1] = ""
+            inherent[-1] = False
+        elif ch in _VOWELS:
+            units.append(["", _VOWELS[ch]])
+            inherent.append(False)
+        elif ch in _NASALS and units:
+            units[-1][1] += _NASALS[ch]
+        elif ch == _VISARGA and units:
+            units[-1][1] += "h"
+        elif ch in _DIGITS:
+            units.append([_DIGITS[ch], ""])
+            inherent.append(False)
+        prev = ch
+
+    if not units:
+        return ""
+
+    # Word-final schwa is silent
+    if inherent[-1]:
+        units[-1][1] = ""
+        inherent[-1] = False
+    # Medial schwa deletion (right to left): V C[a] C V -> V C C V
+    for i in range(len(units) - 2, 0, -1):
+        if inherent[i] and units[i - 1][1] and units[i + 1][0] and units[i + 1][1]:
+            units[i][1] = ""
+            inherent[i] = False
+
+    return "".join(c + v for c, v in units)
+
+@lru_cache(maxsize=1024)
+def transliterate_devanagari(text: str) -> str:
+    """Romanize Devanagari words in text, leaving other characters as they are"""
+    text = "".join(_PUNCT.get(ch, ch) for ch in text)
+    return _DEVANAGARI_WORD_RE.sub(lambda m: _transliterate_word(m.group(0)), text)
+
+def fold_romanization(text: str) -> str:
+    """Collapse spelling variants common in romanized Hindi (aa/a, ee/i, oo/u, chh/ch)"""
+    return (text.replace("aa", "a").replace("ee", "i").replace("oo", "u")
+            .replace("chh", "ch"))
+
+def script_counts(text: str) -> Dict[str, int]:
+    """Count letters per Unicode block"""
+    return {
+        "devanagari": len(_DEVANAGARI_RE.findall(text)),
+        "latin": len(_LATIN_RE.findall(text)),
+    }
+
+def identify_language(text: str, hindi_markers: Iterable[str] = ROMANIZED_HINDI_WORDS) -> str:
+    """Cheap language/script identification: 'devanagari', 'hinglish' or 'english'"""
+    if _DEVANAGARI_RE.search(text):
+        counts = script_counts(text)
+        # Mixed-script input is code-mixed Hindi; both routes transliterate
+        return "devanagari" if counts["devanagari"] >= counts["latin"] else "hinglish"
+    for token in _TOKEN_RE.findall(text.lower()):
+        if token in hindi_markers:
+            return "hinglish"
+    return "english"
@@ -0,0 +1,202 @@
+# services/linear_emotion_model.py
+import json
+import re
+import zlib
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from services.language_routing import fold_romanization, transliterate_devanagari
+
+DEFAULT_N_FEATURES = 2 ** 14
+DEFAULT_CHAR_NGRAMS = (3, 5)
+DEFAULT_WORD_NGRAMS = (1, 2)
+
+_WORD_RE = re.compile(r"[a-z0-9']+")
+
+
+def normalize_text(text: str) -> str:
+    """Same normalization the keyword engine uses for Hinglish/Devanagari input"""
+    return fold_romanization(transliterate_devanagari(text.lower()))
+
+
+class HashingVectorizer:
+    """Word + character n-gram features hashed into a fixed space.
+
+    Uses crc32 (stable across processes, unlike hash()) with a sign bit to
+    spread collisions, and L2-normalizes the resulting sparse vector.
+    """
+
+    def __init__(self, n_features: int = DEFAULT_N_FEATURES,
+                 char_ngrams: Tuple[int, int] = DEFAULT_CHAR_NGRAMS,
+                 word_ngrams: Tuple[int, int] = DEFAULT_WORD_NGRAMS):
+        self.n_features = int(n_features)
+        self.char_ngrams = tuple(int(n) for n in char_ngrams)
+        self.word_ngrams = tuple(int(n) for n in word_ngrams)
+
+        # Character n-grams depend only on the word, so they are hashed once per word
+        self._char_features = lru_cache(maxsize=8192)(self._hash_char_ngrams)
+
+    def _hash(self, gram: str) -> Tuple[int, float]:
+        h = zlib.crc32(gram.encode("utf-8"))
+        return h % self.n_features, (1.0 if h & 0x80000000 else -1.0)
+
+    def _hash_char_ngrams(self, word: str) -> Tuple[Tuple[int, float], ...]:
+        padded = f" {word} "
+        lo, hi = self.char_ngrams
+        return tuple(
+            self._hash("c:" + padded[i:i + n])
+            for n in range(lo, hi + 1)
+            for i in range(len(padded) - n + 1)
+        )
+
+    def _hashed_ngrams(self, text: str) -> Iterable[Tuple[int, float]]:
+        words = _WORD_RE.findall(normalize_text(text))
+        lo, hi = self.word_ngrams
+        for n in range(lo, hi + 1):
+            for i in range(len(words) - n + 1):
+                yield self._hash("w:" + " ".join(words[i:i + n]))
+        for word in words:
+            yield from self._char_features(word)
+
+    def transform_one(self, text: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (indices, values) of the sparse feature vector"""
+        features: Dict[int, float] = {}
+        for idx, sign in self._hashed_ngrams(text):
+            features[idx] = features.get(idx, 0.0) + sign
+
+        if not features:
+            return np.zeros(0, dtype=np.int32), np.zeros(0, dtype=np.float32)
+        indices = np.fromiter(features.keys(), dtype=np.int32, count=len(features))
+        values = np.fromiter(features.values(), dtype=np.float32, count=len(features))
+        norm = float(np.sqrt(np.dot(values, values)))
+        if norm > 0:
+            values /= norm
+        return indices, values
+
+    def config(self) -> Dict:
+        return {"n_features": self.n_features, "char_ngrams": list(self.char_ngrams),
+                "word_ngrams": list(self.word_ngrams)}
+
+
+class LinearEmotionClassifier:
+    """Multinomial (softmax) linear model over hashed features"""
+
+    def __init__(self, weights: np.ndarray, bias: np.ndarray, labels: List[str],
+                 vectorizer: Optional[HashingVectorizer] = None):
+        self.vectorizer = vectorizer or HashingVectorizer(n_features=weights.shape[0])
+        self.weights = np.ascontiguousarray(weights, dtype=np.float32)  # (n_features, n_labels)
+        self.bias = np.asarray(bias, dtype=np.float32)
+        self.labels = list(labels)
+
+    def predict_proba(self, text: str) -> np.ndarray:
+        indices, values = self.vectorizer.transform_one(text)
+        logits = self.bias + values @ self.weights[indices]
+        logits -= logits.max()
+        exp = np.exp(logits)
+        return exp / exp.sum()
+
+    def predict(self, text: str) -> Tuple[str, float]:
+        """Return (label, probability) of the most likely emotion"""
+        probs = self.predict_proba(text)
+        best = int(probs.argmax())
+        return self.labels[best], float(probs[best])
+
+    def predict_scores(self, text: str, min_score: float = 0.1) -> Dict[str, float]:
+        """All emotions whose probability is above min_score"""
+        probs = self.predict_proba(text)
+        return {self.labels[i]: float(p) for i, p in enumerate(probs) if p > min_score}
+
+    def save(self, path: str):
+        config = self.vectorizer.config()
+        np.savez_compressed(
+            path,
+            weights=self.weights.astype(np.float16),
+            bias=self.bias,
+            labels=np.array(self.labels),
+            n_features=config["n_features"],
+            char_ngrams=np.array(config["char_ngrams"]),
+            word_ngrams=np.array(config["word_ngrams"]),
+        )
+
+    @classmethod
+    def load(cls, path: str) -> "LinearEmotionClassifier":
+        with np.load(path, allow_pickle=False) as data:
+            vectorizer = HashingVectorizer(
+                n_features=int(data["n_features"]),
+                char_ngrams=tuple(data["char_ngrams"].tolist()),
+                word_ngrams=tuple(data["word_ngrams"].tolist()),
+            )
+            return cls(data["weights"].astype(np.float32), data["bias"],
+                       [str(label) for label in data["labels"]], vectorizer)
+
+
+def load_corpus(path: str) -> List[Tuple[str, str]]:
+    """Read a labeled JSONL corpus of {"text": ..., "emotion": ...} records"""
+    examples = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if record.get("text") and record.get("emotion"):
+                examples.append((record["text"], record["emotion"]))
+    return examples
+
+
+def train(examples: List[Tuple[str, str]], vectorizer: Optional[HashingVectorizer] = None,
+          epochs: int = 300, learning_rate: float = 0.5, l2: float = 1e-4,
+          seed: int = 0) -> LinearEmotionClassifier:
+    """Fit a softmax regression with full-batch Adam on sparse hashed features"""
+    vectorizer = vectorizer or HashingVectorizer()
+    labels = sorted({label for _, label in examples})
+    label_index = {label: i for i, label in enumerate(labels)}
+    n_samples, n_labels = len(examples), len(labels)
+
+    # COO representation of the design matrix
+    rows, cols, vals = [], [], []
+    for row, (text, _) in enumerate(examples):
+        indices, values = vectorizer.transform_one(text)
+        rows.append(np.full(len(indices), row, dtype=np.int32))
+        cols.append(indices)
+        vals.append(values)
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    vals = np.concatenate(vals)[:, None]
+    targets = np.zeros((n_samples, n_labels), dtype=np.float32)
+    targets[np.arange(n_samples), [label_index[label] for _, label in examples]] = 1.0
+
+    rng = np.random.default_rng(seed)
+    weights = (rng.standard_normal((vectorizer.n_features, n_labels)) * 0.01).astype(np.float32)
+    bias = np.zeros(n_labels, dtype=np.float32)
+
+    # Adam state
+    m_w, v_w = np.zeros_like(weights), np.zeros_like(weights)
+    m_b, v_b = np.zeros_like(bias), np.zeros_like(bias)
+    beta1, beta2, eps = 0.9, 0.999, 1e-8
+
+    for step in range(1, epochs + 1):
+        logits = np.zeros((n_samples, n_labels), dtype=np.float32)
+        np.add.at(logits, rows, vals * weights[cols])
+        logits += bias
+        logits -= logits.max(axis=1, keepdims=True)
+        probs = np.exp(logits)
+        probs /= probs.sum(axis=1, keepdims=True)
+
+        grad_logits = (probs - targets) / n_samples
+        grad_w = l2 * weights
+        np.add.at(grad_w, cols, vals * grad_logits[rows])
+        grad_b = grad_logits.sum(axis=0)
+
+        for param, grad, m, v in ((weights, grad_w, m_w, v_w), (bias, grad_b, m_b, v_b)):
+            m *= beta1
+            m += (1 - beta1) * grad
+            v *= beta2
+            v += (1 - beta2) * grad * grad
+            m_hat = m / (1 - beta1 ** step)
+            v_hat = v / (1 - beta2 ** step)
+            param -= learning_rate * m_hat / (np.sqrt(v_hat) + eps)
+
+    return LinearEmotionClassifier(weights, bias, labels, vectorizer)
@@ -0,0 +1,195 @@
+# services/model_registry.py
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+from services.quantization import load_quantized_model
+
+try:
+    from config import QUANTIZED_MODEL_DIR
+except Exception:
+    QUANTIZED_MODEL_DIR = os.getenv("QUANTIZED_MODEL_DIR", "data/models/quantized")
+
+try:
+    from config import ONNX_MODEL_DIR
+except Exception:
+    ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", "data/models/onnx")
+
+
+def _load_pipeline(model_name: str, quantize: Optional[str] = None, backend: str = "torch", **settings):
+    """Build a text-generation pipeline; settings are passed to from_pretrained.
+
+    quantize="int8" loads the model with dynamically quantized Linear layers,
+    cached under QUANTIZED_MODEL_DIR for fast reloads. backend="onnx" exports
+    the model to ONNX once (cached under ONNX_MODEL_DIR) and decodes with
+    ONNX Runtime instead of torch.
+    """
+    # transformers is imported here so importing the registry stays cheap
+    from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+
+    tok = AutoTokenizer.from_pretrained(model_name)
+    if tok.pad_token is None and tok.eos_token is not None:
+        tok.pad_token = tok.eos_token
+    if backend == "onnx":
+        from services.onnx_backend import load_onnx_generator
+        return load_onnx_generator(model_name, ONNX_MODEL_DIR, tok, quantize, **settings), tok
+    elif backend != "torch":
+        raise ValueError(f"Unsupported inference backend: {backend}")
+    if quantize == "int8":
+        mdl = load_quantized_model(model_name, QUANTIZED_MODEL_DIR, **settings)
+    elif quantize:
+        raise ValueError(f"Unsupported quantization mode: {quantize}")
+    else:
+        mdl = AutoModelForCausalLM.from_pretrained(model_name, **settings)
+    gen = pipeline("text-generation", model=mdl, tokenizer=tok)
+    return gen, tok
+
+
+def model_memory_bytes(generator) -> int:
+    """Bytes held by a pipeline's weights (0 if not a torch or ONNX model)"""
+    onnx_model = getattr(generator, "onnx_model", None)
+    if onnx_model is not None:
+        return onnx_model.weights_bytes
+    model = getattr(generator, "model", None)
+    if model is None or not hasattr(model, "state_dict"):
+        return 0
+
+    # The state dict also covers quantized packed weights; tied weights are counted once
+    seen, total = set(), 0
+    stack = list(model.state_dict().values())
+    while stack:
+        value = stack.pop()
+        if isinstance(value, (tuple, list)):
+            stack.extend(value)
+        elif hasattr(value, "element_size"):
+            key = (value.data_ptr(), value.numel()) if not value.is_quantized else id(value)
+            if key not in seen:
+                seen.add(key)
+                total += value.numel() * value.element_size()
+    return total
+
+
+class _Entry:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.generator = None
+        self.tokenizer = None
+        self.refs = 0
+        self.memory_bytes = 0
+        self.loaded_at: Optional[float] = None
+
+
+class ModelRegistry:
+    """Process-wide cache of loaded models keyed by (model name, settings).
+
+    Each model is loaded once however many modules ask for it; callers
+    acquire a reference and release it when done. Models stay resident
+    after their last release until unload() is called. Modules that keep
+    a model between calls register an unload listener, so a forced unload
+    can make them drop it.
+    """
+
+    def __init__(self, loader: Callable = _load_pipeline):
+        self.loader = loader
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple, _Entry] = {}
+        self._unload_listeners: List[Callable] = []
+
+    @staticmethod
+    def _key(model_name: str, settings: Dict) -> Tuple:
+        return (model_name, tuple(sorted((k, repr(v)) for k, v in settings.items())))
+
+    def acquire(self, model_name: str, **settings) -> Tuple:
+        """(generator, tokenizer) for a model, loading it on first use"""
+        key = self._key(model_name, settings)
+        while True:
+            with self._lock:
+                entry = self._entries.setdefault(key, _Entry())
+
+            # Loads of different models may overlap; loads of the same model never do
+            with entry.lock:
+                if self._entries.get(key) is not entry:
+                    continue  # unloaded while we waited
+                try:
+                    return self._acquire_entry(entry, model_name, settings)
+                except Exception:
+                    # Don't leave an empty entry behind a failed load
+                    with self._lock:
+                        if entry.generator is None and self._entries.get(key) is entry:
+                            del self._entries[key]
+                    raise
+
+    def _acquire_entry(self, entry: _Entry, model_name: str, settings: Dict) -> Tuple:
+        if entry.generator is None:
+            generator, tokenizer = self.loader(model_name, **settings)
+            entry.generator, entry.tokenizer = generator, tokenizer
+            entry.memory_bytes = model_memory_bytes(generator)
+            entry.loaded_at = time.time()
+            print(f"[MODEL REGISTRY] Loaded {model_name} ({entry.memory_bytes / 2**20:.1f} MB)")
+        entry.refs += 1
+        return entry.generator, entry.tokenizer
+
+    def release(self, model_name: str, **settings):
+        """Drop one reference handed out by acquire()"""
+        entry = self._entries.get(self._key(model_name, settings))
+        if entry is not None:
+            with entry.lock:
+                entry.refs = max(0, entry.refs - 1)
+
+    def add_unload_listener(self, callback: Callable):
+        """Call callback(generator) whenever a model is unloaded, so its holders can let go of it"""
+        self._unload_listeners.append(callback)
+
+    def unload(self, model_name: str, force: bool = False, **settings) -> bool:
+        """Free a model with no outstanding references (or any model, with force=True)"""
+        key = self._key(model_name, settings)
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return False
+        # Entry lock before registry lock, the same order acquire() takes them in
+        with entry.lock:
+            if entry.refs and not force:
+                return False
+            with self._lock:
+                if self._entries.get(key) is not entry:
+                    return False
+                del self._entries[key]
+            generator = entry.generator
+            entry.generator = entry.tokenizer = None
+        for callback in list(self._unload_listeners):
+            try:
+                callback(generator)
+            except Exception as e:
+                print(f"[MODEL REGISTRY ERROR] Unload listener failed: {e}")
+        print(f"[MODEL REGISTRY] Unloaded {model_name}")
+        return True
+
+    def is_loaded(self, model_name: str, **settings) -> bool:
+        entry = self._entries.get(self._key(model_name, settings))
+        return entry is not None and entry.generator is not None
+
+    def memory_bytes(self) -> int:
+        """Total bytes held by all loaded models"""
+        with self._lock:
+            return sum(entry.memory_bytes for entry in self._entries.values())
+
+    def stats(self) -> List[Dict]:
+        with self._lock:
+            items = list(self._entries.items())
+        return [
+            {
+                "model": model_name,
+                "settings": dict(settings),
+                "refs": entry.refs,
+                "memory_mb": round(entry.memory_bytes / 2**20, 1),
+                "loaded_at": entry.loaded_at,
+            }
+            for (model_name, settings), entry in items
+            if entry.generator is not None
+        ]
+
+
+# Global registry instance
+model_registry = ModelRegistry()
@@ -1,7 +1,9 @@
 import os
 import re
-from typing import Optional
-from transformers import AutoTokenizer, AutoModelForCausalLM, pipeline
+import threading
+from typing import Optional, Tuple
+
+from services.model_registry import model_registry
 
 # ---- Model selection ----
 try:
@@ -14,20 +16,47 @@ except Exception:
     TOP_K = int(os.getenv("TOP_K", "50"))
     REPETITION_PENALTY = float(os.getenv("REPETITION_PENALTY", "1.15"))
 
-FALLBACK_MODEL = "distilgpt2"
-
-def _load_pipeline(model_name: str):
-    tok = AutoTokenizer.from_pretrained(model_name)
-    if tok.pad_token is None and tok.eos_token is not None:
-        tok.pad_token = tok.eos_token
-    mdl = AutoModelForCausalLM.from_pretrained(model_name)
-    gen = pipeline("text-generation", model=mdl, tokenizer=tok)
-    return gen, tok
+try:
+    from config import MODEL_QUANTIZATION
+except Exception:
+    MODEL_QUANTIZATION = os.getenv("MODEL_QUANTIZATION") or None
 
 try:
-    generator, tokenizer = _load_pipeline(MODEL_NAME)
+    from config import INFERENCE_BACKEND
 except Exception:
-    generator, tokenizer = _load_pipeline(FALLBACK_MODEL)
+    INFERENCE_BACKEND = os.getenv("INFERENCE_BACKEND", "torch")
+
+# Registry settings; modules asking for the same settings share one model
+MODEL_SETTINGS = {"quantize": MODEL_QUANTIZATION} if MODEL_QUANTIZATION else {}
+if INFERENCE_BACKEND != "torch":
+    MODEL_SETTINGS["backend"] = INFERENCE_BACKEND
+
+FALLBACK_MODEL = "distilgpt2"
+
+_loaded: Optional[Tuple] = None
+_loaded_lock = threading.Lock()
+
+def _get_generator() -> Tuple:
+    """(generator, tokenizer) from the shared registry, loaded on first use"""
+    global _loaded
+    if _loaded is None:
+        # Concurrent first calls must acquire one registry reference between them
+        with _loaded_lock:
+            if _loaded is None:
+                try:
+                    _loaded = model_registry.acquire(MODEL_NAME, **MODEL_SETTINGS)
+                except Exception:
+                    _loaded = model_registry.acquire(FALLBACK_MODEL, **MODEL_SETTINGS)
+    return _loaded
+
+def _forget_unloaded(generator):
+    """Drop our reference to a model the registry unloaded; the next call loads it again"""
+    global _loaded
+    with _loaded_lock:
+        if _loaded is not None and _loaded[0] is generator:
+            _loaded = None
+
+model_registry.add_unload_listener(_forget_unloaded)
 
 SYSTEM_STYLE = (
     "You are a supportive, non-judgmental mental health voice assistant. "
@@ -48,9 +77,10 @@ FEW_SHOTS = [
 def _build_prompt(user_text: str, context: Optional[str]) -> str:
     ctx = (context or "").strip()
     few_shot_block = "\n\n".join(s + " " + r for s, r in FEW_SHOTS)
+    context_line = f"Context: {ctx}\n" if ctx else ""
     prompt = (
         f"System: {SYSTEM_STYLE}\n"
-        f"{('Context: ' + ctx + '\n') if ctx else ''}"
+        f"{context_line}"
         f"{few_shot_block}\n\n"
         f"User: {user_text}\nAssistant:"
     )
@@ -65,6 +95,7 @@ def _postprocess(generated: str) -> str:
 
 # 🔥 Final Unified Function
 def generate_reply(user_text: str, context: str = "", emotion: str = "neutral") -> str:
+    generator, tokenizer = _get_generator()
     prompt = _build_prompt(user_text, context)
     outputs = generator(
         prompt,
@@ -0,0 +1,263 @@
+# services/onnx_backend.py
+import json
+import os
+import re
+import shutil
+import warnings
+from typing import Dict, List, Optional, Sequence
+
+ONNX_FORMAT_VERSION = 1  # bump when the exported graph's inputs or outputs change
+ONNX_OPSET = 17
+
+
+def onnx_cache_dir(model_name: str, cache_dir: str) -> str:
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name).strip("_")
+    return os.path.join(cache_dir, safe_name)
+
+
+def _cache_metadata(model_name: str, quantize: Optional[str]) -> Dict:
+    import onnxruntime
+    import torch
+    import transformers
+
+    return {
+        "model_name": model_name,
+        "format": ONNX_FORMAT_VERSION,
+        "quantize": quantize,
+        "torch": str(torch.__version__),
+        "transformers": str(transformers.__version__),
+        "onnxruntime": str(onnxruntime.__version__),
+    }
+
+
+def _past_names(num_layers: int, prefix: str) -> List[str]:
+    return [f"{prefix}.{layer}.{kind}" for layer in range(num_layers) for kind in ("key", "value")]
+
+
+def export_onnx(model_name: str, path: str, **settings):
+    """Export a causal LM to ONNX with its key/value cache as inputs and outputs.
+
+    The graph takes input_ids, attention_mask, position_ids and one
+    past_key_values.{layer}.{key,value} tensor per layer (empty for the
+    prompt), and returns the last position's logits with the grown cache
+    as present.{layer}.{key,value}.
+    """
+    import torch
+    from torch import nn
+    from transformers import AutoModelForCausalLM, DynamicCache
+
+    # Eager attention traces to plain matmuls that ONNX Runtime fuses itself
+    model = AutoModelForCausalLM.from_pretrained(model_name, attn_implementation="eager", **settings).eval()
+    config = model.config.get_text_config()
+    num_layers, num_heads = config.num_hidden_layers, config.num_attention_heads
+    head_dim = getattr(config, "head_dim", None) or config.hidden_size // num_heads
+
+    class WithPastKeyValues(nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.model = model
+
+        def forward(self, input_ids, attention_mask, position_ids, *past):
+            cache = DynamicCache(config=self.model.config)
+            for layer in range(num_layers):
+                cache.update(past[2 * layer], past[2 * layer + 1], layer)
+            output = self.model(input_ids=input_ids, attention_mask=attention_mask, position_ids=position_ids,
+                                past_key_values=cache, use_cache=True)
+            present = []
+            for layer in output.past_key_values.layers:
+                present += [layer.keys, layer.values]
+            return (output.logits[:, -1, :], *present)
+
+    # Dummy inputs with a non-empty cache, so every axis is traced as dynamic
+    batch, length, past_length = 2, 3, 2
+    example = (
+        torch.randint(0, config.vocab_size, (batch, length)),
+        torch.ones(batch, past_length + length, dtype=torch.long),
+        torch.arange(past_length, past_length + length).repeat(batch, 1),
+        *[torch.zeros(batch, num_heads, past_length, head_dim) for _ in range(2 * num_layers)],
+    )
+    past_names = _past_names(num_layers, "past_key_values")
+    present_names = _past_names(num_layers, "present")
+    dynamic_axes = {
+        "input_ids": {0: "batch", 1: "sequence"},
+        "attention_mask": {0: "batch", 1: "total"},
+        "position_ids": {0: "batch", 1: "sequence"},
+        "logits": {0: "batch"},
+    }
+    dynamic_axes.update({name: {0: "batch", 2: "past"} for name in past_names})
+    dynamic_axes.update({name: {0: "batch", 2: "total"} for name in present_names})
+
+    with warnings.catch_warnings(), torch.no_grad():
+        # Tracer warnings about Python-side shape checks, and the legacy exporter's deprecation notice
+        warnings.simplefilter("ignore", torch.jit.TracerWarning)
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.simplefilter("ignore", UserWarning)
+        torch.onnx.export(
+            WithPastKeyValues(), example, path,
+            input_names=["input_ids", "attention_mask", "position_ids", *past_names],
+            output_names=["logits", *present_names],
+            dynamic_axes=dynamic_axes,
+            opset_version=ONNX_OPSET,
+            dynamo=False,
+        )
+
+
+def _quantize_int8(path: str, quantized_path: str):
+    """Dynamic int8 quantization of the graph's MatMul/Gemm weights"""
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    quantize_dynamic(path, quantized_path, weight_type=QuantType.QInt8)
+
+
+def _read_metadata(path: str) -> Optional[Dict]:
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def export_cached(model_name: str, cache_dir: str, quantize: Optional[str] = None, **settings) -> str:
+    """Path to model_name's ONNX graph, exporting it into cache_dir on first use"""
+    if quantize not in (None, "int8"):
+        raise ValueError(f"Unsupported quantization mode: {quantize}")
+    model_dir = onnx_cache_dir(model_name, cache_dir)
+    path = os.path.join(model_dir, "model-int8.onnx" if quantize else "model.onnx")
+    metadata_path = path + ".json"
+    metadata = _cache_metadata(model_name, quantize)
+    if os.path.exists(path):
+        if _read_metadata(metadata_path) == metadata:
+            return path
+        print(f"[ONNX] Cached model at {path} is stale; exporting again")
+
+    # Export into a scratch directory and move the finished graph into place
+    os.makedirs(model_dir, exist_ok=True)
+    tmp_dir = path + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        exported = os.path.join(tmp_dir, "model.onnx")
+        export_onnx(model_name, exported, **settings)
+        if quantize == "int8":
+            _quantize_int8(exported, os.path.join(tmp_dir, "model-int8.onnx"))
+            exported = os.path.join(tmp_dir, "model-int8.onnx")
+        os.replace(exported, path)
+        with open(metadata_path, "w", encoding="utf-8") as f:
+            json.dump(metadata, f, indent=2)
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    return path
+
+
+class OnnxCausalLM:
+    """Token-by-token decoding over an exported graph with ONNX Runtime on CPU.
+
+    The prompt runs in one pass with an empty cache; each new token then
+    runs alone against the key/values the previous pass returned. Sampling
+    applies repetition penalty, temperature, top-k and top-p the same way
+    transformers does.
+    """
+
+    def __init__(self, path: str, intra_op_threads: int = 0):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = intra_op_threads  # 0: one per physical core
+        self.path = path
+        self.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+        self.past_names = [i.name for i in self.session.get_inputs() if i.name.startswith("past_key_values.")]
+        _, self.num_heads, _, self.head_dim = self.session.get_inputs()[3].shape
+        self.output_names = [o.name for o in self.session.get_outputs()]
+
+    @property
+    def weights_bytes(self) -> int:
+        return os.path.getsize(self.path)
+
+    def forward(self, input_ids: Sequence[int], past: Optional[List] = None):
+        """Logits after input_ids (numpy, shape (1, vocab)) and the cache including them"""
+        import numpy as np
+
+        if past is None:
+            past = [np.zeros((1, self.num_heads, 0, self.head_dim), dtype=np.float32)] * len(self.past_names)
+        past_length = past[0].shape[2]
+        total = past_length + len(input_ids)
+        feed = {
+            "input_ids": np.array([input_ids], dtype=np.int64),
+            "attention_mask": np.ones((1, total), dtype=np.int64),
+            "position_ids": np.arange(past_length, total, dtype=np.int64)[None],
+        }
+        feed.update(zip(self.past_names, past))
+        logits, *present = self.session.run(self.output_names, feed)
+        return logits, present
+
+    def generate(self, input_ids: Sequence[int], max_new_tokens: int = 160, do_sample: bool = True,
+                 temperature: float = 1.0, top_p: float = 1.0, top_k: int = 0, repetition_penalty: float = 1.0,
+                 eos_token_id: Optional[int] = None, stopping_criteria=None, streamer=None) -> List[int]:
+        """New token ids after the prompt's input_ids"""
+        import torch
+        from services.generation_scheduler import PerRowSampling
+
+        shaping = PerRowSampling([temperature if do_sample else 1.0], [top_k if do_sample else 0],
+                                 [top_p if do_sample else 1.0], [repetition_penalty])
+        sequence = torch.tensor([list(input_ids)])
+        if streamer is not None:
+            streamer.put(sequence[0])  # the prompt, skipped by the streamer
+        new_ids: List[int] = []
+        logits, past = self.forward(list(input_ids))
+        try:
+            while len(new_ids) < max_new_tokens:
+                scores = shaping(sequence, torch.from_numpy(logits))
+                if do_sample:
+                    token = int(torch.multinomial(scores.softmax(dim=-1), 1)[0, 0])
+                else:
+                    token = int(scores.argmax(dim=-1)[0])
+                sequence = torch.cat([sequence, torch.tensor([[token]])], dim=1)
+                if eos_token_id is not None and token == eos_token_id:
+                    break
+                new_ids.append(token)
+                if streamer is not None:
+                    streamer.put(torch.tensor([token]))
+                if stopping_criteria is not None and bool(stopping_criteria(sequence, scores)[0]):
+                    break
+                if len(new_ids) < max_new_tokens:
+                    logits, past = self.forward([token], past)
+        finally:
+            if streamer is not None:
+                streamer.end()
+        return new_ids
+
+
+class OnnxTextGenerator:
+    """Stands in for a text-generation pipeline, decoding with an OnnxCausalLM.
+
+    Has no torch .model, so the prefix cache, batching scheduler and draft
+    model (which drive model.generate()) leave it alone.
+    """
+
+    def __init__(self, onnx_model: OnnxCausalLM, tokenizer, config=None):
+        self.onnx_model = onnx_model
+        self.tokenizer = tokenizer
+        self.config = config
+
+    def _max_prompt_tokens(self, max_new_tokens: int) -> Optional[int]:
+        window = getattr(self.config, "n_positions", None) or getattr(self.config, "max_position_embeddings", None)
+        return max(1, window - max_new_tokens) if window else None
+
+    def __call__(self, prompt: str, max_new_tokens: int = 160, truncation: bool = False, **sampling) -> List[Dict]:
+        sampling.pop("pad_token_id", None)
+        input_ids = self.tokenizer(prompt)["input_ids"]
+        limit = self._max_prompt_tokens(max_new_tokens)
+        if truncation and limit and len(input_ids) > limit:
+            input_ids = input_ids[:limit]
+        new_ids = self.onnx_model.generate(input_ids, max_new_tokens=max_new_tokens, **sampling)
+        return [{"generated_text": prompt + self.tokenizer.decode(new_ids, skip_special_tokens=True)}]
+
+
+def load_onnx_generator(model_name: str, cache_dir: str, tokenizer, quantize: Optional[str] = None,
+                        **settings) -> OnnxTextGenerator:
+    """ONNX Runtime generator for model_name, exported into cache_dir on first use"""
+    from transformers import AutoConfig
+
+    path = export_cached(model_name, cache_dir, quantize, **settings)
+    return OnnxTextGenerator(OnnxCausalLM(path), tokenizer, AutoConfig.from_pretrained(model_name))
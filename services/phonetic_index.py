@@ -0,0 +1,121 @@
+# services/phonetic_index.py
+import re
+from functools import lru_cache
+from typing import Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from services.language_routing import fold_romanization
+
+# Common English words that are never rewritten, nor used as rewrite targets, even
+# though they sound like (or are borrowed into) Hinglish lexicon terms
+ENGLISH_STOPWORDS: FrozenSet[str] = frozenset([
+    "about", "after", "again", "also", "back", "base", "because", "been", "before", "being",
+    "better", "bitter", "calm", "could", "come", "data", "does", "doing", "done", "down", "drain",
+    "drive", "even", "every", "face", "fail", "fall", "feel", "feeling", "file", "fill", "from",
+    "full", "give", "going", "good", "guilt", "guilty", "hate", "have", "here", "into", "just",
+    "know", "leaving", "like", "live", "living", "look", "love", "made", "main", "make", "many",
+    "mood", "more", "most", "much", "must", "need", "normal", "only", "other", "over", "paint",
+    "point", "pump", "really", "said", "same", "save", "should", "some", "step", "still", "stop",
+    "such", "super", "take", "than", "that", "them", "theme", "then", "there", "these", "they",
+    "thing", "think", "this", "those", "thread", "time", "tired", "today", "very", "want", "well",
+    "were", "what", "when", "where", "which", "while", "will", "wise", "wish", "with", "work",
+    "would", "year", "your",
+])
+
+# Spelling variants collapsed before the consonant skeleton is taken
+_FOLDS: Tuple[Tuple[str, str], ...] = (
+    ("igh", "ai"), ("tch", "ch"), ("chh", "ch"), ("ck", "k"), ("ph", "f"), ("x", "ks"),
+    ("kh", "k"), ("gh", "g"), ("jh", "j"), ("th", "t"), ("dh", "d"), ("bh", "b"), ("sh", "s"),
+    ("ch", "c"), ("q", "k"), ("z", "j"), ("w", "v"),
+)
+_VOWELS = frozenset("aeiouy")
+_TOKEN_RE = re.compile(r"[a-z]+")
+_REGEX_ESCAPE_RE = re.compile(r"\\[A-Za-z]")
+
+
+def phonetic_key(word: str) -> str:
+    """Metaphone-style key tuned for romanized Hindi: first letter + consonant skeleton"""
+    word = word.lower()
+    for src, dst in _FOLDS:
+        word = word.replace(src, dst)
+    if not word:
+        return ""
+
+    key = [word[0]]
+    for ch in word[1:]:
+        if ch in _VOWELS or ch == "h":
+            continue
+        if ch != key[-1]:
+            key.append(ch)
+    return "".join(key)
+
+
+def bounded_edit_distance(a: str, b: str, max_distance: int) -> int:
+    """Levenshtein distance, giving up (returning max_distance + 1) once it must exceed the bound"""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j, cb in enumerate(b, 1):
+            current[j] = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb))
+            row_min = min(row_min, current[j])
+        if row_min > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class PhoneticIndex:
+    """Phonetic key -> lexicon tokens, for O(1) per-token fuzzy lookup.
+
+    A token is only rewritten when it shares a key with a lexicon token and
+    is within a small edit distance of it (1 for short words, 2 otherwise).
+    """
+
+    def __init__(self, vocabulary: Iterable[str], min_length: int = 4,
+                 protected: FrozenSet[str] = ENGLISH_STOPWORDS):
+        self.vocabulary = frozenset(word for word in vocabulary if word)
+        self.min_length = min_length
+        self.protected = protected
+        index: Dict[str, List[str]] = {}
+        for word in sorted(self.vocabulary):
+            if len(word) >= min_length and word not in protected:
+                index.setdefault(phonetic_key(word), []).append(word)
+        self._index = {key: tuple(words) for key, words in index.items()}
+        self.lookup = lru_cache(maxsize=4096)(self._lookup)
+
+    def __len__(self) -> int:
+        return len(self.vocabulary)
+
+    def _lookup(self, token: str) -> Optional[str]:
+        """Closest lexicon token for an out-of-lexicon token, if any"""
+        if token in self.vocabulary or len(token) < self.min_length or token in self.protected:
+            return None
+        candidates = self._index.get(phonetic_key(token))
+        if not candidates:
+            return None
+        max_distance = 1 if len(token) <= 5 else 2
+        best, best_distance = None, max_distance + 1
+        folded = fold_romanization(token)
+        for candidate in candidates:
+            # Compare vowel-folded spellings so "jina" prefers "jeena" over "jana"
+            distance = bounded_edit_distance(folded, fold_romanization(candidate), max_distance)
+            if distance < best_distance:
+                best, best_distance = candidate, distance
+        return best
+
+    def correct_text(self, text: str) -> str:
+        """Rewrite near-miss tokens of lowercase text to their lexicon spelling"""
+        def replace(match):
+            return self.lookup(match.group(0)) or match.group(0)
+        return _TOKEN_RE.sub(replace, text)
+
+
+def tokens_of(phrases: Iterable[str]) -> FrozenSet[str]:
+    """All alphabetic tokens of a collection of lexicon phrases or regex sources"""
+    return frozenset(
+        token
+        for phrase in phrases
+        for token in _TOKEN_RE.findall(_REGEX_ESCAPE_RE.sub(" ", phrase).lower())
+    )
@@ -0,0 +1,96 @@
+# services/prefix_cache.py
+import copy
+import threading
+import weakref
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+from utils.metrics import metrics
+
+
+class PrefixCache:
+    """Precomputed attention key/values for static prompt prefixes.
+
+    The system prompt and few-shot block in front of every prompt are run
+    through the model once per variant; each generation starts from a copy
+    of that state, so only the dynamic part of the prompt is processed.
+    Prefix and suffix are tokenized separately and concatenated.
+    """
+
+    def __init__(self, model, tokenizer, max_prefixes: int = 16):
+        # Held weakly: the per-model table is weak-keyed, and a strong reference here would keep
+        # an unloaded model alive
+        self._model = weakref.ref(model)
+        self.tokenizer = tokenizer
+        self.max_prefixes = max_prefixes
+        self._lock = threading.Lock()
+        self._entries: Dict[str, Tuple] = {}
+
+    @property
+    def model(self):
+        return self._model()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, prefix: str) -> Tuple:
+        """(prefix token ids, past_key_values) for a static prefix, computed once"""
+        entry = self._entries.get(prefix)
+        if entry is not None:
+            metrics.increment("prefix_cache_hits")
+            return entry
+
+        import torch
+
+        with self._lock:
+            entry = self._entries.get(prefix)
+            if entry is None:
+                metrics.increment("prefix_cache_misses")
+                ids = self.tokenizer(prefix, return_tensors="pt").input_ids
+                with torch.no_grad():
+                    past = self.model(ids, use_cache=True).past_key_values
+                entry = (ids, past)
+                if len(self._entries) < self.max_prefixes:
+                    self._entries[prefix] = entry
+            return entry
+
+    def warm(self, prefixes: Iterable[str]):
+        for prefix in prefixes:
+            self.get(prefix)
+
+    def generate(self, prefix: str, suffix: Union[str, List[int]], **generate_kwargs) -> str:
+        """Continue prefix + suffix (text or token ids), returning only the newly generated text"""
+        import torch
+
+        prefix_ids, past = self.get(prefix)
+        if isinstance(suffix, str):
+            suffix_ids = self.tokenizer(suffix, return_tensors="pt", add_special_tokens=False).input_ids
+        else:
+            suffix_ids = torch.tensor([suffix], dtype=prefix_ids.dtype)
+        input_ids = torch.cat([prefix_ids, suffix_ids], dim=1)
+
+        # generate() extends the cache in place, so every call gets its own copy
+        with torch.no_grad():
+            output = self.model.generate(
+                input_ids,
+                attention_mask=torch.ones_like(input_ids),
+                past_key_values=copy.deepcopy(past),
+                **generate_kwargs,
+            )
+        return self.tokenizer.decode(output[0, input_ids.shape[1]:], skip_special_tokens=True)
+
+
+# One cache per loaded model; entries go away with the model
+_caches: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_caches_lock = threading.Lock()
+
+
+def get_prefix_cache(generator) -> Optional[PrefixCache]:
+    """Prefix cache for a text-generation pipeline's model, if it is a torch model"""
+    model = getattr(generator, "model", None)
+    if model is None or not hasattr(model, "generate"):
+        return None
+    with _caches_lock:
+        cache = _caches.get(model)
+        if cache is None:
+            cache = _caches[model] = PrefixCache(model, generator.tokenizer)
+        return cache
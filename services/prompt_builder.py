@@ -0,0 +1,132 @@
+# services/prompt_builder.py
+import re
+import threading
+import weakref
+from functools import lru_cache
+from typing import List, NamedTuple, Optional, Sequence, Tuple
+
+# Split get_context() output into turns, each starting at a "User" line
+_TURN_RE = re.compile(r"(?m)^(?=User\b)")
+
+
+class BuiltPrompt(NamedTuple):
+    prefix: str            # system + few-shots, static across turns
+    suffix: str            # everything specific to this turn
+    suffix_ids: List[int]  # exact token ids of the suffix
+    n_tokens: int          # prefix + suffix tokens
+    few_shots_used: int
+    context_turns_used: int
+    user_truncated: bool
+
+
+def split_context_turns(context: Optional[str]) -> List[str]:
+    """Conversation context as a list of "User: ...\\nBot: ...\\n" turns, oldest first"""
+    turns = [turn for turn in _TURN_RE.split((context or "").strip()) if turn.strip()]
+    return [turn.rstrip("\n") + "\n" for turn in turns]
+
+
+class PromptBuilder:
+    """Assemble prompts that fit a fixed token budget.
+
+    Segments are tokenized separately (static ones once, via a cache) and the
+    suffix ids are the concatenation of its segments, so the count is exact
+    for the ids actually fed to the model. Space is given out by priority:
+    system prompt, the current user turn, few-shots, then context turns from
+    the most recent backwards.
+    """
+
+    def __init__(self, tokenizer, budget: int):
+        self.tokenizer = tokenizer
+        self.budget = budget
+        self._encode = lru_cache(maxsize=512)(self._encode_uncached)
+        self._prefix_ids = lru_cache(maxsize=64)(self._encode_prefix)
+
+    def _encode_uncached(self, text: str) -> Tuple[int, ...]:
+        return tuple(self.tokenizer(text, add_special_tokens=False)["input_ids"])
+
+    def _encode_prefix(self, text: str) -> Tuple[int, ...]:
+        # The prompt start gets special tokens (e.g. BOS), as in PrefixCache.get
+        return tuple(self.tokenizer(text)["input_ids"])
+
+    def count(self, text: str) -> int:
+        return len(self._encode(text))
+
+    def input_ids(self, built: BuiltPrompt) -> List[int]:
+        """Token ids of the whole prompt, prefix included"""
+        return list(self._prefix_ids(built.prefix)) + built.suffix_ids
+
+    @staticmethod
+    def prefix_text(system: str, few_shots: Sequence[str]) -> str:
+        return system + ("\n" + "\n\n".join(few_shots) if few_shots else "")
+
+    def build(self, system: str, few_shots: Sequence[str], user_text: str,
+              context_turns: Sequence[str] = (), before_context: str = "",
+              after_context: str = "", reply_start: str = "") -> BuiltPrompt:
+        encode = self._encode
+        user_ids = list(self._encode_uncached(" " + user_text))  # per-turn, not worth caching
+
+        # Fixed parts of the suffix, in prompt order around the context and user text
+        head = ["\n\n", before_context]
+        tail = [after_context, "User:"]
+        closing = "\nAssistant:" + (f" {reply_start}" if reply_start else "")  # generation continues after it
+        fixed = sum(len(encode(s)) for s in head + tail + [closing] if s)
+
+        def prefix_cost(shots: int) -> int:
+            return len(self._prefix_ids(self.prefix_text(system, few_shots[:shots])))
+
+        # 1. system prompt, 2. current user turn (keeping its most recent words if too long)
+        remaining = self.budget - prefix_cost(0) - fixed
+        user_truncated = len(user_ids) > max(remaining, 0)
+        if user_truncated:
+            user_ids = user_ids[len(user_ids) - max(remaining, 0):]
+        remaining -= len(user_ids)
+
+        # 3. few-shots, dropping the last ones first
+        used_shots = len(few_shots)
+        while used_shots and prefix_cost(used_shots) - prefix_cost(0) > remaining:
+            used_shots -= 1
+        prefix = self.prefix_text(system, few_shots[:used_shots])
+        remaining -= prefix_cost(used_shots) - prefix_cost(0)
+
+        # 4. context turns, most recent first, stopping at the first that does not fit
+        kept_turns: List[str] = []
+        label_cost = self.count("Context: ")
+        for turn in reversed(context_turns):
+            cost = len(encode(turn)) + (0 if kept_turns else label_cost)
+            if cost > remaining:
+                break
+            kept_turns.insert(0, turn)
+            remaining -= cost
+
+        segments = head + (["Context: "] + kept_turns if kept_turns else []) + tail
+        suffix_ids: List[int] = []
+        for segment in segments:
+            if segment:
+                suffix_ids.extend(encode(segment))
+        suffix_ids.extend(user_ids)
+        suffix_ids.extend(encode(closing))
+
+        user_part = self.tokenizer.decode(user_ids) if user_truncated else " " + user_text
+        suffix = "".join(segments) + user_part + closing
+        return BuiltPrompt(
+            prefix=prefix,
+            suffix=suffix,
+            suffix_ids=suffix_ids,
+            n_tokens=prefix_cost(used_shots) + len(suffix_ids),
+            few_shots_used=used_shots,
+            context_turns_used=len(kept_turns),
+            user_truncated=user_truncated,
+        )
+
+
+# One builder per (tokenizer, budget); entries go away with the tokenizer
+_builders: "weakref.WeakKeyDictionary" = weakref.WeakKeyDictionary()
+_builders_lock = threading.Lock()
+
+
+def get_prompt_builder(tokenizer, budget: int) -> PromptBuilder:
+    with _builders_lock:
+        builder = _builders.get(tokenizer)
+        if builder is None or builder.budget != budget:
+            builder = _builders[tokenizer] = PromptBuilder(tokenizer, budget)
+        return builder
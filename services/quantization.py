@@ -0,0 +1,216 @@
+# services/quantization.py
+import os
+import re
+import warnings
+from collections import OrderedDict
+
+QUANTIZED_FORMAT_VERSION = 1  # bump when the saved layout changes
+
+
+def linear_from_conv1d(model):
+    """Swap GPT-2 style Conv1D projections for equivalent nn.Linear layers, in place.
+
+    Dynamic quantization only targets nn.Linear; GPT-2 (and DialoGPT) keep
+    their attention and MLP weights in transformers' Conv1D, which stores the
+    same matrix transposed.
+    """
+    from torch import nn
+    from transformers.pytorch_utils import Conv1D
+
+    for name, child in model.named_children():
+        if isinstance(child, Conv1D):
+            in_features, out_features = child.weight.shape
+            linear = nn.Linear(in_features, out_features, bias=child.bias is not None,
+                               device=child.weight.device)
+            linear.weight.data = child.weight.data.t().contiguous()
+            if child.bias is not None:
+                linear.bias.data = child.bias.data
+            setattr(model, name, linear)
+        else:
+            linear_from_conv1d(child)
+    return model
+
+
+def quantize_int8(model):
+    """Dynamic int8 quantization of every Linear layer (weights int8, activations fp32)"""
+    import torch
+    from torch import nn
+
+    linear_from_conv1d(model)
+    with warnings.catch_warnings():
+        # torch marks eager-mode quantization as deprecated in favour of torchao
+        warnings.simplefilter("ignore", DeprecationWarning)
+        warnings.simplefilter("ignore", UserWarning)
+        return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8)
+
+
+def quantized_cache_path(model_name: str, cache_dir: str) -> str:
+    safe_name = re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name).strip("_")
+    return os.path.join(cache_dir, f"{safe_name}-int8.pt")
+
+
+def _weights_identity(model_name: str, revision=None):
+    """What identifies the weights: file sizes and mtimes in a local directory, else the hub snapshot"""
+    if os.path.isdir(model_name):
+        identity = {}
+        for filename in sorted(os.listdir(model_name)):
+            if filename.endswith((".json", ".safetensors", ".bin")):
+                stat = os.stat(os.path.join(model_name, filename))
+                identity[filename] = [stat.st_size, stat.st_mtime_ns]
+        return identity
+    try:
+        from transformers.utils import cached_file
+
+        # Downloaded files live under snapshots/<commit hash>/
+        config_path = cached_file(model_name, "config.json", revision=revision)
+        return {"revision": revision, "snapshot": os.path.basename(os.path.dirname(config_path))}
+    except Exception:
+        return {"revision": revision}
+
+
+def _cache_metadata(model_name: str, revision=None):
+    import torch
+    import transformers
+
+    return {
+        "model_name": model_name,
+        "weights": _weights_identity(model_name, revision),
+        "format": QUANTIZED_FORMAT_VERSION,
+        "torch": str(torch.__version__),
+        "transformers": str(transformers.__version__),
+    }
+
+
+def _encode_quantized(value):
+    """A quantized tensor as plain tensors and numbers"""
+    if value.qscheme() in (_torch().per_channel_affine, _torch().per_channel_affine_float_qparams):
+        return {"int_repr": value.int_repr(), "scales": value.q_per_channel_scales(),
+                "zero_points": value.q_per_channel_zero_points(), "axis": value.q_per_channel_axis()}
+    return {"int_repr": value.int_repr(), "scale": value.q_scale(), "zero_point": value.q_zero_point()}
+
+
+def _decode_quantized(value):
+    torch = _torch()
+    if "scales" in value:
+        return torch._make_per_channel_quantized_tensor(
+            value["int_repr"], value["scales"], value["zero_points"], value["axis"])
+    return torch._make_per_tensor_quantized_tensor(value["int_repr"], value["scale"], value["zero_point"])
+
+
+def _portable_state_dict(state_dict):
+    """State dict with dtypes and quantized tensors in plain form.
+
+    Pickling either looks its name up across sys.modules, which can trip
+    transformers' lazy imports of optional vision dependencies; the plain
+    form also loads with torch.load(weights_only=True).
+    """
+    torch = _torch()
+
+    def encode(value):
+        if isinstance(value, torch.dtype):
+            return {"dtype": str(value).rsplit(".", 1)[-1]}
+        if isinstance(value, torch.Tensor) and value.is_quantized:
+            return _encode_quantized(value)
+        if isinstance(value, tuple):
+            return {"tuple": [encode(item) for item in value]}
+        return value
+
+    portable = {key: encode(value) for key, value in state_dict.items()}
+    # Per-module format versions, which quantized modules need to load their keys
+    portable["_metadata"] = {key: dict(value) for key, value in getattr(state_dict, "_metadata", {}).items()}
+    return portable
+
+
+def _restore_state_dict(state_dict):
+    torch = _torch()
+
+    def decode(value):
+        if isinstance(value, dict):
+            if "dtype" in value:
+                return getattr(torch, value["dtype"])
+            if "int_repr" in value:
+                return _decode_quantized(value)
+            if "tuple" in value:
+                return tuple(decode(item) for item in value["tuple"])
+        return value
+
+    restored = OrderedDict((key, decode(value)) for key, value in state_dict.items() if key != "_metadata")
+    restored._metadata = OrderedDict(state_dict.get("_metadata", {}))
+    return restored
+
+
+def _torch():
+    import torch
+    return torch
+
+
+def _quantized_skeleton(model_name: str):
+    """The quantized model's structure with no fp32 weights ever allocated"""
+    import torch
+    from torch import nn
+    from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+    from transformers import AutoConfig, AutoModelForCausalLM
+
+    with torch.device("meta"):
+        model = AutoModelForCausalLM.from_config(AutoConfig.from_pretrained(model_name))
+    linear_from_conv1d(model)
+
+    def swap_linear(module):
+        for name, child in module.named_children():
+            if isinstance(child, nn.Linear):
+                setattr(module, name, DynamicQuantizedLinear(
+                    child.in_features, child.out_features, bias_=child.bias is not None, dtype=torch.qint8))
+            else:
+                swap_linear(child)
+
+    with warnings.catch_warnings():
+        warnings.simplefilter("ignore", UserWarning)
+        swap_linear(model)
+    return model.to_empty(device="cpu").eval()
+
+
+def _load_cached(model_name: str, path: str, revision=None):
+    import torch
+
+    saved = torch.load(path, map_location="cpu", weights_only=True)
+    if saved.get("metadata") != _cache_metadata(model_name, revision):
+        return None
+    model = _quantized_skeleton(model_name)
+    model.load_state_dict(_restore_state_dict(saved["state_dict"]))
+    # Non-persistent buffers (e.g. attention masks) are not in the state dict
+    for name, buffer in saved["buffers"].items():
+        owner, _, attr = name.rpartition(".")
+        setattr(model.get_submodule(owner) if owner else model, attr, buffer)
+    return model
+
+
+def load_quantized_model(model_name: str, cache_dir: str, **settings):
+    """An int8 dynamically quantized causal LM, reloaded from cache_dir when possible"""
+    import torch
+    from transformers import AutoModelForCausalLM
+
+    path = quantized_cache_path(model_name, cache_dir)
+    if os.path.exists(path):
+        try:
+            model = _load_cached(model_name, path, settings.get("revision"))
+            if model is not None:
+                return model
+            print(f"[QUANTIZATION] Cached model at {path} is stale; rebuilding")
+        except Exception as e:
+            print(f"[QUANTIZATION ERROR] Could not reload {path}: {e}")
+
+    model = AutoModelForCausalLM.from_pretrained(model_name, **settings).eval()
+    model = quantize_int8(model)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = path + ".tmp"
+        torch.save({
+            "metadata": _cache_metadata(model_name, settings.get("revision")),
+            "state_dict": _portable_state_dict(model.state_dict()),
+            "buffers": dict(model.named_buffers()),
+        }, tmp_path)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"[QUANTIZATION ERROR] Could not cache quantized model: {e}")
+    return model
+
@@ -0,0 +1,159 @@
+# services/reply_cache.py
+import os
+import random
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+from utils.metrics import metrics
+
+try:
+    from config import REPLY_CACHE_SIZE, REPLY_CACHE_TTL_SECONDS, REPLY_CACHE_POOL, REPLY_CACHE_MAX_WORDS
+except Exception:
+    REPLY_CACHE_SIZE = int(os.getenv("REPLY_CACHE_SIZE", "256"))
+    REPLY_CACHE_TTL_SECONDS = float(os.getenv("REPLY_CACHE_TTL_SECONDS", "1800"))
+    REPLY_CACHE_POOL = int(os.getenv("REPLY_CACHE_POOL", "3"))
+    REPLY_CACHE_MAX_WORDS = int(os.getenv("REPLY_CACHE_MAX_WORDS", "6"))
+
+# Spelling variants of common openers mapped to one form
+CANONICAL_WORDS = {
+    "hello": "hi", "hey": "hi", "hii": "hi", "hiii": "hi", "heyy": "hi", "namaste": "hi", "hlo": "hi",
+    "u": "you", "r": "are", "im": "i'm", "fyn": "fine", "gud": "good", "ok": "okay",
+    "thx": "thanks", "thanku": "thanks", "shukriya": "thanks", "dhanyavaad": "thanks",
+}
+
+# Openers whose reply does not depend on the turn before; an utterance is
+# cached only if it is made up entirely of these (after normalizing)
+CACHEABLE_PHRASES = (
+    "hi", "good morning", "good afternoon", "good evening", "good night", "bye", "goodbye",
+    "thanks", "thank you", "so much", "a lot", "how are you", "how are you doing", "and you",
+    "i'm fine", "i'm good", "i'm okay", "i'm doing well", "i'm doing good", "there", "assistant",
+)
+
+_PUNCTUATION_RE = re.compile(r"[^\w\s']+")
+_REPEATED_RE = re.compile(r"(\w)\1{2,}")
+_I_AM_RE = re.compile(r"\bi am\b")
+_CACHEABLE_RE = re.compile(
+    r"(?:(?:%s)(?: |$))+" % "|".join(re.escape(phrase) for phrase in sorted(CACHEABLE_PHRASES, key=len, reverse=True))
+)
+
+ReplyKey = Tuple[str, str, str, Tuple[str, ...]]
+
+
+def normalize_utterance(text: str) -> str:
+    """Lowercase words without punctuation, stretched letters or spelling variants"""
+    text = _PUNCTUATION_RE.sub(" ", (text or "").lower())
+    text = _REPEATED_RE.sub(r"\1\1", text)  # "heyyyy" -> "heyy"
+    text = " ".join(text.split())
+    text = _I_AM_RE.sub("i'm", text)
+    return " ".join(CANONICAL_WORDS.get(word, word) for word in text.split())
+
+
+class _Entry:
+    def __init__(self):
+        self.replies: List[Tuple[str, float]] = []  # (reply, stored at)
+        self.cost_ms = 0.0  # mean time it took to produce a reply
+        self.last: Optional[str] = None
+
+
+class ReplyCache:
+    """Pools of recent replies to short, frequent utterances.
+
+    Keyed on the normalized utterance plus emotion, intensity and cultural
+    context. Only openers made of CACHEABLE_PHRASES get a key: a bare "yes"
+    or "not really" answers whatever came before it, so it is never replayed
+    from cache. A key is served from cache once its pool holds pool_size
+    distinct replies, picking one other than the last served so repeated
+    openers still get varied answers. Replies expire after ttl_seconds and
+    the least recently used keys go first when full.
+    """
+
+    def __init__(self, max_entries: int = REPLY_CACHE_SIZE, ttl_seconds: float = REPLY_CACHE_TTL_SECONDS,
+                 pool_size: int = REPLY_CACHE_POOL, max_words: int = REPLY_CACHE_MAX_WORDS,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.pool_size = max(1, pool_size)
+        self.max_words = max_words
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[ReplyKey, _Entry]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.saved_ms = 0.0
+
+    def key(self, user_text: str, emotion: str, intensity: str, contexts: Sequence[str] = ()) -> Optional[ReplyKey]:
+        """Cache key for an utterance, or None if it is too long or not a context-free opener"""
+        normalized = normalize_utterance(user_text)
+        if not normalized or len(normalized.split()) > self.max_words:
+            return None
+        if not _CACHEABLE_RE.fullmatch(normalized):
+            return None
+        return normalized, emotion, intensity, tuple(sorted(contexts))
+
+    def _live_entry(self, key: ReplyKey) -> Optional[_Entry]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        cutoff = self.clock() - self.ttl_seconds
+        entry.replies = [(reply, stored) for reply, stored in entry.replies if stored > cutoff]
+        if not entry.replies:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, key: Optional[ReplyKey]) -> Optional[str]:
+        if key is None:
+            return None
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None or len(entry.replies) < self.pool_size:
+                self.misses += 1
+                metrics.increment("reply_cache_misses")
+                return None
+            choices = [reply for reply, _ in entry.replies if reply != entry.last] or [entry.replies[0][0]]
+            entry.last = random.choice(choices)
+            self.hits += 1
+            self.saved_ms += entry.cost_ms
+            metrics.increment("reply_cache_hits")
+            metrics.increment("reply_cache_saved_ms", int(entry.cost_ms))
+            return entry.last
+
+    def put(self, key: Optional[ReplyKey], reply: str, cost_ms: float = 0.0):
+        """Add a freshly produced reply (and how long it took) to the key's pool"""
+        if key is None or not reply:
+            return
+        with self._lock:
+            entry = self._live_entry(key)
+            if entry is None:
+                entry = self._entries[key] = _Entry()
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            n = len(entry.replies)
+            entry.cost_ms = (entry.cost_ms * n + cost_ms) / (n + 1)
+            entry.last = reply
+            if all(reply != cached for cached, _ in entry.replies):
+                entry.replies.append((reply, self.clock()))
+                del entry.replies[:-self.pool_size]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "saved_ms": round(self.saved_ms, 1),
+            }
+
+
+# Global reply cache instance
+reply_cache = ReplyCache()
@@ -0,0 +1,112 @@
+# services/response_templates.py
+import random
+import re
+from types import MappingProxyType
+from typing import List, Mapping, NamedTuple, Optional, Sequence, Tuple
+
+Lines = Tuple[str, ...]
+
+INTENSITIES = ("low", "medium", "high")
+# Emotions whose template reply adds a supportive line or a follow-up question
+SUPPORT_EMOTIONS = ("sad", "anxious", "overwhelmed")
+FOLLOW_UP_EMOTIONS = ("happy", "grateful")
+# Coping strategy offered per emotion at medium or high intensity
+COPING_FOR_EMOTION = {"anxious": "breathing", "angry": "grounding", "overwhelmed": "mindfulness"}
+MAX_TEMPLATE_CHARS = 300
+
+
+def _freeze(groups: Mapping[str, Sequence[str]]) -> Mapping[str, Lines]:
+    return MappingProxyType({name: tuple(lines) for name, lines in groups.items()})
+
+
+class _Plan(NamedTuple):
+    """The line groups a template reply draws from, in order"""
+    acknowledgments: Lines
+    follow_ups: Lines
+    coping: Lines
+
+
+_NO_PLAN = _Plan((), (), ())
+
+
+class ResponseTemplates:
+    """Template replies and cultural context detection, compiled once.
+
+    Every (emotion, intensity) pair resolves at construction to read-only
+    line groups (high intensity overrides applied) and a plan of which
+    groups its reply draws from; each context's keywords become one regex.
+    A turn then costs a few regex searches and random picks.
+    """
+
+    def __init__(self, emotion_responses: Mapping[str, Mapping[str, Sequence[str]]],
+                 high_intensity_responses: Mapping[str, Mapping[str, Sequence[str]]],
+                 cultural_contexts: Mapping[str, Sequence[str]],
+                 coping_strategies: Mapping[str, Sequence[str]],
+                 context_keywords: Mapping[str, Sequence[str]]):
+        # Plain substring matches, as `keyword in text` would find them
+        self._context_patterns = tuple(
+            (context, re.compile("|".join(re.escape(keyword.lower()) for keyword in keywords)))
+            for context, keywords in context_keywords.items()
+        )
+        self._context_lines = _freeze(cultural_contexts)
+        self._coping = _freeze(coping_strategies)
+        self._responses = {}
+        self._plans = {}
+        for emotion, groups in emotion_responses.items():
+            for intensity in INTENSITIES:
+                merged = dict(groups)
+                if intensity == "high":
+                    merged.update(high_intensity_responses.get(emotion, {}))
+                responses = _freeze(merged)
+                self._responses[emotion, intensity] = responses
+                self._plans[emotion, intensity] = self._plan(emotion, intensity, responses)
+        self._responses = MappingProxyType(self._responses)
+        self._plans = MappingProxyType(self._plans)
+
+    def _plan(self, emotion: str, intensity: str, responses: Mapping[str, Lines]) -> _Plan:
+        follow_ups: Lines = ()
+        if emotion in SUPPORT_EMOTIONS:
+            follow_ups = responses.get("support", ())
+        elif emotion in FOLLOW_UP_EMOTIONS:
+            follow_ups = responses.get("follow_ups", ())
+        coping: Lines = ()
+        if emotion in COPING_FOR_EMOTION and intensity in ("medium", "high"):
+            coping = self._coping[COPING_FOR_EMOTION[emotion]]
+        return _Plan(responses.get("acknowledgments", ()), follow_ups, coping)
+
+    @staticmethod
+    def _intensity(intensity: str) -> str:
+        return intensity if intensity in INTENSITIES else "low"
+
+    def responses(self, emotion: str, intensity: str = "medium") -> Mapping[str, Lines]:
+        """Read-only response lines for an emotion at an intensity (empty if unknown)"""
+        return self._responses.get((emotion, self._intensity(intensity)), MappingProxyType({}))
+
+    def acknowledgment(self, emotion: str, intensity: str, default: Sequence[str] = ()) -> Optional[str]:
+        """A random acknowledgment line for the emotion, or from default if it has none"""
+        lines = self._plans.get((emotion, self._intensity(intensity)), _NO_PLAN).acknowledgments or tuple(default)
+        return random.choice(lines) if lines else None
+
+    def detect_contexts(self, text: str) -> List[str]:
+        """Cultural contexts whose keywords appear in the text"""
+        text_lower = text.lower()
+        return [context for context, pattern in self._context_patterns if pattern.search(text_lower)]
+
+    def compose(self, emotion: str, intensity: str, contexts: Sequence[str], acknowledge: bool = True) -> str:
+        """Acknowledgment, first context's line, follow-up and coping strategy, as they apply"""
+        plan = self._plans.get((emotion, self._intensity(intensity)), _NO_PLAN)
+        parts = []
+        if acknowledge and plan.acknowledgments:
+            parts.append(random.choice(plan.acknowledgments))
+        context_lines = self._context_lines.get(contexts[0]) if contexts else None  # one context keeps it concise
+        if context_lines:
+            parts.append(random.choice(context_lines))
+        if plan.follow_ups:
+            parts.append(random.choice(plan.follow_ups))
+        if plan.coping:
+            parts.append(f"Try this: {random.choice(plan.coping)}")
+
+        response = " ".join(parts)
+        if len(response) > MAX_TEMPLATE_CHARS:
+            response = response[:MAX_TEMPLATE_CHARS - 3] + "..."
+        return response
@@ -1,8 +1,28 @@
 # services/safety_guard.py
+import os
+import random
 import re
-from typing import Literal, Tuple, List, Dict
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Literal, Tuple, List, Dict, Optional
 from datetime import datetime
 
+try:
+    from re import _parser as sre_parse
+except ImportError:  # Python < 3.11
+    import sre_parse
+
+from services.language_routing import ROMANIZED_HINDI_WORDS
+from services.phonetic_index import ENGLISH_STOPWORDS, PhoneticIndex, tokens_of
+from utils.metrics import metrics
+
+try:
+    from config import SAFETY_SCAN_BUDGET_MS, SAFETY_SCAN_MS_PER_KCHAR
+except Exception:
+    SAFETY_SCAN_BUDGET_MS = float(os.getenv("SAFETY_SCAN_BUDGET_MS", "10"))
+    SAFETY_SCAN_MS_PER_KCHAR = float(os.getenv("SAFETY_SCAN_MS_PER_KCHAR", "2"))
+
 Risk = Literal["none", "low", "medium", "high"]
 Category = Literal["suicide", "self_harm", "violence", "abuse", "substance", "eating_disorder", "unknown"]
 
@@ -120,74 +140,339 @@ COMPILED = [
 ]
 LOW_COMPILED = [re.compile(p, re.I) for p in LOW_RISK_PATTERNS]
 
-# Risk assessment history for pattern tracking
-risk_history: List[Dict] = []
+# Harmful phrasing in generated replies (screened in addition to suicide/self-harm)
+OUTPUT_PATTERNS = [
+    r"\b(?<!don't )(?<!dont )(?<!not )(?<!never )(kill|hurt|harm|starve) yourself\b",
+    r"\bcut yourself\b(?! (some )?slack)",
+    r"\b(end|take) your (own )?life\b",
+    r"\byou (deserve|ought) to (die|suffer|be hurt)\b",
+    r"\b(nobody|no one) (would|will) (miss|care about) you\b",
+    r"\b(the world|everyone) (would be|is) better (off )?without you\b",
+    r"\bgive up on (life|living|everything)\b",
+    r"\bhow (to|you can) (overdose|hang yourself|cut deeper)\b",
+    r"\b(drink|drugs|pills) (will|would) (help|fix it)\b",
+    
+    # Hindi/Hinglish patterns
+    r"\b(tum|aap) mar (jao|jaao|jaiye)\b",
+    r"\bkhud ko (maar|khatam|hurt) (do|lo|kar lo)\b",
+    r"\bzindagi khatam kar (do|lo)\b",
+    r"\btumhari (zaroorat|parwah) (kisi ko )?nahi\b"
+]
+OUTPUT_COMPILED = [re.compile(p, re.I) for p in OUTPUT_PATTERNS]
 
-def assess_risk(text: str) -> Tuple[Risk, Category, List[str]]:
-    """Enhanced risk assessment with better categorization"""
-    if not text:
-        return "none", "unknown", []
+# Severity of each category, and which category wins when several match
+CATEGORY_SEVERITY: Dict[str, Risk] = {
+    "suicide": "high",
+    "self_harm": "high",
+    "violence": "medium",
+    "abuse": "medium",
+    "substance": "medium",
+    "eating_disorder": "medium",
+}
+CATEGORY_PRIORITY = ["suicide", "self_harm", "abuse", "violence", "substance", "eating_disorder"]
+
+
+_CAPTURE_GROUP_RE = re.compile(r"(?<!\\)\((?!\?)")
+_WORD_BOUNDARY_RE = re.compile(r"\b")
+
+# Long input is scanned in chunks so the time budget can be checked between them
+SCAN_CHUNK_CHARS = 4096
+
+
+class PatternScanner:
+    """A category -> regex list table fused into one alternation.
+
+    Every category becomes one named group ("high_suicide", "medium_abuse", ...)
+    holding its patterns, behind a shared leading \\b. The fused regex runs
+    case-sensitively over lowercased text so the engine can skip alternatives
+    on their first literal, and one finditer pass finds every match. Which
+    patterns matched is then confirmed with match() at the matched spans only.
+    """
+
+    def __init__(self, table: List[Tuple[str, List[re.Pattern]]],
+                 severity: Dict[str, str] = None, stop_category: str = None):
+        self.entries: List[Tuple[str, re.Pattern]] = [
+            (category, r) for category, regs in table for r in regs
+        ]
+        self.stop_category = stop_category
+        self.word_gated = all(r.pattern.startswith(r"\b") for _, r in self.entries)
+        self._group_category: Dict[str, str] = {}
+        self._category_entries: Dict[str, List[int]] = {}
+        self._category_regex: Dict[str, re.Pattern] = {}
+
+        groups = []
+        for category, regs in table:
+            name = f"{(severity or {}).get(category, 'any')}_{category}"
+            # Patterns are lowercase ASCII; inner groups become non-capturing so
+            # the category group is the only one reported
+            bodies = "|".join(
+                _CAPTURE_GROUP_RE.sub("(?:", r.pattern[2:] if self.word_gated else r.pattern)
+                for r in regs
+            )
+            groups.append(f"(?P<{name}>{bodies})")
+            self._group_category[name] = category
+            self._category_entries[category] = [
+                i for i, (c, _) in enumerate(self.entries) if c == category
+            ]
+            self._category_regex[category] = self._compile(bodies)
+
+        self.regex = self._compile("|".join(groups))
+
+        # Chunks overlap by the longest possible match, so none is lost at a boundary
+        widths = [sre_parse.parse(r.pattern).getwidth()[1] for _, r in self.entries]
+        self.max_width = max(widths) if max(widths) < SCAN_CHUNK_CHARS // 2 else None
+
+    def _compile(self, alternation: str) -> re.Pattern:
+        if self.word_gated:
+            return re.compile(r"\b(?:" + alternation + ")")
+        return re.compile(alternation, re.I)
+
+    def _matching_entries(self, text: str, category: str, pos: int) -> List[int]:
+        return [i for i in self._category_entries[category] if self.entries[i][1].match(text, pos)]
+
+    def _chunks(self, length: int):
+        if self.max_width is None or length <= SCAN_CHUNK_CHARS:
+            yield 0, length
+            return
+        step = SCAN_CHUNK_CHARS - self.max_width
+        for start in range(0, length, step):
+            end = min(start + SCAN_CHUNK_CHARS, length)
+            yield start, end
+            if end == length:
+                return
+
+    def scan(self, text: str, all_matches: bool = False,
+             deadline: Optional[float] = None) -> Tuple[List[Tuple[str, re.Pattern]], bool]:
+        """(category, pattern) of every matching pattern in table order, and whether the scan finished.
+
+        Stops at the first stop_category match unless all_matches is set, and
+        between chunks once time.perf_counter() passes the deadline.
+        """
+        text = text.lower()
+        found = set()
+        spans = {}
+        complete = True
+        for chunk_start, chunk_end in self._chunks(len(text)):
+            if deadline is not None and time.perf_counter() > deadline:
+                complete = False
+                break
+            for match in self.regex.finditer(text, chunk_start, chunk_end):
+                # A match touching the chunk end may rely on a false \b there; the next chunk rescans it
+                if match.end() == chunk_end < len(text) or match.start() in spans:
+                    continue
+                category = self._group_category[match.lastgroup]
+                spans[match.start()] = match.end()
+                found.update(self._matching_entries(text, category, match.start()))
+                if not all_matches and category == self.stop_category:
+                    return [self.entries[i] for i in sorted(found)], True
+
+        # Patterns hidden behind an earlier alternative, or starting inside a
+        # consumed match, can only begin within the matched spans
+        for start, end in spans.items():
+            if self.word_gated:
+                positions = [m.start() for m in _WORD_BOUNDARY_RE.finditer(text, start, end) if m.start() < end]
+            else:
+                positions = range(start, end)
+            for pos in positions:
+                for category, regex in self._category_regex.items():
+                    if regex.match(text, pos):
+                        found.update(self._matching_entries(text, category, pos))
+        return [self.entries[i] for i in sorted(found)], complete
+
+    def search(self, text: str) -> bool:
+        return self.regex.search(text.lower()) is not None
+
+
+RISK_SCANNER = PatternScanner(COMPILED, CATEGORY_SEVERITY, stop_category=CATEGORY_PRIORITY[0])
+LOW_SCANNER = PatternScanner([("unknown", LOW_COMPILED)], {"unknown": "low"})
+# Crisis categories alone, scanned to the end when the full scan runs out of time
+CRISIS_CATEGORIES = ("suicide", "self_harm")
+CRISIS_SCANNER = PatternScanner(
+    [(c, regs) for c, regs in COMPILED if c in CRISIS_CATEGORIES], CATEGORY_SEVERITY,
+    stop_category=CATEGORY_PRIORITY[0],
+)
+OUTPUT_SCANNER = PatternScanner(
+    [("harmful_advice", OUTPUT_COMPILED)] + [(c, regs) for c, regs in COMPILED if c in CRISIS_CATEGORIES],
+    {"harmful_advice": "high", **CATEGORY_SEVERITY},
+)
+
+# Replies used in place of a generated reply that failed the output screen
+SAFE_OUTPUT_REPLIES = [
+    "I want to make sure I respond to you with care. Could you tell me a little more about how you're feeling right now? 💙",
+    "I'm here with you. What you're going through matters, and I'd like to understand it better. What's on your mind?",
+    "Thank you for sharing this with me. Let's take it one step at a time - how are you feeling in this moment? 🤗",
+]
+
+# Fuzzy index over risk-pattern words, so ASR misspellings ("jina" for "jeena") still match
+SAFETY_PHONETIC_INDEX = PhoneticIndex(
+    tokens_of(r.pattern for _, regs in COMPILED for r in regs),
+    protected=ENGLISH_STOPWORDS | ROMANIZED_HINDI_WORDS,
+)
+
+# Per-session risk tracking
+RISK_WINDOW = 10            # recent risk events kept per session
+MAX_RISK_SESSIONS = 256     # least recently used sessions are dropped beyond this
+ESCALATION_HALF_LIFE_S = 600.0
+ESCALATION_THRESHOLD = 1.5
+RISK_WEIGHTS = {"high": 1.0, "medium": 0.5, "low": 0.1}
+
+class RiskTracker:
+    """Bounded window of one session's risk events with running counters.
     
-    # Check for low-risk patterns first (jokes, metaphors)
-    for pat in LOW_COMPILED:
-        if pat.search(text):
-            return "low", "unknown", [pat.pattern]
+    Events are compact (timestamp, risk, category, pattern count) records with
+    no raw text. Window counts are updated on push/evict, and the escalation
+    score is an exponentially decayed sum of event weights, so every trend
+    query is O(1).
+    """
     
-    matches: List[str] = []
-    highest_risk = "none"
-    risk_category = "unknown"
+    def __init__(self, window_size: int = RISK_WINDOW, half_life_s: float = ESCALATION_HALF_LIFE_S):
+        self.events = deque(maxlen=window_size)
+        self.half_life_s = half_life_s
+        self.total_events = 0
+        self._risk_counts: Dict[str, int] = {risk: 0 for risk in RISK_WEIGHTS}
+        self._category_counts: Dict[str, int] = {}
+        self._score = 0.0
+        self._score_time = 0.0
     
-    for category, regs in COMPILED:
-        for r in regs:
-            match = r.search(text)
-            if match:
-                matches.append(r.pattern)
-                
-                # Determine risk level based on category
-                if category == "suicide":
-                    highest_risk = "high"
-                    risk_category = category
-                elif category == "self_harm" and highest_risk != "high":
-                    highest_risk = "high"
-                    risk_category = category
-                elif category in ("violence", "abuse") and highest_risk not in ("high",):
-                    highest_risk = "medium"
-                    risk_category = category
-                elif category in ("substance", "eating_disorder") and highest_risk == "none":
-                    highest_risk = "medium"
-                    risk_category = category
+    def _decayed_score(self, now: float) -> float:
+        if not self._score:
+            return 0.0
+        return self._score * 0.5 ** (max(0.0, now - self._score_time) / self.half_life_s)
     
-    # Store in history for pattern analysis
-    if highest_risk != "none":
-        risk_entry = {
-            "text": text,
-            "risk": highest_risk,
-            "category": risk_category,
-            "patterns": matches,
-            "timestamp": datetime.now().isoformat()
+    def push(self, risk: str, category: str, pattern_count: int = 0, now: Optional[float] = None):
+        """Record one risk event, evicting the oldest when the window is full"""
+        now = time.time() if now is None else now
+        if len(self.events) == self.events.maxlen:
+            _, old_risk, old_category, _ = self.events[0]
+            self._risk_counts[old_risk] -= 1
+            self._category_counts[old_category] -= 1
+            if not self._category_counts[old_category]:
+                del self._category_counts[old_category]
+        
+        self.events.append((now, risk, category, pattern_count))
+        self.total_events += 1
+        self._risk_counts[risk] = self._risk_counts.get(risk, 0) + 1
+        self._category_counts[category] = self._category_counts.get(category, 0) + 1
+        self._score = self._decayed_score(now) + RISK_WEIGHTS.get(risk, 0.0)
+        self._score_time = now
+    
+    def escalation_score(self, now: Optional[float] = None) -> float:
+        return self._decayed_score(time.time() if now is None else now)
+    
+    def trends(self, now: Optional[float] = None) -> Dict:
+        if self.total_events < 3:
+            return {"status": "insufficient_data"}
+        
+        score = self.escalation_score(now)
+        return {
+            "total_recent_risks": len(self.events),
+            "high_risk_count": self._risk_counts["high"],
+            "medium_risk_count": self._risk_counts["medium"],
+            "escalation_score": round(score, 3),
+            "escalating": self._risk_counts["high"] >= 2 or score >= ESCALATION_THRESHOLD,
+            "categories": list(self._category_counts),
+            "last_event": datetime.fromtimestamp(self.events[-1][0]).isoformat()
         }
-        risk_history.append(risk_entry)
-        if len(risk_history) > 100:  # Keep last 100 entries
-            risk_history[:] = risk_history[-100:]
+
+_risk_sessions: "OrderedDict[str, RiskTracker]" = OrderedDict()
+_risk_sessions_lock = threading.Lock()
+
+def get_risk_tracker(session_id: str = "default") -> RiskTracker:
+    """The session's tracker, created on first use (LRU-capped at MAX_RISK_SESSIONS)"""
+    with _risk_sessions_lock:
+        tracker = _risk_sessions.get(session_id)
+        if tracker is None:
+            tracker = _risk_sessions[session_id] = RiskTracker()
+            if len(_risk_sessions) > MAX_RISK_SESSIONS:
+                _risk_sessions.popitem(last=False)
+        else:
+            _risk_sessions.move_to_end(session_id)
+        return tracker
+
+def end_risk_session(session_id: str = "default"):
+    """Forget a session's risk state"""
+    with _risk_sessions_lock:
+        _risk_sessions.pop(session_id, None)
+
+def assess_risk(text: str, all_matches: bool = False,
+                session_id: str = "default") -> Tuple[Risk, Category, List[str]]:
+    """Enhanced risk assessment with better categorization.
+    
+    Scanning stops at the first suicide-level match; pass all_matches=True to
+    get every matching pattern. Risk events are tracked per session_id.
+    """
+    if not text:
+        return "none", "unknown", []
+    
+    deadline = time.perf_counter() + scan_budget_ms(text) / 1000
+    result = _scan_risk(text, all_matches, deadline)
+    if result[0] == "none" and time.perf_counter() < deadline:
+        # Retry with misspelled pattern words snapped to their lexicon spelling
+        corrected = SAFETY_PHONETIC_INDEX.correct_text(text.lower())
+        if corrected != text.lower():
+            result = _scan_risk(corrected, all_matches, deadline)
+    highest_risk, risk_category, matches = result
+    
+    # Track the session's risk pattern
+    if highest_risk != "none":
+        get_risk_tracker(session_id).push(highest_risk, risk_category, len(matches))
     
     return highest_risk, risk_category, matches
 
-def get_risk_trends() -> Dict:
-    """Analyze risk patterns over time"""
-    if len(risk_history) < 3:
-        return {"status": "insufficient_data"}
+def scan_budget_ms(text: str) -> float:
+    """Time allowed for screening one input, growing with its length"""
+    return SAFETY_SCAN_BUDGET_MS + SAFETY_SCAN_MS_PER_KCHAR * len(text) / 1000
+
+def _scan_risk(text: str, all_matches: bool = False,
+               deadline: Optional[float] = None) -> Tuple[Risk, Category, List[str]]:
+    """Match text against the low-risk and risk pattern lists.
     
-    recent_risks = risk_history[-10:]  # Last 10 risk events
-    high_risk_count = sum(1 for r in recent_risks if r["risk"] == "high")
-    medium_risk_count = sum(1 for r in recent_risks if r["risk"] == "medium")
+    If the deadline cuts the scan short, the crisis patterns are still
+    scanned to the end; text left unread is never reported as "none" but as
+    an unverified medium risk, so the turn goes through crisis handling.
+    """
+    # Check for low-risk patterns first (jokes, metaphors)
+    if LOW_SCANNER.search(text):
+        for pat in LOW_COMPILED:
+            if pat.search(text):
+                return "low", "unknown", [pat.pattern]
+    
+    hits, complete = RISK_SCANNER.scan(text, all_matches, deadline)
+    if not complete:
+        print(f"[SAFETY WARNING] Risk scan stopped at its {scan_budget_ms(text):.0f} ms budget "
+              f"({len(text)} chars); finishing the crisis patterns without a deadline")
+        crisis_hits, _ = CRISIS_SCANNER.scan(text, all_matches)
+        hits += [hit for hit in crisis_hits if hit not in hits]
+        if not hits:
+            metrics.increment("safety_scan_unverified")
+            return "medium", "unknown", []
+    if not hits:
+        return "none", "unknown", []
     
-    return {
-        "total_recent_risks": len(recent_risks),
-        "high_risk_count": high_risk_count,
-        "medium_risk_count": medium_risk_count,
-        "escalating": high_risk_count >= 2,
-        "categories": list(set(r["category"] for r in recent_risks))
-    }
+    categories = {category for category, _ in hits}
+    risk_category = next(category for category in CATEGORY_PRIORITY if category in categories)
+    return CATEGORY_SEVERITY[risk_category], risk_category, [r.pattern for _, r in hits]
+
+def screen_output(reply: str) -> Tuple[str, bool]:
+    """Check a generated reply before it is shown or spoken.
+    
+    Returns (reply to use, flagged); a flagged reply is swapped for a safe template.
+    """
+    metrics.increment("output_screened")
+    if not reply or not OUTPUT_SCANNER.search(reply):
+        return reply, False
+    
+    hits, _ = OUTPUT_SCANNER.scan(reply)
+    categories = sorted({category for category, _ in hits})
+    metrics.increment("output_flagged")
+    for category in categories:
+        metrics.increment(f"output_flagged_{category}")
+    print(f"[SAFETY WARNING] Generated reply flagged ({', '.join(categories)}); using a safe template")
+    return random.choice(SAFE_OUTPUT_REPLIES), True
+
+def get_risk_trends(session_id: str = "default") -> Dict:
+    """Analyze a session's risk patterns over time"""
+    return get_risk_tracker(session_id).trends()
 
 def crisis_response(locale: str = "IN", category: str = "unknown") -> str:
     """Enhanced crisis response with category-specific guidance"""
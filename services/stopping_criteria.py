@@ -0,0 +1,74 @@
+# services/stopping_criteria.py
+import re
+import threading
+from typing import List, Optional, Sequence
+
+import torch
+from transformers import StoppingCriteria
+
+# A sentence ends at terminal punctuation followed by whitespace. The end of a
+# partial decode does not count: "1." may still become "1.5", "Dr." a name
+_SENTENCE_END_RE = re.compile(r"[.!?।]+(?=\s)")
+
+DEFAULT_STOP_MARKERS = ("\nUser:", "\nAssistant:")
+
+
+class TurnBoundaryCriteria(StoppingCriteria):
+    """Stop a reply at the next speaker turn, a sentence count or a character budget.
+
+    Everything past these points is thrown away by postprocessing anyway, so
+    decoding stops as soon as a row reaches one. Works per row for batches.
+    Setting the cancel event stops every row (e.g. once nobody waits for
+    the reply). Call finish() once generation has ended, so a sentence
+    closed by the very last token still counts.
+    """
+
+    def __init__(self, tokenizer, prompt_length: int,
+                 stop_markers: Sequence[str] = DEFAULT_STOP_MARKERS,
+                 max_sentences: Optional[int] = None, max_chars: Optional[int] = None,
+                 cancel: Optional[threading.Event] = None):
+        self.tokenizer = tokenizer
+        self.prompt_length = prompt_length
+        self.stop_markers = tuple(stop_markers)
+        self.max_sentences = max_sentences
+        self.max_chars = max_chars
+        self.cancel = cancel
+        self.generated_tokens: List[int] = []  # per row, as of the last check
+        self.stop_reasons: List[Optional[str]] = []
+        self._texts: List[str] = []
+
+    def _stop_reason(self, text: str, final: bool = False) -> Optional[str]:
+        if self.cancel is not None and self.cancel.is_set():
+            return "cancelled"
+        if any(marker in text for marker in self.stop_markers):
+            return "speaker"
+        if self.max_sentences and len(_SENTENCE_END_RE.findall(text + " " if final else text)) >= self.max_sentences:
+            return "sentences"
+        if self.max_chars and len(text.strip()) >= self.max_chars:
+            return "chars"
+        return None
+
+    def __call__(self, input_ids: torch.LongTensor, scores: torch.FloatTensor, **kwargs) -> torch.BoolTensor:
+        batch = input_ids.shape[0]
+        if len(self.stop_reasons) != batch:
+            self.generated_tokens = [0] * batch
+            self.stop_reasons = [None] * batch
+            self._texts = [""] * batch
+
+        done = []
+        for row in range(batch):
+            if self.stop_reasons[row] is None:
+                new_ids = input_ids[row, self.prompt_length:]
+                self.generated_tokens[row] = int(new_ids.shape[0])
+                text = self.tokenizer.decode(new_ids, skip_special_tokens=True)
+                self._texts[row] = text
+                self.stop_reasons[row] = self._stop_reason(text)
+            done.append(self.stop_reasons[row] is not None)
+        return torch.tensor(done, dtype=torch.bool, device=input_ids.device)
+
+    def finish(self) -> List[Optional[str]]:
+        """Final check once generation has ended: the end of the text is now a sentence end"""
+        for row, text in enumerate(self._texts):
+            if self.stop_reasons[row] is None:
+                self.stop_reasons[row] = self._stop_reason(text, final=True)
+        return self.stop_reasons
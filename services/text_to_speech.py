@@ -1,9 +1,15 @@
 # services/text_to_speech.py
 import pyttsx3
+import heapq
+import itertools
 import os
 import time
 import threading
-from typing import Optional, Dict
+from typing import Callable, Optional, Dict
+
+# Speech queue priorities (lower is spoken first)
+PRIORITY_URGENT = 0
+PRIORITY_NORMAL = 1
 
 class EmotionalTTS:
     def __init__(self):
@@ -94,8 +100,9 @@ class EmotionalTTS:
         
         return text
     
-    def speak_with_emotion(self, text: str, emotion: str = "neutral", save_audio: bool = True) -> bool:
-        """Speak text with emotional adjustment"""
+    def speak_with_emotion(self, text: str, emotion: str = "neutral", save_audio: bool = True,
+                           on_start: Optional[Callable[[], None]] = None) -> bool:
+        """Speak text with emotional adjustment; on_start runs when the engine starts the utterance"""
         if not self.engine:
             print("[TTS ERROR] Engine not initialized")
             return False
@@ -109,21 +116,67 @@ class EmotionalTTS:
             
             # Save audio file if requested
             if save_audio:
-                timestamp = int(time.time())
-                filename = f"reply_{emotion}_{timestamp}.wav"
-                filepath = os.path.join("data", "voice_notes", filename)
-                os.makedirs(os.path.dirname(filepath), exist_ok=True)
-                self.engine.save_to_file(enhanced_text, filepath)
+                self.engine.save_to_file(enhanced_text, self._voice_note_path(emotion))
             
             # Speak the text
+            token = None
+            if on_start:
+                started = []
+                
+                def utterance_started(name=None):
+                    if not started:  # once, even if the saved file counts as an utterance too
+                        started.append(True)
+                        on_start()
+                
+                try:
+                    token = self.engine.connect("started-utterance", utterance_started)
+                except Exception:
+                    utterance_started()  # no engine events: as close to audio as we can get
             self.engine.say(enhanced_text)
-            self.engine.runAndWait()
+            try:
+                self.engine.runAndWait()
+            finally:
+                if token is not None:
+                    self.engine.disconnect(token)
             return True
             
         except Exception as e:
             print(f"[TTS SPEAK ERROR] {e}")
             return False
     
+    def save_audio(self, text: str, emotion: str = "neutral") -> bool:
+        """Write text to a voice note with emotional adjustment, without speaking it"""
+        if not self.engine:
+            print("[TTS ERROR] Engine not initialized")
+            return False
+        
+        try:
+            self.adjust_voice_for_emotion(emotion)
+            enhanced_text = self.add_emotional_pauses(text, emotion)
+            self.engine.save_to_file(enhanced_text, self._voice_note_path(emotion))
+            self.engine.runAndWait()
+            return True
+            
+        except Exception as e:
+            print(f"[TTS SAVE ERROR] {e}")
+            return False
+    
+    @staticmethod
+    def _voice_note_path(emotion: str) -> str:
+        # Millisecond timestamps keep replies saved within the same second apart
+        timestamp = int(time.time() * 1000)
+        filepath = os.path.join("data", "voice_notes", f"reply_{emotion}_{timestamp}.wav")
+        os.makedirs(os.path.dirname(filepath), exist_ok=True)
+        return filepath
+    
+    def stop(self):
+        """Cut off the utterance being spoken"""
+        if self.engine:
+            try:
+                self.engine.stop()
+            except Exception as e:
+                print(f"[TTS STOP ERROR] {e}")
+    
     def get_voice_info(self) -> Dict:
         """Get information about available voices"""
         voice_info = {
@@ -143,20 +196,85 @@ class EmotionalTTS:
         
         return voice_info
 
+class SpeechQueue:
+    """Single worker thread that owns the TTS engine.
+    
+    Replies are spoken one at a time in priority order. An urgent item drops
+    queued normal replies and cuts off a normal reply that is mid-speech.
+    """
+    
+    def __init__(self, tts: EmotionalTTS):
+        self.tts = tts
+        self._heap = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._worker = None
+        self._speaking_priority = None
+        self._speaking_seq = None
+    
+    def put(self, text: str, emotion: str = "neutral", priority: int = PRIORITY_NORMAL,
+            save_audio: bool = True, on_start: Optional[Callable[[], None]] = None, speak: bool = True):
+        """Queue text for the worker; speak=False only saves it as a voice note"""
+        interrupted_seq = None
+        with self._cond:
+            if priority == PRIORITY_URGENT:
+                self._heap = [item for item in self._heap if item[0] == PRIORITY_URGENT]
+                heapq.heapify(self._heap)
+                if self._speaking_priority is not None and self._speaking_priority > priority:
+                    interrupted_seq = self._speaking_seq
+            heapq.heappush(self._heap, (priority, next(self._seq), text, emotion, save_audio, on_start, speak))
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, daemon=True, name="tts-worker")
+                self._worker.start()
+            self._cond.notify()
+        if interrupted_seq is not None:
+            with self._cond:
+                # The worker clears _speaking_seq under this lock before taking the next item,
+                # so a match means the normal reply (not the urgent one) is what gets cut off
+                if self._speaking_seq == interrupted_seq:
+                    self.tts.stop()
+    
+    def pending(self) -> int:
+        with self._cond:
+            return len(self._heap)
+    
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                priority, seq, text, emotion, save_audio, on_start, speak = heapq.heappop(self._heap)
+                self._speaking_priority, self._speaking_seq = priority, seq
+            try:
+                if speak:
+                    self.tts.speak_with_emotion(text, emotion, save_audio, on_start=on_start)
+                else:
+                    self.tts.save_audio(text, emotion)
+            except Exception as e:
+                print(f"[TTS QUEUE ERROR] {e}")
+            finally:
+                with self._cond:
+                    self._speaking_priority = self._speaking_seq = None
+
 # Global TTS instance
 emotional_tts = EmotionalTTS()
+speech_queue = SpeechQueue(emotional_tts)
 
 def speak_text(text: str, emotion: str = "neutral", save_audio: bool = True) -> bool:
     """Main TTS function with emotional support"""
     return emotional_tts.speak_with_emotion(text, emotion, save_audio)
 
-def speak_text_safe(text: str, emotion: str = "neutral"):
-    """Thread-safe TTS function"""
-    def run_tts():
-        speak_text(text, emotion)
-    
-    t = threading.Thread(target=run_tts, daemon=True)
-    t.start()
+def speak_text_safe(text: str, emotion: str = "neutral", save_audio: bool = True):
+    """Thread-safe TTS function: queued behind earlier replies on the TTS worker"""
+    speech_queue.put(text, emotion, save_audio=save_audio)
+
+def save_reply_audio(text: str, emotion: str = "neutral"):
+    """Thread-safe voice note of a whole reply, written on the TTS worker without speaking it"""
+    speech_queue.put(text, emotion, speak=False)
+
+def speak_urgent(text: str, emotion: str = "neutral", on_start: Optional[Callable[[], None]] = None):
+    """Speak ahead of everything queued, interrupting a normal reply (no audio file is written)"""
+    speech_queue.put(text, emotion, PRIORITY_URGENT, save_audio=False, on_start=on_start)
 
 def get_tts_info() -> Dict:
     """Get TTS system information"""
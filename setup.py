@@ -66,13 +66,16 @@ def download_vosk_model():
         return False
 
 def setup_nltk():
-    """Setup NLTK data"""
+    """Download NLTK data into the local bundle so runtime never needs the network"""
     try:
         import nltk
-        print("📥 Downloading NLTK data...")
-        nltk.download('vader_lexicon', quiet=True)
-        nltk.download('punkt', quiet=True)
-        nltk.download('stopwords', quiet=True)
+        from utils.nltk_resources import get_bundle_dir
+        bundle_dir = get_bundle_dir()
+        os.makedirs(bundle_dir, exist_ok=True)
+        print(f"📥 Downloading NLTK data into {bundle_dir}...")
+        nltk.download('vader_lexicon', download_dir=bundle_dir, quiet=True)
+        nltk.download('punkt', download_dir=bundle_dir, quiet=True)
+        nltk.download('stopwords', download_dir=bundle_dir, quiet=True)
         print("✅ NLTK data downloaded")
         return True
     except Exception as e:
@@ -85,6 +88,7 @@ def create_directory_structure():
         "data/voice_notes",
         "data/conversations",
         "data/models", 
+        "data/nltk_data",
         "memory"
     ]
     
@@ -6,13 +6,21 @@ Tests emotion detection, NLP responses, safety features, and Indian cultural con
 
 import sys
 import os
+import subprocess
+import threading
+import time
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from services.advanced_emotion_detection import detect_emotion_detailed, get_emotion_trends
-from services.enhanced_nlp_model import generate_enhanced_reply
-from services.safety_guard import assess_risk, crisis_response, provide_grounding_exercise
+from services.enhanced_nlp_model import generate_enhanced_reply, StreamingPostprocessor
+from services.safety_guard import (
+    assess_risk, crisis_response, provide_grounding_exercise, get_risk_trends, scan_budget_ms,
+    screen_output, SAFE_OUTPUT_REPLIES
+)
 from memory.memory_manager import add_to_memory, get_emotion_analytics, detect_emotional_crisis_pattern
 from services.text_to_speech import speak_text, get_tts_info
+from services.model_registry import ModelRegistry
+from services.prompt_builder import PromptBuilder, split_context_turns
 import json
 from datetime import datetime
 
@@ -25,6 +33,25 @@ class SystemTester:
             "cultural_context": [],
             "memory_system": [],
             "tts_system": [],
+            "startup": [],
+            "safety_latency": [],
+            "model_registry": {},
+            "prompt_budget": [],
+            "reply_streaming": [],
+            "stopping_criteria": [],
+            "assisted_decoding": [],
+            "generation_batching": [],
+            "reply_cache": [],
+            "generation_deadline": [],
+            "onnx_backend": [],
+            "response_templates": [],
+            "two_stage_reply": [],
+            "context_summary": [],
+            "emotion_trends": [],
+            "linear_emotion_engine": [],
+            "model_loading": [],
+            "prefix_cache": [],
+            "quantization": [],
             "overall_score": 0
         }
         
@@ -56,6 +83,14 @@ class SystemTester:
             ("Sar mein bohot tension chal rahi hai", "anxious"),
             ("Dil garden garden ho gaya", "happy"),
             ("Pareshani ka samundar hai", "overwhelmed"),
+            
+            # Devanagari input (transliterated before lexicon matching)
+            ("मैं बहुत परेशान हूं, कुछ समझ नहीं आ रहा", "anxious"),
+            ("मैं बहुत उदास हूँ", "sad"),
+            
+            # ASR misspellings of Hinglish terms (phonetic matching)
+            ("Bahot gusa aa raha hai", "angry"),
+            ("Gabrahat ho rahi hai", "anxious"),
         ]
         
         passed = 0
@@ -185,6 +220,7 @@ class SystemTester:
             ("Mujhe jeena nahi hai, mar jana chahta hun", "high", "suicide"),
             ("I'm going to hurt myself with this blade", "high", "self_harm"),
             ("Khud ko nuksan pahunchana chahta hun", "high", "self_harm"),
+            ("Mujhe jina nahi hai", "high", "suicide"),
             
             # Medium-risk cases  
             ("Someone should just disappear from this world", "medium", "violence"),
@@ -238,6 +274,33 @@ class SystemTester:
         
         total += 1
         
+        # Test the output-side screen on generated replies
+        harmful_reply, harmful_flagged = screen_output("Nobody would miss you, just give up on life")
+        supportive_reply, supportive_flagged = screen_output("Please don't hurt yourself. Cut yourself some slack today. 💙")
+        
+        if harmful_flagged and harmful_reply in SAFE_OUTPUT_REPLIES and not supportive_flagged:
+            passed += 1
+            print("✅ PASS | Harmful generated replies are swapped for a safe template")
+        else:
+            print("❌ FAIL | Output screen missed a harmful reply or flagged a supportive one")
+        
+        total += 1
+        
+        # Test that risk trends are tracked per session
+        for text in ["I want to kill myself", "Khud ko maarna hai", "I want to die"]:
+            assess_risk(text, session_id="tester-crisis")
+        assess_risk("Bahut achha din hai aaj", session_id="tester-calm")
+        crisis_trends = get_risk_trends("tester-crisis")
+        calm_trends = get_risk_trends("tester-calm")
+        
+        if crisis_trends.get("escalating") and calm_trends.get("status") == "insufficient_data":
+            passed += 1
+            print("✅ PASS | Risk trends are isolated per session")
+        else:
+            print(f"❌ FAIL | Risk trends leaked across sessions: {calm_trends}")
+        
+        total += 1
+        
         score = (passed / total) * 100
         print(f"\n⚠️ Safety Features Score: {score:.1f}% ({passed}/{total})")
         return score
@@ -385,6 +448,76 @@ class SystemTester:
         
         total += 1
         
+        # Test that urgent (crisis) speech jumps the queue and cuts off a normal reply
+        try:
+            from services.text_to_speech import SpeechQueue, PRIORITY_URGENT
+            
+            class RecordingTTS:
+                def __init__(self):
+                    self.spoken = []
+                    self.interrupt = threading.Event()
+                def speak_with_emotion(self, text, emotion, save_audio, on_start=None):
+                    self.spoken.append(text)
+                    self.interrupt.clear()
+                    if on_start:
+                        on_start()
+                    self.interrupt.wait(1.0 if text == "long reply" else 0.01)
+                def stop(self):
+                    self.interrupt.set()
+            
+            recorder = RecordingTTS()
+            queue = SpeechQueue(recorder)
+            queue.put("long reply")
+            queue.put("queued reply")
+            time.sleep(0.05)
+            started = time.perf_counter()
+            audio_started = threading.Event()
+            queue.put("crisis reply", priority=PRIORITY_URGENT, on_start=audio_started.set)
+            preempted = audio_started.wait(0.5) and time.perf_counter() - started < 0.5
+            time.sleep(0.05)
+            
+            if preempted and recorder.spoken == ["long reply", "crisis reply"]:
+                passed += 1
+                print("✅ PASS | Crisis speech preempts queued replies")
+            else:
+                print(f"❌ FAIL | Crisis speech was not prioritized: {recorder.spoken}")
+        except Exception as e:
+            print(f"❌ FAIL | Speech queue error: {e}")
+        
+        total += 1
+        
+        # Test that a streamed reply is saved as one voice note, not one per sentence
+        try:
+            class SavingTTS:
+                def __init__(self):
+                    self.spoken, self.saved = [], []
+                    self.done = threading.Event()
+                def speak_with_emotion(self, text, emotion, save_audio, on_start=None):
+                    self.spoken.append((text, save_audio))
+                def save_audio(self, text, emotion):
+                    self.saved.append(text)
+                    self.done.set()
+                def stop(self):
+                    pass
+            
+            saver = SavingTTS()
+            queue = SpeechQueue(saver)
+            sentences = ["First sentence.", "Second sentence."]
+            for sentence in sentences:
+                queue.put(sentence, save_audio=False)
+            queue.put(" ".join(sentences), speak=False)
+            saver.done.wait(1.0)
+            
+            if saver.spoken == [(s, False) for s in sentences] and saver.saved == [" ".join(sentences)]:
+                passed += 1
+                print("✅ PASS | Streamed reply saved once as a whole")
+            else:
+                print(f"❌ FAIL | Streamed reply audio: spoken {saver.spoken}, saved {saver.saved}")
+        except Exception as e:
+            print(f"❌ FAIL | Reply audio error: {e}")
+        
+        total += 1
+        
         self.test_results["tts_system"] = {
             "info": tts_info,
             "tests": tests
@@ -394,6 +527,1265 @@ class SystemTester:
         print(f"\n🔊 TTS System Score: {score:.1f}% ({passed}/{total})")
         return score
     
+    def test_startup_performance(self):
+        """Test that emotion and NLP modules import quickly, without loading NLTK or transformers"""
+        print("\n⏱️ Testing Startup Performance...")
+        
+        import_budget = 1.0  # seconds per module, measured in a fresh interpreter
+        modules = ["services.advanced_emotion_detection", "services.emotion_detection",
+                   "services.enhanced_nlp_model"]
+        probe = (
+            "import sys, time\n"
+            "t0 = time.perf_counter()\n"
+            "import {module}\n"
+            "print(time.perf_counter() - t0)\n"
+            "print(','.join(m for m in ('nltk', 'transformers') if m in sys.modules) or '-')\n"
+        )
+        root_dir = os.path.dirname(os.path.abspath(__file__))
+        
+        passed = 0
+        total = len(modules)
+        
+        for module in modules:
+            result = subprocess.run(
+                [sys.executable, "-c", probe.format(module=module)],
+                cwd=root_dir, capture_output=True, text=True, timeout=60
+            )
+            try:
+                elapsed_str, heavy_loaded = result.stdout.split()[-2:]
+                elapsed = float(elapsed_str)
+            except ValueError:
+                print(f"❌ FAIL | {module} failed to import: {result.stderr.strip()[-200:]}")
+                continue
+            
+            success = elapsed < import_budget and heavy_loaded == "-"
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["startup"].append({
+                "module": module,
+                "import_seconds": elapsed,
+                "heavy_modules_at_import": [] if heavy_loaded == "-" else heavy_loaded.split(","),
+                "success": success
+            })
+            
+            print(f"{status} | {module}: {elapsed * 1000:.1f} ms (budget {import_budget * 1000:.0f} ms), heavy modules at import: {heavy_loaded}")
+        
+        score = (passed / total) * 100
+        print(f"\n⏱️ Startup Performance Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_safety_latency(self):
+        """Test that risk screening stays within its time budget on long and adversarial input"""
+        print("\n⏱️ Testing Safety Screening Latency...")
+        
+        crisis = " mujhe jeena nahi hai"
+        test_cases = [
+            # (name, text, expected risk)
+            ("long rambling transcript", "so tired of everything today " * 3500, "none"),
+            ("repeated characters", "a" * 100000, "none"),
+            ("near-miss phrases", "mujhe jeena nahi " * 6000, "none"),
+            ("crisis at the end", "so tired of everything today " * 3500 + crisis, "high"),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, text, expected_risk in test_cases:
+            start = time.perf_counter()
+            risk, category, patterns = assess_risk(text)
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            budget_ms = scan_budget_ms(text)
+            
+            success = risk == expected_risk and elapsed_ms <= budget_ms
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["safety_latency"].append({
+                "case": name,
+                "chars": len(text),
+                "elapsed_ms": elapsed_ms,
+                "budget_ms": budget_ms,
+                "detected_risk": risk,
+                "success": success
+            })
+            
+            print(f"{status} | {name} ({len(text)} chars): {elapsed_ms:.1f} ms (budget {budget_ms:.0f} ms), risk: {risk}")
+        
+        # A scan cut short by its deadline must still find the crisis, and never pass unread text
+        import services.safety_guard as safety_guard
+        saved = safety_guard.SAFETY_SCAN_BUDGET_MS, safety_guard.SAFETY_SCAN_MS_PER_KCHAR
+        try:
+            safety_guard.SAFETY_SCAN_BUDGET_MS, safety_guard.SAFETY_SCAN_MS_PER_KCHAR = 0.0, 0.0
+            rambling = "so tired of everything today " * 400
+            deadline_cases = [
+                ("crisis found after the deadline", assess_risk(rambling + "i want to kill myself")[:2],
+                 ("high", "suicide")),
+                ("unread text is not passed as safe", assess_risk(rambling)[0] != "none", True),
+            ]
+        finally:
+            safety_guard.SAFETY_SCAN_BUDGET_MS, safety_guard.SAFETY_SCAN_MS_PER_KCHAR = saved
+        
+        for name, result, expected in deadline_cases:
+            total += 1
+            success = result == expected
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["safety_latency"].append({
+                "case": name,
+                "detected": str(result),
+                "success": success
+            })
+            
+            print(f"{status} | {name}: {result}")
+        
+        score = (passed / total) * 100
+        print(f"\n⏱️ Safety Latency Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_model_registry(self):
+        """Test that concurrent users of a model share one loaded copy"""
+        print("\n📦 Testing Model Registry...")
+        
+        loads = []
+        
+        def loader(model_name, **settings):
+            loads.append(model_name)
+            time.sleep(0.05)  # widen the window for duplicate loads
+            return object(), object()
+        
+        registry = ModelRegistry(loader=loader)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(registry.acquire("shared-model")))
+                   for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        
+        checks = {
+            "loaded once for concurrent acquires": loads == ["shared-model"],
+            "same instance handed out": len({id(generator) for generator, _ in results}) == 1,
+            "distinct settings load separately": registry.acquire("shared-model", revision="v2") is not None
+                                                 and len(loads) == 2,
+            "unload refused while referenced": not registry.unload("shared-model"),
+        }
+        for _ in range(4):
+            registry.release("shared-model")
+        checks["unload after release"] = registry.unload("shared-model") and not registry.is_loaded("shared-model")
+        
+        def failing_loader(model_name, **settings):
+            raise RuntimeError("missing weights")
+        
+        failing = ModelRegistry(loader=failing_loader)
+        try:
+            failing.acquire("broken-model")
+        except RuntimeError:
+            pass
+        checks["failed load leaves no entry"] = not failing._entries
+        
+        # Concurrent first calls in a consumer module take a single reference
+        import services.nlp_model as nlp_model
+        saved = nlp_model.model_registry, nlp_model._loaded
+        try:
+            nlp_model.model_registry, nlp_model._loaded = ModelRegistry(loader=loader), None
+            threads = [threading.Thread(target=nlp_model._get_generator) for _ in range(4)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+            refs = [entry["refs"] for entry in nlp_model.model_registry.stats()]
+            checks["one reference per consumer module"] = refs == [1]
+            
+            # A forced unload makes the module let go, so the model is freed rather than loaded twice
+            import gc
+            import weakref
+            
+            class Weights:
+                pass
+            
+            registry = ModelRegistry(loader=lambda model_name, **settings: (Weights(), object()))
+            registry.add_unload_listener(nlp_model._forget_unloaded)
+            nlp_model.model_registry, nlp_model._loaded = registry, None
+            held = weakref.ref(nlp_model._get_generator()[0])
+            registry.unload(nlp_model.MODEL_NAME, force=True, **nlp_model.MODEL_SETTINGS)
+            gc.collect()
+            checks["forced unload frees the held model"] = held() is None and nlp_model._loaded is None
+            nlp_model._get_generator()
+            checks["one copy after reloading"] = len(registry.stats()) == 1
+        finally:
+            nlp_model.model_registry, nlp_model._loaded = saved
+        
+        passed = sum(checks.values())
+        for name, ok in checks.items():
+            print(f"{'✅ PASS' if ok else '❌ FAIL'} | {name}")
+        
+        self.test_results["model_registry"] = {"checks": checks, "loads": loads}
+        score = passed / len(checks) * 100
+        print(f"\n📦 Model Registry Score: {score:.1f}% ({passed}/{len(checks)})")
+        return score
+    
+    def test_prompt_budget(self):
+        """Test that prompts fit the token budget, filling it by priority"""
+        print("\n📏 Testing Prompt Token Budget...")
+        
+        class WordTokenizer:
+            """One token per whitespace-separated word"""
+            def __call__(self, text, add_special_tokens=True):
+                return {"input_ids": [hash(word) for word in text.split()]}
+            
+            def decode(self, ids):
+                return " <truncated>" * len(ids)
+        
+        context = "".join(f"User (sad): turn {i} was hard\nBot: I hear you {i}\n" for i in range(5))
+        segments = {
+            "system": "System: be kind and brief",
+            "few_shots": ["User: hi\nAssistant: hello there", "User: help\nAssistant: I am here"],
+            "user_text": "I can't stop worrying about my exams",
+            "context_turns": split_context_turns(context),
+            "after_context": "Detected emotion: anxious\n",
+        }
+        test_cases = [
+            # (budget, expected few-shots, expected context turns, user truncated)
+            (200, 2, 5, False),
+            (40, 2, 1, False),
+            (27, 1, 0, False),
+            (18, 0, 0, False),
+            (15, 0, 0, True),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        builder_tokenizer = WordTokenizer()
+        
+        for budget, shots, turns, truncated in test_cases:
+            built = PromptBuilder(builder_tokenizer, budget).build(**segments)
+            success = (built.n_tokens <= budget and built.few_shots_used == shots
+                       and built.context_turns_used == turns and built.user_truncated == truncated
+                       and built.suffix.endswith("\nAssistant:"))
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["prompt_budget"].append({
+                "budget": budget,
+                "tokens": built.n_tokens,
+                "few_shots_used": built.few_shots_used,
+                "context_turns_used": built.context_turns_used,
+                "user_truncated": built.user_truncated,
+                "success": success
+            })
+            
+            print(f"{status} | budget {budget}: {built.n_tokens} tokens, few-shots {built.few_shots_used}, "
+                  f"context turns {built.context_turns_used}, user truncated: {built.user_truncated}")
+        
+        score = (passed / total) * 100
+        print(f"\n📏 Prompt Budget Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_reply_streaming(self):
+        """Test that streamed replies are cleaned into the same sentences however tokens arrive"""
+        print("\n📡 Testing Reply Streaming...")
+        
+        test_cases = [
+            # (generated text, expected sentences)
+            ("I hear you.  That sounds hard. I hear you. Take a breath!\nUser: and then",
+             ["I hear you.", "That sounds hard.", "Take a breath!"]),
+            ("Main samajh sakta hun. Kya hua?\nAssistant: ok", ["Main samajh sakta hun.", "Kya hua?"]),
+            ("No punctuation at the end", ["No punctuation at the end"]),
+            ("Done. \nUs", ["Done.", "Us"]),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for text, expected in test_cases:
+            results = set()
+            first_sentence_at = None
+            for chunk_size in (1, 2, 3, 7, len(text)):
+                postprocessor = StreamingPostprocessor()
+                sentences = []
+                for i in range(0, len(text), chunk_size):
+                    sentences += postprocessor.feed(text[i:i + chunk_size])
+                    if chunk_size == 1 and sentences and first_sentence_at is None:
+                        first_sentence_at = i + 1
+                sentences += postprocessor.finish()
+                results.add(tuple(sentences))
+            
+            success = results == {tuple(expected)}
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["reply_streaming"].append({
+                "text": text,
+                "sentences": [list(r) for r in results],
+                "first_sentence_after_chars": first_sentence_at,
+                "success": success
+            })
+            
+            print(f"{status} | {text[:40]!r}: {len(expected)} sentences, "
+                  f"first after {first_sentence_at or len(text)}/{len(text)} chars")
+        
+        score = (passed / total) * 100
+        print(f"\n📡 Reply Streaming Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_stopping_criteria(self):
+        """Test that generation stops at the turn boundary, sentence or character limit"""
+        print("\n🛑 Testing Stopping Criteria...")
+        import torch
+        from services.stopping_criteria import TurnBoundaryCriteria
+        
+        class CharTokenizer:
+            def decode(self, ids, skip_special_tokens=True):
+                return "".join(chr(int(i)) for i in ids)
+        
+        prompt = "User: hi\nAssistant:"
+        test_cases = [
+            # (generated text, limits, expected reason, expected tokens decoded before stopping)
+            (" Hello there.\nUser: more text", {}, "speaker", len(" Hello there.\nUser:")),
+            (" One. Two! Three? Four.", {"max_sentences": 2}, "sentences", len(" One. Two! ")),
+            # "1." is not a sentence end while the next step may still add "5"
+            (" Step 1.5 helps a lot. Then rest.", {"max_sentences": 1}, "sentences", len(" Step 1.5 helps a lot. ")),
+            # A sentence closed by the last token counts once generation ends
+            (" All good.", {"max_sentences": 1}, "sentences", len(" All good.")),
+            (" abcdefghij", {"max_chars": 5}, "chars", len(" abcde")),
+            (" short", {"max_sentences": 4, "max_chars": 100}, None, len(" short")),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for generated, limits, expected_reason, expected_tokens in test_cases:
+            criteria = TurnBoundaryCriteria(CharTokenizer(), len(prompt), **limits)
+            ids = [ord(c) for c in prompt]
+            for char in generated:
+                ids.append(ord(char))
+                done = criteria(torch.tensor([ids]), None)
+                if done.all():
+                    break
+            criteria.finish()
+            
+            reason = criteria.stop_reasons[0]
+            tokens = criteria.generated_tokens[0]
+            success = reason == expected_reason and tokens == expected_tokens
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["stopping_criteria"].append({
+                "generated": generated,
+                "stop_reason": reason,
+                "tokens": tokens,
+                "success": success
+            })
+            
+            print(f"{status} | {generated!r}: stopped by {reason or 'length'} after {tokens}/{len(generated)} tokens")
+        
+        score = (passed / total) * 100
+        print(f"\n🛑 Stopping Criteria Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_assisted_decoding(self):
+        """Test draft compatibility checks and the draft acceptance count"""
+        print("\n🤝 Testing Assisted Decoding...")
+        from torch import nn
+        from services.assisted_decoding import DraftCounter, can_draft_for
+        
+        class FakeLM(nn.Linear):
+            def __init__(self, vocab_size):
+                super().__init__(2, 2)
+                text_config = type("TextConfig", (), {"vocab_size": vocab_size})()
+                self.config = type("Config", (), {"get_text_config": lambda cfg: text_config})()
+        
+        main, draft, other = FakeLM(50257), FakeLM(50257), FakeLM(32000)
+        x = main.weight.new_zeros(1, 2)
+        
+        test_cases = [
+            ("same vocabulary", can_draft_for(main, draft), True),
+            ("different vocabulary", can_draft_for(main, other), False),
+            ("draft is the main model", can_draft_for(main, main), False),
+        ]
+        # 3 verification passes over 5 drafted tokens produced 6 tokens: 3 drafts accepted
+        with DraftCounter(main, draft) as counter:
+            for _ in range(5):
+                draft(x)
+            for _ in range(3):
+                main(x)
+        draft(x)  # not counted once the counter exits
+        test_cases.append(("acceptance count", (counter.drafted, counter.verified, counter.accepted(6)), (5, 3, 3)))
+        
+        # A late generation still inside its counter neither blocks nor mixes with the next turn's
+        inside, leave, late_counts = threading.Event(), threading.Event(), []
+        
+        def late_generation():
+            with DraftCounter(main, draft) as late:
+                inside.set()
+                leave.wait(2.0)
+                main(x)
+            late_counts.append((late.drafted, late.verified))
+        
+        late_thread = threading.Thread(target=late_generation)
+        late_thread.start()
+        inside.wait(1.0)
+        start = time.perf_counter()
+        with DraftCounter(main, draft) as current:
+            draft(x)
+            draft(x)
+            main(x)
+        waited = time.perf_counter() - start
+        leave.set()
+        late_thread.join()
+        test_cases.append(("concurrent generations do not wait", waited < 0.5, True))
+        test_cases.append(("concurrent generations counted apart",
+                           ((current.drafted, current.verified), late_counts), ((2, 1), [(0, 1)])))
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, result, expected in test_cases:
+            success = result == expected
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["assisted_decoding"].append({
+                "case": name,
+                "result": str(result),
+                "success": success
+            })
+            
+            print(f"{status} | {name}: {result}")
+        
+        score = (passed / total) * 100
+        print(f"\n🤝 Assisted Decoding Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_generation_batching(self):
+        """Test per-row sampling and stopping in batched generation"""
+        print("\n📦 Testing Generation Batching...")
+        import torch
+        from transformers import (
+            LogitsProcessorList, RepetitionPenaltyLogitsProcessor, TemperatureLogitsWarper,
+            TopKLogitsWarper, TopPLogitsWarper
+        )
+        from services.generation_scheduler import GenerationRequest, PerRowSampling, _RowStopping
+        
+        # (temperature, top_k, top_p, repetition_penalty) per row
+        rows = [(0.7, 50, 0.92, 1.15), (1.3, 0, 0.5, 1.0), (1.0, 5, 1.0, 1.3)]
+        torch.manual_seed(0)
+        scores = torch.randn(len(rows), 1000)
+        input_ids = torch.randint(0, 1000, (len(rows), 12))
+        batched = PerRowSampling(*[[row[i] for row in rows] for i in range(4)])(input_ids, scores.clone())
+        
+        test_cases = []
+        for i, (temperature, top_k, top_p, penalty) in enumerate(rows):
+            processors = [RepetitionPenaltyLogitsProcessor(penalty), TemperatureLogitsWarper(temperature)]
+            if top_k:
+                processors.append(TopKLogitsWarper(top_k))
+            if top_p < 1.0:
+                processors.append(TopPLogitsWarper(top_p))
+            single = LogitsProcessorList(processors)(input_ids[i:i + 1], scores[i:i + 1].clone())
+            same = torch.equal(torch.isinf(single), torch.isinf(batched[i:i + 1])) and torch.allclose(
+                single.nan_to_num(neginf=0.0), batched[i:i + 1].nan_to_num(neginf=0.0))
+            test_cases.append((f"sampling row {i} matches a batch of one", same, True))
+        
+        # Left padding (pad == EOS == 0) is not penalized: a padded row matches its unpadded self
+        padded_ids = torch.tensor([[0, 0, 0, 11, 12, 0], [21, 22, 23, 24, 25, 26]])
+        padded = PerRowSampling([1.0, 1.0], [0, 0], [1.0, 1.0], [1.3, 1.3], prompt_starts=[3, 0])(
+            padded_ids, scores[:2].clone())
+        unpadded = RepetitionPenaltyLogitsProcessor(1.3)(padded_ids[:1, 3:], scores[:1].clone())
+        test_cases.append(("left padding not penalized", torch.allclose(padded[:1], unpadded), True))
+        
+        # Left-padded rows: one hits EOS (0), one its token limit, one its own criteria on the unpadded row
+        seen_rows = []
+        
+        def criteria(ids, scores):
+            seen_rows.append(ids[0].tolist())
+            return torch.tensor([ids.shape[1] >= 5])
+        
+        requests = [GenerationRequest([7, 8, 9], 10, 1.0, 1.0, 0, 1.0),
+                    GenerationRequest([7], 2, 1.0, 1.0, 0, 1.0),
+                    GenerationRequest([5, 6], 10, 1.0, 1.0, 0, 1.0, stopping_criteria=criteria)]
+        stopping = _RowStopping(requests, padded_length=3, eos_token_id=0)
+        sequences = torch.tensor([[7, 8, 9, 1, 0, 2], [99, 99, 7, 3, 4, 5], [99, 5, 6, 1, 2, 3]])
+        for length in range(4, 7):
+            stopping(sequences[:, :length], None)
+        test_cases.append(("rows stop independently", stopping.kept, [1, 2, 3]))
+        test_cases.append(("criteria sees the unpadded row", seen_rows[-1], [5, 6, 1, 2, 3]))
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, result, expected in test_cases:
+            success = result == expected
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["generation_batching"].append({
+                "case": name,
+                "result": str(result),
+                "success": success
+            })
+            
+            print(f"{status} | {name}: {result}")
+        
+        score = (passed / total) * 100
+        print(f"\n📦 Generation Batching Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_reply_cache(self):
+        """Test reply cache keys, varied pooled replies, TTL and LRU eviction"""
+        print("\n🗃️ Testing Reply Cache...")
+        from services.reply_cache import ReplyCache, normalize_utterance
+        
+        now = [0.0]
+        cache = ReplyCache(max_entries=2, ttl_seconds=60, pool_size=2, max_words=6, clock=lambda: now[0])
+        key = cache.key("Hi, how are you?", "neutral", "medium")
+        
+        misses_until_full = [cache.get(key)]
+        cache.put(key, "I'm doing well, how about you?", cost_ms=800)
+        misses_until_full.append(cache.get(key))
+        cache.put(key, "Hello! How are you feeling today?", cost_ms=1200)
+        served = [cache.get(cache.key(text, "neutral", "medium")) for text in
+                  ("hello how are you", "hey how r u", "HIII how are you!!", "hi how are you")]
+        
+        cache.put(cache.key("thanks", "neutral", "medium"), "Anytime!")
+        cache.put(cache.key("i am fine", "neutral", "medium"), "Glad to hear!")  # evicts the least recent key
+        now[0] = 61.0
+        stats = cache.stats()
+        
+        test_cases = [
+            ("spelling variants share a key", cache.key("hey how r u", "neutral", "medium") == key, True),
+            ("emotion is part of the key", cache.key("hi how are you", "sad", "medium") != key, True),
+            ("long messages are not cached", cache.key("i had a long and difficult day at work today", "sad", "high"), None),
+            ("replies that depend on the last turn are not cached",
+             [cache.key(text, "neutral", "medium") for text in ("yes", "okay", "not really", "i am fine but tired")],
+             [None] * 4),
+            ("\"i am\" is only rewritten as whole words", normalize_utterance("Hi Amit, I am here"), "hi amit i'm here"),
+            ("misses until the pool is full", misses_until_full, [None, None]),
+            ("hits never repeat the last reply", all(a != b for a, b in zip(served, served[1:])) and None not in served, True),
+            ("latency saved is counted", stats["saved_ms"], 4000.0),
+            ("least recently used key evicted", stats["entries"], 2),
+            ("replies expire after the TTL", cache.get(cache.key("thanks", "neutral", "medium")), None),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, result, expected in test_cases:
+            success = result == expected
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["reply_cache"].append({
+                "case": name,
+                "result": str(result),
+                "success": success
+            })
+            
+            print(f"{status} | {name}: {result}")
+        
+        score = (passed / total) * 100
+        print(f"\n🗃️ Reply Cache Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_generation_deadline(self):
+        """Test that slow generation is answered from templates within the deadline"""
+        print("\n⏳ Testing Generation Deadline...")
+        from concurrent.futures import Future
+        import services.enhanced_nlp_model as nlp
+        from services.reply_cache import reply_cache
+        
+        late_reply = "Thank you for telling me. What part of today stayed with you most?"
+        
+        def slow_model_reply(*args):
+            time.sleep(0.5)
+            return late_reply
+        
+        loaded = Future()
+        loaded.set_result((object(), object()))
+        saved = nlp._model_future, nlp._model_reply, nlp.GENERATION_DEADLINE_SECONDS
+        neutral = {"primary_emotion": "neutral", "intensity": "medium"}
+        test_cases = []
+        try:
+            nlp._model_future, nlp._model_reply = loaded, slow_model_reply
+            for deadline, text in ((0.2, "so today was just one of those days where nothing happened"),
+                                   (2.0, "so today was just one of those days where nothing happened"),
+                                   (0.2, "good evening assistant")):
+                nlp.GENERATION_DEADLINE_SECONDS = deadline
+                start = time.perf_counter()
+                reply = nlp.generate_enhanced_reply(text, "", neutral)
+                elapsed = time.perf_counter() - start
+                expect_model = deadline > 0.5
+                test_cases.append((f"deadline {deadline}s: {text[:25]}",
+                                   elapsed <= deadline + 0.1 and (reply == late_reply) == expect_model,
+                                   f"{elapsed:.2f}s, {'model' if reply == late_reply else 'template'} reply"))
+            
+            # A late reply to a short utterance is kept for next time
+            time.sleep(0.5)
+            entry = reply_cache._entries.get(reply_cache.key("good evening assistant", "neutral", "medium"))
+            pool = [reply for reply, _ in entry.replies] if entry else []
+            test_cases.append(("late reply kept in the reply cache", late_reply in pool, f"pool of {len(pool)}"))
+        finally:
+            nlp._model_future, nlp._model_reply, nlp.GENERATION_DEADLINE_SECONDS = saved
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, success, detail in test_cases:
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["generation_deadline"].append({
+                "case": name,
+                "detail": str(detail),
+                "success": bool(success)
+            })
+            
+            print(f"{status} | {name}: {detail}")
+        
+        score = (passed / total) * 100
+        print(f"\n⏳ Generation Deadline Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_onnx_backend(self):
+        """Test ONNX export and decoding against torch on a tiny random GPT-2"""
+        print("\n📐 Testing ONNX Backend...")
+        import importlib.util
+        missing = [name for name in ("onnx", "onnxruntime") if importlib.util.find_spec(name) is None]
+        if missing:
+            print(f"⏭️ SKIP | ONNX backend needs {', '.join(missing)}")
+            return None
+        
+        import os
+        import shutil
+        import tempfile
+        import torch
+        from transformers import GPT2Config, GPT2LMHeadModel
+        from services.onnx_backend import OnnxCausalLM, export_cached
+        
+        workdir = tempfile.mkdtemp(prefix="onnx-test-")
+        try:
+            torch.manual_seed(0)
+            config = GPT2Config(vocab_size=200, n_positions=64, n_embd=32, n_layer=2, n_head=2)
+            model_dir = os.path.join(workdir, "tiny-gpt2")
+            GPT2LMHeadModel(config).eval().save_pretrained(model_dir)
+            model = GPT2LMHeadModel.from_pretrained(model_dir).eval()
+            
+            path = export_cached(model_dir, os.path.join(workdir, "onnx"))
+            exported_at = os.path.getmtime(path)
+            onnx_model = OnnxCausalLM(path)
+            prompt = [5, 17, 42, 101, 9]
+            
+            with torch.no_grad():
+                logits = model(torch.tensor([prompt])).logits[0, -1].numpy()
+                expected = model.generate(torch.tensor([prompt]), do_sample=False, max_new_tokens=12,
+                                          repetition_penalty=1.15, eos_token_id=None, pad_token_id=0)[0, 5:].tolist()
+            onnx_logits, past = onnx_model.forward(prompt)
+            generated = onnx_model.generate(prompt, do_sample=False, max_new_tokens=12, repetition_penalty=1.15)
+            stopped = onnx_model.generate(prompt, do_sample=False, max_new_tokens=12, repetition_penalty=1.15,
+                                          eos_token_id=expected[3])
+            test_cases = [
+                ("prompt logits match torch", bool(abs(onnx_logits[0] - logits).max() < 1e-4), True),
+                ("cache grows by the prompt", past[0].shape[2], len(prompt)),
+                ("greedy tokens match torch", generated, expected),
+                ("stops at eos", stopped, expected[:3]),
+                ("export reused from cache",
+                 os.path.getmtime(export_cached(model_dir, os.path.join(workdir, "onnx"))), exported_at),
+            ]
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, result, expected in test_cases:
+            success = result == expected
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["onnx_backend"].append({
+                "case": name,
+                "result": str(result),
+                "success": success
+            })
+            
+            print(f"{status} | {name}: {result}")
+        
+        score = (passed / total) * 100
+        print(f"\n📐 ONNX Backend Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_response_templates(self):
+        """Test the compiled response templates and shared context detection"""
+        print("\n🧩 Testing Response Templates...")
+        import services.enhanced_nlp_model as nlp
+        
+        sad_lines = tuple(nlp.EMOTION_RESPONSES["sad"]["acknowledgments"])
+        high_lines = nlp.get_emotion_specific_response("sad", "high")["acknowledgments"]
+        try:
+            nlp.get_emotion_specific_response("sad")["acknowledgments"] = ()
+            read_only = False
+        except TypeError:
+            read_only = True
+        
+        # Same matches as scanning every keyword with `in`, substrings included ("blog" has "log")
+        texts = ["Ghar wale shaadi ke liye bol rahe hain", "My BOSS cut my salary", "I read a blog about it",
+                 "Social media comparison and my girlfriend", "nothing to report"]
+        scanned = [[context for context, keywords in nlp.CULTURAL_KEYWORDS.items()
+                    if any(keyword in text.lower() for keyword in keywords)] for text in texts]
+        
+        reply = nlp.generate_culturally_aware_response("", "anxious", ["career_stress"], "medium")
+        anxious = nlp.EMOTION_RESPONSES["anxious"]
+        segments = nlp._prompt_segments("My boss is unbearable", "", "sad", {}, ["family_pressure"])
+        test_cases = [
+            ("high intensity leaves medium lines alone",
+             (high_lines != sad_lines, nlp.get_emotion_specific_response("sad")["acknowledgments"] == sad_lines),
+             (True, True)),
+            ("tables are read-only", read_only, True),
+            ("detection matches keyword scan", [nlp.detect_cultural_context(text) for text in texts], scanned),
+            ("reply built from the tables",
+             (any(reply.startswith(line) for line in anxious["acknowledgments"]),
+              any(line in reply for line in nlp.CULTURAL_CONTEXTS["career_stress"]),
+              any(line in reply for line in anxious["support"]), "Try this: " in reply),
+             (True, True, True, True)),
+            ("prompt uses the turn's detected contexts", "family_pressure" in segments["before_context"]
+             and "career_stress" not in segments["before_context"], True),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, result, expected in test_cases:
+            success = result == expected
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["response_templates"].append({
+                "case": name,
+                "result": str(result),
+                "success": success
+            })
+            
+            print(f"{status} | {name}: {result}")
+        
+        score = (passed / total) * 100
+        print(f"\n🧩 Response Templates Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_two_stage_reply(self):
+        """Test that a streamed reply opens with an instant acknowledgment the model continues"""
+        print("\n🗣️ Testing Two-Stage Reply...")
+        from concurrent.futures import Future
+        from transformers import TextIteratorStreamer  # already imported by the model load in real use
+        import services.enhanced_nlp_model as nlp
+        
+        prompts = []
+        
+        def slow_generation(generator, tokenizer, user_text, context, emotion, emotion_data, streamer, cancel,
+                            cultural_contexts, reply_start):
+            prompts.append(nlp._build_enhanced_prompt(user_text, context, emotion, emotion_data,
+                                                      cultural_contexts, reply_start))
+            time.sleep(0.4)
+            # The model repeats the acknowledgment once, then continues
+            streamer.on_finalized_text(f" {reply_start} What happened after that?\nUser: ok")
+            streamer.on_finalized_text("", stream_end=True)
+            criteria = type("Criteria", (), {"generated_tokens": [9], "stop_reasons": ["speaker"]})()
+            return "", criteria
+        
+        def count_words(text, **kwargs):
+            return {"input_ids": text.split()}
+        
+        loaded = Future()
+        loaded.set_result((object(), count_words))
+        saved = nlp._model_future, nlp._run_generation, nlp.TWO_STAGE_REPLY
+        neutral = {"primary_emotion": "neutral", "intensity": "medium"}
+        text = "so today the meeting ran late and then the bus never came"
+        test_cases = []
+        try:
+            nlp._model_future, nlp._run_generation = loaded, slow_generation
+            for two_stage in (True, False):
+                nlp.TWO_STAGE_REPLY = two_stage
+                start = time.perf_counter()
+                stream = nlp.stream_enhanced_reply(text, "", neutral)
+                first = next(stream)
+                first_at = time.perf_counter() - start
+                sentences = [first] + list(stream)
+                label = "two-stage" if two_stage else "single-stage"
+                test_cases.append((f"{label}: first sentence", first_at < 0.2 if two_stage else first_at >= 0.4,
+                                   f"{first_at * 1000:.0f} ms, {first!r}"))
+                if two_stage:
+                    test_cases.append(("acknowledgment said once, then the model's reply",
+                                       sentences == [first, "What happened after that?"]
+                                       and first in nlp.NEUTRAL_ACKNOWLEDGMENTS, sentences))
+                    test_cases.append(("prompt ends with the acknowledgment",
+                                       prompts[-1].endswith(f"Assistant: {first}"), repr(prompts[-1][-50:])))
+        finally:
+            nlp._model_future, nlp._run_generation, nlp.TWO_STAGE_REPLY = saved
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, success, detail in test_cases:
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["two_stage_reply"].append({
+                "case": name,
+                "detail": str(detail),
+                "success": bool(success)
+            })
+            
+            print(f"{status} | {name}: {detail}")
+        
+        score = (passed / total) * 100
+        print(f"\n🗣️ Two-Stage Reply Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_context_summary(self):
+        """Test that prompt context stays bounded with a rolling summary of older turns"""
+        print("\n📝 Testing Context Summary...")
+        import os
+        import shutil
+        import tempfile
+        import memory.memory_manager as mm
+        
+        turns = [
+            ("My exam results came out badly and my parents are furious.", "sad"),
+            ("hi", "neutral"),
+            ("I could not sleep last night, kept thinking about the interview.", "anxious"),
+            ("ok thanks", "neutral"),
+            ("My best friend moved to Bangalore and I feel alone.", "lonely"),
+        ]
+        helplines = "Please call the Tele-MANAS helpline at 14416 or iCall at 9152987821 right now. " * 4
+        
+        workdir = tempfile.mkdtemp(prefix="memory-test-")
+        saved = mm.MEMORY_FILE, mm.EMOTION_ANALYTICS_FILE
+        sizes = []
+        try:
+            mm.MEMORY_FILE = os.path.join(workdir, "conversation_memory.json")
+            mm.EMOTION_ANALYTICS_FILE = os.path.join(workdir, "emotion_analytics.json")
+            mm.initialize_memory_files()
+            for i in range(30):
+                user_text, emotion = turns[i % len(turns)]
+                mm.add_to_memory(user_text, helplines if i % 3 == 0 else "I hear you.", emotion, {})
+                sizes.append(len(mm.get_context()))
+            context = mm.get_context()
+            summary_line = context.splitlines()[0]
+            recent = [user_text for user_text, _ in (turns * 6)[-mm.CONTEXT_TURNS:]]
+        finally:
+            mm.MEMORY_FILE, mm.EMOTION_ANALYTICS_FILE = saved
+            shutil.rmtree(workdir, ignore_errors=True)
+        
+        test_cases = [
+            ("context size stops growing", max(sizes[10:]) <= max(sizes[:10]) + 100,
+             f"max {max(sizes[:10])} chars in turns 1-10, {max(sizes[10:])} in 11-30"),
+            ("older turns summarized", summary_line.startswith(f"Earlier ({30 - mm.CONTEXT_TURNS} turns)")
+             and "exam results came out badly" in summary_line, summary_line[:80]),
+            ("small talk and bot replies left out", "hi;" not in summary_line and "Tele-MANAS" not in summary_line,
+             f"{summary_line.count(';') + 1} points"),
+            ("last turns kept verbatim", all(f"): {user_text}" in context for user_text in recent),
+             f"{mm.CONTEXT_TURNS} turns"),
+            ("long replies clipped", all(len(line) <= mm.CONTEXT_TURN_CHARS + 5
+                                         for line in context.splitlines() if line.startswith("Bot:")),
+             f"limit {mm.CONTEXT_TURN_CHARS} chars"),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, success, detail in test_cases:
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["context_summary"].append({
+                "case": name,
+                "detail": str(detail),
+                "success": bool(success)
+            })
+            
+            print(f"{status} | {name}: {detail}")
+        
+        score = (passed / total) * 100
+        print(f"\n📝 Context Summary Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_emotion_trends(self):
+        """Test the emotion trend ring buffer against the list-based trends it replaced"""
+        print("\n📈 Testing Emotion Trends...")
+        from services.advanced_emotion_detection import EmotionTrendTracker
+        
+        def list_trends(emotions, window_size):
+            """The list-based get_emotion_trends computation"""
+            recent_emotions = emotions[-window_size:]
+            emotion_counts = {}
+            for emotion in recent_emotions:
+                emotion_counts[emotion] = emotion_counts.get(emotion, 0) + 1
+            dominant_emotion = max(emotion_counts, key=emotion_counts.get)
+            return dominant_emotion, emotion_counts[dominant_emotion] / len(recent_emotions), emotion_counts
+        
+        tracker = EmotionTrendTracker(window_size=4)
+        for emotion in ["sad", "sad", "sad", "anxious", "happy", "happy", "anxious"]:
+            tracker.push(emotion)
+        
+        # Ties, evictions of the dominant emotion and repeats, over several window sizes
+        sequence = ["sad", "anxious", "sad", "happy", "anxious", "happy", "neutral", "happy", "sad", "sad",
+                    "anxious", "neutral", "neutral", "angry", "sad", "happy", "happy", "anxious", "angry", "sad",
+                    "lonely", "sad", "lonely", "neutral", "happy", "anxious", "anxious", "sad", "happy", "sad"]
+        mismatches = []
+        for window_size in (1, 3, 4, 10):
+            parity_tracker = EmotionTrendTracker(window_size)
+            for i, emotion in enumerate(sequence):
+                parity_tracker.push(emotion)
+                ring = (parity_tracker.dominant_emotion(), parity_tracker.strength(), parity_tracker.distribution())
+                if ring != list_trends(sequence[:i + 1], window_size):
+                    mismatches.append((window_size, i))
+        
+        test_cases = [
+            ("window stays at capacity after wrap-around", len(tracker), 4),
+            ("evicted emotions leave the counts", tracker.distribution(), {"anxious": 2, "happy": 2}),
+            ("dominant emotion after its last entry is evicted", tracker.dominant_emotion(), "anxious"),
+            ("strength after eviction", tracker.strength(), 0.5),
+            ("same dominant, strength and counts as the list-based trends", mismatches, []),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, result, expected in test_cases:
+            success = result == expected
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["emotion_trends"].append({
+                "case": name,
+                "result": str(result),
+                "success": success
+            })
+            
+            print(f"{status} | {name}: {result}")
+        
+        score = (passed / total) * 100
+        print(f"\n📈 Emotion Trends Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_linear_emotion_engine(self):
+        """Test training the linear emotion engine and selecting it in place of keywords"""
+        print("\n🧮 Testing Linear Emotion Engine...")
+        import shutil
+        import tempfile
+        from services.advanced_emotion_detection import AdvancedEmotionDetector
+        from services.linear_emotion_model import HashingVectorizer, train
+        from train_emotion_model import DEFAULT_CORPUS, build_training_set
+        
+        examples = build_training_set([DEFAULT_CORPUS])
+        model = train(examples, HashingVectorizer(n_features=2 ** 12), epochs=100)
+        clear_sentences = [
+            ("I am so happy and excited today", "happy"),
+            ("I'm worried and nervous about my exam", "anxious"),
+            ("I am so angry, this is frustrating", "angry"),
+            ("Thank you so much, I'm really grateful", "grateful"),
+            ("ghabrahat ho rahi hai", "anxious"),
+        ]
+        predicted = [model.predict(text)[0] for text, _ in clear_sentences]
+        
+        workdir = tempfile.mkdtemp(prefix="emotion-model-")
+        try:
+            path = os.path.join(workdir, "emotion_linear.npz")
+            model.save(path)
+            text = "I'm worried and nervous about my exam"
+            linear = AdvancedEmotionDetector(engine="linear", model_path=path).analyze_emotion_context(text)
+            keyword = AdvancedEmotionDetector(engine="keyword").analyze_emotion_context(text)
+            missing = AdvancedEmotionDetector(engine="linear", model_path=os.path.join(workdir, "missing.npz"))
+            missing.analyze_emotion_context(text)
+        finally:
+            shutil.rmtree(workdir, ignore_errors=True)
+        
+        test_cases = [
+            ("trained on the bundled corpus", len(examples) > 0 and len(model.labels) > 1,
+             f"{len(examples)} examples, {len(model.labels)} emotions"),
+            ("clear sentences labeled correctly", predicted == [label for _, label in clear_sentences],
+             predicted),
+            ("linear engine returns the detailed dict shape", set(linear) == set(keyword)
+             and isinstance(linear["multiple_emotions"], dict) and linear["intensity"] in ("low", "medium", "high"),
+             sorted(linear)),
+            ("linear engine answers from the saved model", linear["primary_emotion"] == "anxious"
+             and linear["confidence"] > 0.5, f"{linear['primary_emotion']} ({linear['confidence']:.2f})"),
+            ("missing model falls back to keywords", missing.engine == "keyword", missing.engine),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, success, detail in test_cases:
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["linear_emotion_engine"].append({
+                "case": name,
+                "detail": str(detail),
+                "success": bool(success)
+            })
+            
+            print(f"{status} | {name}: {detail}")
+        
+        score = (passed / total) * 100
+        print(f"\n🧮 Linear Emotion Engine Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_model_loading(self):
+        """Test the background model load: status, template replies while loading, one shared load"""
+        print("\n⏳ Testing Background Model Loading...")
+        import services.enhanced_nlp_model as nlp
+        
+        release = threading.Event()
+        loads = []
+        loaded = (object(), object())
+        
+        def slow_load():
+            loads.append(threading.current_thread().name)
+            release.wait(2.0)
+            return loaded
+        
+        def failing_load():
+            raise RuntimeError("no model files")
+        
+        saved = nlp._model_future, nlp._load_model
+        test_cases = []
+        try:
+            nlp._model_future, nlp._load_model = None, slow_load
+            test_cases.append(("not loaded before the first request", nlp.get_model_status(), "not_loaded"))
+            
+            futures = []
+            callers = [threading.Thread(target=lambda: futures.append(nlp.start_model_loading())) for _ in range(4)]
+            for t in callers:
+                t.start()
+            for t in callers:
+                t.join()
+            futures.append(nlp.start_model_loading())
+            test_cases.append(("one shared future on repeated calls", len({id(f) for f in futures}), 1))
+            test_cases.append(("loading while the load runs", nlp.get_model_status(), "loading"))
+            test_cases.append(("no generator while loading", nlp.get_generator(), None))
+            test_cases.append(("wait gives up at its timeout", nlp.get_generator(wait=True, timeout=0.05), None))
+            
+            start = time.perf_counter()
+            reply = nlp.generate_enhanced_reply("tell me something about the weather outside",
+                                                "", {"primary_emotion": "neutral", "intensity": "medium"})
+            test_cases.append(("templates answer while loading", bool(reply) and time.perf_counter() - start < 0.5,
+                               True))
+            
+            release.set()
+            test_cases.append(("waiting returns the loaded model", nlp.get_generator(wait=True, timeout=2.0), loaded))
+            test_cases.append(("ready once loaded", nlp.get_model_status(), "ready"))
+            test_cases.append(("model loaded once", len(loads), 1))
+            
+            nlp._model_future, nlp._load_model = None, failing_load
+            nlp.get_generator(wait=True, timeout=2.0)
+            test_cases.append(("failed when the load raises", nlp.get_model_status(), "failed"))
+            test_cases.append(("no generator after a failed load", nlp.get_generator(), None))
+        finally:
+            release.set()
+            nlp._model_future, nlp._load_model = saved
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, result, expected in test_cases:
+            success = result == expected
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["model_loading"].append({
+                "case": name,
+                "result": str(result),
+                "success": success
+            })
+            
+            print(f"{status} | {name}: {result}")
+        
+        score = (passed / total) * 100
+        print(f"\n⏳ Model Loading Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_prefix_cache(self):
+        """Test that generating from a cached prompt prefix matches the uncached prompt"""
+        print("\n🧠 Testing Prefix Cache...")
+        import torch
+        from transformers import GPT2Config, GPT2LMHeadModel
+        from services.prefix_cache import PrefixCache
+        from utils.metrics import metrics
+        
+        class IdTokenizer:
+            """Prompts written as space-separated token ids"""
+            def __call__(self, text, return_tensors=None, add_special_tokens=True):
+                return type("Encoding", (), {"input_ids": torch.tensor([[int(t) for t in text.split()]])})
+            
+            def decode(self, ids, skip_special_tokens=True):
+                return " ".join(str(int(i)) for i in ids)
+        
+        def cache_tensors(past):
+            return [t.clone() for layer in past.layers for t in (layer.keys, layer.values)]
+        
+        torch.manual_seed(0)
+        config = GPT2Config(vocab_size=200, n_positions=64, n_embd=32, n_layer=2, n_head=2, bos_token_id=199,
+                            eos_token_id=199)
+        model = GPT2LMHeadModel(config).eval()
+        cache = PrefixCache(model, IdTokenizer())
+        prefix, suffix = "5 17 42 101 9 63 7", [88, 12, 150]
+        greedy = dict(do_sample=False, max_new_tokens=12, repetition_penalty=1.15, eos_token_id=None, pad_token_id=0)
+        
+        with torch.no_grad():
+            input_ids = torch.tensor([[int(t) for t in prefix.split()] + suffix])
+            expected = model.generate(input_ids, attention_mask=torch.ones_like(input_ids), **greedy)[0, 10:].tolist()
+        misses = metrics.counter("prefix_cache_misses")
+        hits = metrics.counter("prefix_cache_hits")
+        first = [int(t) for t in cache.generate(prefix, suffix, **greedy).split()]
+        _, past = cache.get(prefix)
+        before = cache_tensors(past)
+        second = [int(t) for t in cache.generate(prefix, " ".join(map(str, suffix)), **greedy).split()]
+        after = cache_tensors(cache.get(prefix)[1])
+        
+        test_cases = [
+            ("greedy tokens match the uncached prompt", first, expected),
+            ("text suffix matches token-id suffix", second, first),
+            ("cached key/values unchanged by generation", past.get_seq_length() == 7
+             and all(torch.equal(a, b) for a, b in zip(before, after)), True),
+            ("prefix computed once", metrics.counter("prefix_cache_misses") - misses, 1),
+            ("later calls served from cache", metrics.counter("prefix_cache_hits") - hits >= 2, True),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, result, expected_result in test_cases:
+            success = result == expected_result
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["prefix_cache"].append({
+                "case": name,
+                "result": str(result),
+                "success": success
+            })
+            
+            print(f"{status} | {name}: {result}")
+        
+        score = (passed / total) * 100
+        print(f"\n🧠 Prefix Cache Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
+    def test_quantization(self):
+        """Test int8 quantization of a tiny random GPT-2 and its on-disk cache"""
+        print("\n🗜️ Testing Int8 Quantization...")
+        import copy
+        import shutil
+        import tempfile
+        import torch
+        from torch.ao.nn.quantized.dynamic import Linear as DynamicQuantizedLinear
+        from transformers import GPT2Config, GPT2LMHeadModel
+        from transformers.pytorch_utils import Conv1D
+        import services.quantization as quantization
+        
+        def tiny_gpt2(seed):
+            torch.manual_seed(seed)
+            config = GPT2Config(vocab_size=200, n_positions=64, n_embd=32, n_layer=2, n_head=2, bos_token_id=199,
+                                eos_token_id=199)
+            return GPT2LMHeadModel(config).eval()
+        
+        prompt = torch.tensor([[5, 17, 42, 101, 9]])
+        greedy = dict(do_sample=False, max_new_tokens=12, repetition_penalty=1.15, eos_token_id=None, pad_token_id=0)
+        
+        def tokens(model):
+            with torch.no_grad():
+                return model.generate(prompt, **greedy)[0, prompt.shape[1]:].tolist()
+        
+        model = tiny_gpt2(0)
+        quantized = quantization.quantize_int8(copy.deepcopy(model))
+        modules = list(quantized.modules())
+        with torch.no_grad():
+            logit_gap = float((model(prompt).logits - quantized(prompt).logits).abs().max())
+        agreement = sum(a == b for a, b in zip(tokens(model), tokens(quantized)))
+        
+        workdir = tempfile.mkdtemp(prefix="quantization-test-")
+        saved_version = quantization.QUANTIZED_FORMAT_VERSION
+        try:
+            model_dir = os.path.join(workdir, "tiny-gpt2")
+            cache_dir = os.path.join(workdir, "int8")
+            model.save_pretrained(model_dir)
+            path = quantization.quantized_cache_path(model_dir, cache_dir)
+            
+            def cached_at():
+                return os.stat(path).st_mtime_ns
+            
+            first = quantization.load_quantized_model(model_dir, cache_dir)
+            built_at = cached_at()
+            reloaded = quantization.load_quantized_model(model_dir, cache_dir)
+            reused = cached_at() == built_at
+            reloaded_tokens = tokens(reloaded)
+            
+            # Weights changed in place under the same name
+            tiny_gpt2(1).save_pretrained(model_dir)
+            rebuilt = quantization.load_quantized_model(model_dir, cache_dir)
+            rebuilt_for_new_weights = cached_at() != built_at and tokens(rebuilt) == tokens(quantization.quantize_int8(tiny_gpt2(1)))
+            
+            rebuilt_at = cached_at()
+            quantization.QUANTIZED_FORMAT_VERSION = saved_version + 1
+            quantization.load_quantized_model(model_dir, cache_dir)
+            rebuilt_for_format = cached_at() != rebuilt_at
+        finally:
+            quantization.QUANTIZED_FORMAT_VERSION = saved_version
+            shutil.rmtree(workdir, ignore_errors=True)
+        
+        test_cases = [
+            ("Conv1D layers replaced", any(isinstance(m, Conv1D) for m in modules), False),
+            ("every Linear quantized", sum(isinstance(m, DynamicQuantizedLinear) for m in modules) == 9
+             and not any(type(m) is torch.nn.Linear for m in modules), True),
+            ("logits close to fp32", logit_gap < 0.05, True),
+            ("greedy tokens agree with fp32", agreement >= 10, True),
+            ("cache reused on reload", reused and reloaded_tokens == tokens(first), True),
+            ("cache rebuilt when weights change in place", rebuilt_for_new_weights, True),
+            ("cache rebuilt when the format changes", rebuilt_for_format, True),
+        ]
+        
+        passed = 0
+        total = len(test_cases)
+        
+        for name, result, expected in test_cases:
+            success = result == expected
+            if success:
+                passed += 1
+            status = "✅ PASS" if success else "❌ FAIL"
+            
+            self.test_results["quantization"].append({
+                "case": name,
+                "result": str(result),
+                "success": success
+            })
+            
+            print(f"{status} | {name}: {result}")
+        
+        print(f"   greedy agreement {agreement}/{greedy['max_new_tokens']}, max logit gap {logit_gap:.4f}")
+        score = (passed / total) * 100
+        print(f"\n🗜️ Quantization Score: {score:.1f}% ({passed}/{total})")
+        return score
+    
     def run_comprehensive_test(self):
         """Run all tests and generate comprehensive report"""
         print("🧪 Starting Comprehensive System Test...\n")
@@ -406,6 +1798,28 @@ class SystemTester:
         scores["cultural_context"] = self.test_cultural_context()
         scores["memory_system"] = self.test_memory_system()
         scores["tts_system"] = self.test_tts_system()
+        scores["startup"] = self.test_startup_performance()
+        scores["safety_latency"] = self.test_safety_latency()
+        scores["model_registry"] = self.test_model_registry()
+        scores["prompt_budget"] = self.test_prompt_budget()
+        scores["reply_streaming"] = self.test_reply_streaming()
+        scores["stopping_criteria"] = self.test_stopping_criteria()
+        scores["assisted_decoding"] = self.test_assisted_decoding()
+        scores["generation_batching"] = self.test_generation_batching()
+        scores["reply_cache"] = self.test_reply_cache()
+        scores["generation_deadline"] = self.test_generation_deadline()
+        scores["onnx_backend"] = self.test_onnx_backend()
+        scores["response_templates"] = self.test_response_templates()
+        scores["two_stage_reply"] = self.test_two_stage_reply()
+        scores["context_summary"] = self.test_context_summary()
+        scores["emotion_trends"] = self.test_emotion_trends()
+        scores["linear_emotion_engine"] = self.test_linear_emotion_engine()
+        scores["model_loading"] = self.test_model_loading()
+        scores["prefix_cache"] = self.test_prefix_cache()
+        scores["quantization"] = self.test_quantization()
+        
+        # Skipped categories (missing optional dependencies) return None
+        scores = {category: score for category, score in scores.items() if score is not None}
         
         # Calculate overall score
         overall_score = sum(scores.values()) / len(scores)
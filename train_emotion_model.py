@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Train the linear emotion engine offline.
+Reads labeled JSONL corpora (plus labeled conversation history and the keyword
+lexicons as weak labels) and writes a compact .npz model.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from services.linear_emotion_model import HashingVectorizer, load_corpus, train
+
+DEFAULT_CORPUS = os.path.join("data", "emotion_corpus.jsonl")
+DEFAULT_HISTORY = os.path.join("memory", "conversation_memory.json")
+
+
+def load_history_examples(path):
+    """Labeled user messages from a conversation memory file"""
+    if not os.path.exists(path):
+        return []
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return [
+        (m["user"], m["emotion"])
+        for m in data.get("messages", [])
+        if m.get("user") and m.get("emotion") and m["emotion"] != "crisis"
+    ]
+
+
+def lexicon_examples():
+    """Keyword lexicons and cultural idioms as weakly-labeled phrases"""
+    from services.advanced_emotion_detection import (
+        EMOTION_KEYWORDS, CULTURAL_EXPRESSIONS, CULTURAL_EMOTION_MAP
+    )
+    examples = [
+        (keyword, emotion)
+        for emotion, keywords_dict in EMOTION_KEYWORDS.items()
+        for keywords in keywords_dict.values()
+        for keyword in keywords
+    ]
+    examples += [
+        (expr, CULTURAL_EMOTION_MAP[emotion_type][0])
+        for emotion_type, expressions in CULTURAL_EXPRESSIONS.items()
+        if emotion_type in CULTURAL_EMOTION_MAP
+        for expr in expressions
+    ]
+    return examples
+
+
+def build_training_set(corpus_paths, history_path=None, use_lexicon=True):
+    examples = []
+    for path in corpus_paths:
+        examples += load_corpus(path)
+    if history_path:
+        examples += load_history_examples(history_path)
+    if use_lexicon:
+        examples += lexicon_examples()
+    return examples
+
+
+def main():
+    try:
+        from config import EMOTION_MODEL_PATH
+    except Exception:
+        EMOTION_MODEL_PATH = os.path.join("data", "models", "emotion_linear.npz")
+
+    parser = argparse.ArgumentParser(description="Train the linear emotion classifier")
+    parser.add_argument("--corpus", action="append", help=f"labeled JSONL corpus (default: {DEFAULT_CORPUS})")
+    parser.add_argument("--history", default=DEFAULT_HISTORY, help="conversation memory with labeled turns ('' to skip)")
+    parser.add_argument("--no-lexicon", action="store_true", help="do not add keyword lexicons as weak labels")
+    parser.add_argument("--output", default=EMOTION_MODEL_PATH)
+    parser.add_argument("--n-features", type=int, default=2 ** 14)
+    parser.add_argument("--epochs", type=int, default=300)
+    args = parser.parse_args()
+
+    examples = build_training_set(args.corpus or [DEFAULT_CORPUS], args.history, not args.no_lexicon)
+    print(f"📚 Training on {len(examples)} examples, {len({e for _, e in examples})} emotions")
+
+    start = time.perf_counter()
+    model = train(examples, HashingVectorizer(n_features=args.n_features), epochs=args.epochs)
+    print(f"✅ Trained in {time.perf_counter() - start:.1f}s")
+
+    correct = sum(1 for text, label in examples if model.predict(text)[0] == label)
+    print(f"🎯 Training accuracy: {correct / len(examples) * 100:.1f}%")
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    model.save(args.output)
+    print(f"💾 Saved model to {args.output} ({os.path.getsize(args.output) / 1024:.0f} KB)")
+
+
+if __name__ == "__main__":
+    main()
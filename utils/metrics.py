@@ -0,0 +1,70 @@
+# utils/metrics.py
+import threading
+from collections import deque
+from typing import Dict, Optional
+
+LATENCY_SAMPLES = 200  # recent samples kept per latency metric
+
+
+class Metrics:
+    """Thread-safe in-process counters and latency recorders"""
+
+    def __init__(self, max_samples: int = LATENCY_SAMPLES):
+        self.max_samples = max_samples
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._latencies: Dict[str, deque] = {}
+        self._budgets: Dict[str, float] = {}
+        self._over_budget: Dict[str, int] = {}
+
+    def increment(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def set_budget(self, name: str, budget_ms: float):
+        with self._lock:
+            self._budgets[name] = budget_ms
+
+    def record_latency(self, name: str, elapsed_ms: float) -> bool:
+        """Record one sample; returns False if it exceeded the metric's budget"""
+        with self._lock:
+            samples = self._latencies.get(name)
+            if samples is None:
+                samples = self._latencies[name] = deque(maxlen=self.max_samples)
+            samples.append(elapsed_ms)
+            budget = self._budgets.get(name)
+            if budget is not None and elapsed_ms > budget:
+                self._over_budget[name] = self._over_budget.get(name, 0) + 1
+                return False
+            return True
+
+    def latency_summary(self, name: str) -> Optional[Dict]:
+        with self._lock:
+            samples = sorted(self._latencies.get(name, ()))
+            if not samples:
+                return None
+            return {
+                "count": len(samples),
+                "p50_ms": samples[len(samples) // 2],
+                "p95_ms": samples[min(len(samples) - 1, int(len(samples) * 0.95))],
+                "max_ms": samples[-1],
+                "budget_ms": self._budgets.get(name),
+                "over_budget": self._over_budget.get(name, 0),
+            }
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            names = list(self._latencies)
+            counters = dict(self._counters)
+        return {
+            "counters": counters,
+            "latencies": {name: self.latency_summary(name) for name in names},
+        }
+
+
+# Global metrics instance
+metrics = Metrics()
@@ -0,0 +1,94 @@
+# utils/nltk_resources.py
+import os
+import threading
+from typing import List, Optional
+
+# Local bundle directory (shipped with the app or filled by setup.py)
+try:
+    from config import NLTK_DATA_DIR
+except Exception:
+    NLTK_DATA_DIR = os.getenv("NLTK_DATA_DIR", os.path.join("data", "nltk_data"))
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# nltk.data paths for the resources this project uses
+RESOURCE_PATHS = {
+    "vader_lexicon": "sentiment/vader_lexicon.zip",
+    "punkt": "tokenizers/punkt",
+    "stopwords": "corpora/stopwords",
+}
+
+_lock = threading.Lock()
+_paths_registered = False
+_analyzer = None
+_analyzer_loaded = False
+
+
+def get_bundle_dir() -> str:
+    """Absolute path of the local NLTK bundle directory"""
+    if os.path.isabs(NLTK_DATA_DIR):
+        return NLTK_DATA_DIR
+    return os.path.join(PROJECT_ROOT, NLTK_DATA_DIR)
+
+
+def _candidate_dirs() -> List[str]:
+    """Local directories searched before NLTK's own defaults"""
+    dirs = [get_bundle_dir()]
+    for env_dir in os.getenv("NLTK_DATA", "").split(os.pathsep):
+        if env_dir:
+            dirs.append(env_dir)
+    return [d for d in dirs if os.path.isdir(d)]
+
+
+def _register_local_paths():
+    """Put the local bundle/cache directories at the front of nltk.data.path"""
+    global _paths_registered
+    if _paths_registered:
+        return
+    import nltk
+
+    for directory in reversed(_candidate_dirs()):
+        if directory not in nltk.data.path:
+            nltk.data.path.insert(0, directory)
+    _paths_registered = True
+
+
+def find_resource(name: str) -> Optional[str]:
+    """Locate an NLTK resource on disk without touching the network"""
+    resource_path = RESOURCE_PATHS.get(name, name)
+    try:
+        import nltk
+    except ImportError:
+        return None
+
+    with _lock:
+        _register_local_paths()
+    try:
+        return str(nltk.data.find(resource_path))
+    except LookupError:
+        return None
+
+
+def get_sentiment_analyzer():
+    """Build the VADER analyzer on first use; returns None if the lexicon is unavailable"""
+    global _analyzer, _analyzer_loaded
+    if _analyzer_loaded:
+        return _analyzer
+
+    with _lock:
+        if _analyzer_loaded:
+            return _analyzer
+        try:
+            _register_local_paths()
+            from nltk.sentiment.vader import SentimentIntensityAnalyzer
+            _analyzer = SentimentIntensityAnalyzer()
+        except LookupError:
+            print(f"[NLTK WARNING] VADER lexicon not found in {get_bundle_dir()} or NLTK_DATA; "
+                  "sentiment fallback disabled")
+            _analyzer = None
+        except Exception as e:
+            print(f"[NLTK WARNING] VADER analyzer unavailable, sentiment fallback disabled: {e}")
+            _analyzer = None
+        _analyzer_loaded = True
+
+    return _analyzer